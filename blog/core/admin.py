@@ -0,0 +1,32 @@
+from typing import Callable
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+
+
+class SoftDeleteAdminMixin:
+    """
+    Admin deletion which only hides objects, dependants are removed in background (see feedback.deletion)
+
+    Confirmation page lists selected objects only, instead of collecting all their dependants.
+    Subclasses must set mark_deleted, e.g. mark_deleted = staticmethod(feedback.deletion.mark_posts_deleted)
+    """
+
+    # Hides objects of the queryset, returns number of hidden ones
+    mark_deleted: Callable[[models.QuerySet], int] = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        if cls.mark_deleted is None:
+            raise ImproperlyConfigured(f"{cls.__name__} should set mark_deleted")
+
+    def delete_model(self, request, obj):
+        self.mark_deleted(self.model._default_manager.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        self.mark_deleted(queryset)
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        return [str(one) for one in objs], {self.model._meta.verbose_name_plural: len(objs)}, set(), []
@@ -0,0 +1,41 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Probabilistic set of strings without false negatives
+
+    False positive rate stays about error_rate until capacity values are added, after that it grows
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        # Double hashing, positions are derived from two halves of a single digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value: str):
+        positions = self._positions(value)
+
+        if all(self.bits[one >> 3] & (1 << (one & 7)) for one in positions):
+            return
+
+        for one in positions:
+            self.bits[one >> 3] |= 1 << (one & 7)
+
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[one >> 3] & (1 << (one & 7)) for one in self._positions(value))
+
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
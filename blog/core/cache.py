@@ -0,0 +1,377 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db import transaction
+
+
+def get_shared_cache() -> BaseCache:
+    return caches[settings.TIERED_CACHE["SHARED_CACHE"]]
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU tier of TieredCache, entries expire after LOCAL_TIMEOUT seconds
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @property
+    def config(self) -> dict:
+        return settings.TIERED_CACHE
+
+    def get(self, key: str) -> Any:
+        """
+        :param key:
+        :return: value, None if it's missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: Any):
+        if not self.config["LOCAL_TIMEOUT"]:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.config["LOCAL_TIMEOUT"])
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.config["LOCAL_MAX_SIZE"]:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalCache()
+
+
+class CacheStats:
+    """
+    Hit / miss counters of TieredCache namespaces
+
+    Counters are buffered in process, so hits don't reach the shared cache, and are added to the shared ones at most
+    every STATS_INTERVAL seconds
+    """
+
+    names = ["hits", "local_hits", "stale", "misses"]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._flushed_at = time.monotonic()
+
+    @property
+    def config(self) -> dict:
+        return settings.TIERED_CACHE
+
+    def _key(self, namespace: str, name: str) -> str:
+        return f"{namespace}:stats:{name}"
+
+    def incr(self, namespace: str, name: str):
+        with self._lock:
+            self._counters[(namespace, name)] += 1
+            is_due = time.monotonic() - self._flushed_at >= self.config["STATS_INTERVAL"]
+
+        if is_due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            counters, self._counters = self._counters, defaultdict(int)
+            self._flushed_at = time.monotonic()
+
+        shared = get_shared_cache()
+
+        for (namespace, name), delta in counters.items():
+            key = self._key(namespace, name)
+            shared.add(key, 0, timeout=None)
+
+            try:
+                shared.incr(key, delta)
+            except ValueError:
+                shared.set(key, delta, timeout=None)
+
+    def get(self, namespace: str) -> dict[str, int]:
+        """
+        :param namespace:
+        :return: counters of all processes, including not flushed ones of this process
+        """
+        self.flush()
+        keys = [self._key(namespace, name) for name in self.names]
+        values = get_shared_cache().get_many(keys)
+        return {name: values.get(key, 0) for name, key in zip(self.names, keys)}
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+cache_stats = CacheStats()
+
+
+class TieredCache:
+    """
+    Namespace of values cached in process memory in front of shared Django cache, see TIERED_CACHE setting
+
+    Keys include namespace version, so bump_version() invalidates all of them at once and old entries just expire.
+    Local copies (and the version) are kept for LOCAL_TIMEOUT seconds, so changes made by other processes are seen with
+    that delay. Values are shared between requests of the process and must not be modified
+
+    On a miss only one thread of one process computes the value, others wait for it. Expired values are kept for
+    stale_timeout more seconds and served while it's recomputed, so is the value of the previous version after a bump
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._mutex = threading.Lock()
+        # Full key -> lock held by the thread which computes the value
+        self._local_locks = {}
+
+    @property
+    def config(self) -> dict:
+        return settings.TIERED_CACHE
+
+    @property
+    def version_key(self) -> str:
+        return f"{self.namespace}:version"
+
+    def get_version(self) -> int:
+        version = local_cache.get(self.version_key)
+
+        if version is None:
+            version = get_shared_cache().get_or_set(self.version_key, 1, timeout=None)
+            local_cache.set(self.version_key, version)
+
+        return version
+
+    def bump_version(self):
+        try:
+            version = get_shared_cache().incr(self.version_key)
+        except ValueError:
+            # Version is missing, e.g. evicted, so any non-initial value invalidates old keys
+            version = 2
+            get_shared_cache().set(self.version_key, version, timeout=None)
+
+        local_cache.set(self.version_key, version)
+
+    def bump_version_on_commit(self):
+        transaction.on_commit(self.bump_version)
+
+    def make_key(self, key: str, version: Optional[int] = None) -> str:
+        return f"{self.namespace}:{version or self.get_version()}:{key}"
+
+    def get_or_set(self, key: str, compute: Callable[[], Any], timeout: int, stale_timeout: int = 0) -> Any:
+        """
+        :param key: key within the namespace
+        :param compute: returns value to cache, None values aren't cached
+        :param timeout: seconds the value is fresh for
+        :param stale_timeout: seconds the value may be served after timeout (or version bump) while it's recomputed
+        :return: cached or computed value
+        """
+        version = self.get_version()
+        full_key = self.make_key(key, version)
+        entry = self._get_entry(full_key)
+
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+
+        if entry is None and stale_timeout:
+            entry = self._get_previous_entry(key, version)
+
+        if entry is None:
+            cache_stats.incr(self.namespace, "misses")
+
+        local_lock = self._lock_local(full_key)
+
+        if local_lock is None:
+            # Other thread of the process recomputes the value
+            if entry is not None:
+                return entry[0]
+
+            entry = self._wait_local(full_key)
+
+            if entry is not None:
+                return entry[0]
+
+            return self._compute(full_key, compute, timeout, stale_timeout)
+
+        try:
+            return self._get_or_compute(full_key, entry, compute, timeout, stale_timeout)
+        finally:
+            self._unlock_local(full_key, local_lock)
+
+    def get_stats(self) -> dict:
+        stats = cache_stats.get(self.namespace)
+        served = stats["hits"] + stats["stale"]
+        total = served + stats["misses"]
+        return {"version": self.get_version(), **stats, "hit_rate": served / total if total else None}
+
+    def _get_entry(self, full_key: str) -> Optional[tuple[Any, float]]:
+        """
+        :param full_key:
+        :return: value and time it's fresh until, None if it's missing in both tiers
+        """
+        entry = local_cache.get(full_key)
+
+        if entry is not None and entry[1] > time.time():
+            cache_stats.incr(self.namespace, "local_hits")
+            cache_stats.incr(self.namespace, "hits")
+            return entry
+
+        entry = get_shared_cache().get(full_key)
+
+        if entry is None:
+            return None
+
+        local_cache.set(full_key, entry)
+        cache_stats.incr(self.namespace, "hits" if entry[1] > time.time() else "stale")
+        return entry
+
+    def _get_previous_entry(self, key: str, version: int) -> Optional[tuple[Any, float]]:
+        """
+        Entry of the previous version, e.g. value changed by the write which bumped the version
+        :param key:
+        :param version: current version
+        :return: stale entry, None if it's missing
+        """
+        if version <= 1:
+            return None
+
+        full_key = self.make_key(key, version - 1)
+        entry = local_cache.get(full_key) or get_shared_cache().get(full_key)
+
+        if entry is None:
+            return None
+
+        cache_stats.incr(self.namespace, "stale")
+        return entry[0], 0.0
+
+    def _get_or_compute(
+        self, full_key: str, entry: Optional[tuple], compute: Callable[[], Any], timeout: int, stale_timeout: int
+    ) -> Any:
+        lock = self._lock(full_key)
+
+        if lock is None:
+            if entry is not None:
+                # Other process recomputes the value
+                return entry[0]
+
+            entry = self._wait(full_key)
+
+            if entry is not None:
+                return entry[0]
+
+        try:
+            return self._compute(full_key, compute, timeout, stale_timeout)
+        finally:
+            if lock is not None:
+                self._unlock(full_key, lock)
+
+    def _lock_local(self, full_key: str) -> Optional[threading.Lock]:
+        """
+        :param full_key:
+        :return: acquired lock if it's taken by this call, None if other thread holds it
+        """
+        with self._mutex:
+            if full_key in self._local_locks:
+                return None
+
+            lock = self._local_locks[full_key] = threading.Lock()
+            lock.acquire()
+            return lock
+
+    def _unlock_local(self, full_key: str, lock: threading.Lock):
+        with self._mutex:
+            del self._local_locks[full_key]
+
+        lock.release()
+
+    def _wait_local(self, full_key: str) -> Optional[tuple[Any, float]]:
+        """
+        Wait for the value computed by other thread of the process
+        :param full_key:
+        :return: entry, None if the thread didn't cache any value within WAIT_TIMEOUT seconds
+        """
+        with self._mutex:
+            lock = self._local_locks.get(full_key)
+
+        if lock is not None and lock.acquire(timeout=self.config["WAIT_TIMEOUT"]):
+            lock.release()
+
+        return local_cache.get(full_key) or get_shared_cache().get(full_key)
+
+    def _lock(self, full_key: str) -> Optional[str]:
+        """
+        :param full_key:
+        :return: lock token if the lock is taken by this call, None if it's held by someone else
+        """
+        token = uuid.uuid4().hex
+
+        if get_shared_cache().add(f"{full_key}:lock", token, timeout=self.config["LOCK_TIMEOUT"]):
+            return token
+
+        return None
+
+    def _unlock(self, full_key: str, token: str):
+        # Lock could expire and be taken by someone else meanwhile
+        if get_shared_cache().get(f"{full_key}:lock") == token:
+            get_shared_cache().delete(f"{full_key}:lock")
+
+    def _wait(self, full_key: str) -> Optional[tuple[Any, float]]:
+        """
+        Wait for the value computed by the lock holder
+        :param full_key:
+        :return: entry, None if the lock is released without caching a value (e.g. it's not cacheable) or the value
+            didn't appear within WAIT_TIMEOUT seconds
+        """
+        lock_key = f"{full_key}:lock"
+        deadline = time.monotonic() + self.config["WAIT_TIMEOUT"]
+
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            values = get_shared_cache().get_many([full_key, lock_key])
+
+            if lock_key not in values and full_key not in values:
+                # Value could be set right after it was read
+                values = {full_key: get_shared_cache().get(full_key)}
+
+            entry = values.get(full_key)
+
+            if entry is not None:
+                local_cache.set(full_key, entry)
+                return entry
+
+            if lock_key not in values:
+                return None
+
+        return None
+
+    def _compute(self, full_key: str, compute: Callable[[], Any], timeout: int, stale_timeout: int) -> Any:
+        value = compute()
+
+        if value is not None:
+            entry = (value, time.time() + timeout)
+            get_shared_cache().set(full_key, entry, timeout=timeout + stale_timeout)
+            local_cache.set(full_key, entry)
+
+        return value
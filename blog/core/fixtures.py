@@ -1,7 +1,13 @@
 import pytest
+from django.core.cache import cache
+from django.db import connection
 from rest_framework.response import Response as RestResponse
 from rest_framework.test import APIClient
-from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.cache import cache_stats, local_cache
+from core.throttling import bucket_throttling
+from users.authentication import UserRefreshToken, user_state_cache
+from users.blacklist import blacklist_filter
 
 
 class AnnotatedResponse(RestResponse):
@@ -26,7 +32,7 @@ class JWTClient(APIClient):
             return
 
         if token is None:
-            refresh_token = RefreshToken.for_user(user)
+            refresh_token = UserRefreshToken.for_user(user)
             token = f"Bearer {refresh_token.access_token}"
 
         self.credentials(HTTP_AUTHORIZATION=token)
@@ -36,3 +42,52 @@ class JWTClient(APIClient):
 def api_client():
     client = JWTClient()
     return client
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Cache outlives test database transactions, so it gets cleared for every test together with in-process caches
+    :return:
+    """
+    cache.clear()
+    local_cache.clear()
+    cache_stats.clear()
+    user_state_cache.clear()
+    blacklist_filter.clear()
+    bucket_throttling.clear()
+    yield
+    cache.clear()
+    local_cache.clear()
+    cache_stats.clear()
+    user_state_cache.clear()
+    blacklist_filter.clear()
+    bucket_throttling.clear()
+
+
+@pytest.fixture()
+def no_seqscan(db):
+    """
+    Disable sequential scans for the current test transaction, so that query plans show whether index can be used
+
+    Query plan assertions make sense on PostgreSQL only, so test is skipped for other databases
+    :param db:
+    :return:
+    """
+    if connection.vendor != "postgresql":
+        pytest.skip("Query plan assertions require PostgreSQL")
+
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+
+
+@pytest.fixture()
+def prefer_index_scan(db):
+    """
+    Same as no_seqscan, but runs on every database, e.g. for plain B-tree indexes which SQLite planner picks as well
+    :param db:
+    :return:
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
@@ -0,0 +1,187 @@
+from collections import Counter
+from typing import Callable
+
+from django.db import connections, models, transaction
+from django.db.models import functions
+
+
+class CounterQuerySet(models.QuerySet):
+    def change_counter(self, field_name: str, delta: int) -> int:
+        """
+        Atomically change stored counter by delta using single UPDATE statement, counter doesn't go below 0
+        :param field_name: name of integer counter field
+        :param delta: positive or negative change
+        :return: number of updated rows
+        """
+        if not delta:
+            return 0
+
+        if delta < 0:
+            # Counter may be behind actual rows (e.g. not reconciled yet), unsigned column rejects negative values
+            return self.update(**{field_name: functions.Greatest(models.F(field_name) + delta, 0)})
+
+        return self.update(**{field_name: models.F(field_name) + delta})
+
+    def change_counter_returning(self, pk, field_name: str, delta: int) -> int | None:
+        """
+        Atomically change stored counter of single row by delta, new value is returned by the same UPDATE statement
+
+        Same as change_counter, counter doesn't go below 0
+        :param pk: primary key of the row
+        :param field_name: name of integer counter field
+        :param delta: positive or negative change
+        :return: new counter value or None if row doesn't exist
+        """
+        if not delta:
+            return self.filter(pk=pk).values_list(field_name, flat=True).first()
+
+        quote_name = connections[self.db].ops.quote_name
+        opts = self.model._meta
+        table = quote_name(opts.db_table)
+        column = quote_name(opts.get_field(field_name).column)
+        pk_column = quote_name(opts.pk.column)
+
+        with connections[self.db].cursor() as cursor:
+            # CASE instead of GREATEST, since SQLite has no such function
+            cursor.execute(
+                f"UPDATE {table} SET {column} = CASE WHEN {column} + %s < 0 THEN 0 ELSE {column} + %s END "
+                f"WHERE {pk_column} = %s RETURNING {column}",
+                [delta, delta, pk],
+            )
+            row = cursor.fetchone()
+
+        return row[0] if row else None
+
+
+class InsertIgnoreQuerySet(models.QuerySet):
+    """
+    Single statement create / delete for rows guarded by unique constraint, e.g. likes
+
+    Both bypass model signals, so callers should handle side effects (e.g. cache invalidation) explicitly
+    """
+
+    def insert_ignore(self, **kwargs) -> bool:
+        """
+        INSERT ... ON CONFLICT DO NOTHING, so concurrent duplicates are skipped by unique constraint
+        :param kwargs: field values
+        :return: whether the row was inserted
+        """
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        opts = self.model._meta
+        instance = self.model(**kwargs)
+        fields = [one for one in opts.concrete_fields if not one.primary_key]
+
+        columns = ", ".join(quote_name(one.column) for one in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+        params = [one.get_db_prep_save(one.pre_save(instance, add=True), connection) for one in fields]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote_name(opts.db_table)} ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT DO NOTHING RETURNING {quote_name(opts.pk.column)}",
+                params,
+            )
+            return cursor.fetchone() is not None
+
+    def delete_fast(self) -> int:
+        """
+        Single DELETE statement without collecting related objects and sending signals
+        :return: number of deleted rows
+        """
+        # noinspection PyProtectedMember
+        return self._raw_delete(self.db)
+
+
+def count_subquery(queryset: models.QuerySet, group_by: str) -> models.Expression:
+    """
+    Correlated COUNT(*) over queryset grouped by group_by field. Evaluates to 0 if there are no rows
+    :param queryset: queryset filtered by models.OuterRef
+    :param group_by: name of the field referring to the outer row
+    :return:
+    """
+    queryset = queryset.order_by().values(group_by).annotate(count=models.Count("*")).values("count")
+    return functions.Coalesce(models.Subquery(queryset), 0)
+
+
+def related_str(instance: models.Model, field_name: str, attr_name: str = None) -> str:
+    """
+    Text of related object for __str__, which never queries the database
+    :param instance:
+    :param field_name: name of foreign key field
+    :param attr_name: attribute of related object, by default str() of related object is used
+    :return: related object text if it's already loaded (e.g. with select_related), otherwise its model name and id
+    """
+    field = instance._meta.get_field(field_name)
+
+    if not field.is_cached(instance):
+        return f"{field.related_model._meta.model_name} #{getattr(instance, field.attname)}"
+
+    related = field.get_cached_value(instance)
+    return str(getattr(related, attr_name) if attr_name else related)
+
+
+def delete_in_batches(
+    queryset: models.QuerySet, batch_size: int, group_by: str = None, on_batch: Callable[[Counter], None] = None
+) -> int:
+    """
+    Delete rows in primary key batches, one SELECT of ids and one DELETE per batch, so memory stays flat
+
+    Deletion collector and signals are bypassed, so rows referencing deleted ones should be deleted beforehand
+    :param queryset:
+    :param batch_size:
+    :param group_by: field to count deleted rows by, e.g. parent id to fix denormalized counters
+    :param on_batch: called within the batch transaction with counts of deleted rows per group_by value
+    :return: total number of deleted rows
+    """
+    fields = ["id", group_by] if group_by else ["id"]
+    deleted_count = 0
+    last_id = 0
+
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by("id").values_list(*fields)[:batch_size])
+
+        if not rows:
+            return deleted_count
+
+        with transaction.atomic(using=queryset.db):
+            batch = queryset.model._base_manager.using(queryset.db).filter(id__in=[one[0] for one in rows])
+            # noinspection PyProtectedMember
+            deleted_count += batch._raw_delete(queryset.db)
+
+            if on_batch is not None:
+                on_batch(Counter(one[-1] for one in rows) if group_by else Counter({None: len(rows)}))
+
+        last_id = rows[-1][0]
+
+
+def update_in_batches(queryset: models.QuerySet, batch_size: int, **values) -> int:
+    """
+    Update rows in primary key ranges, one transaction per range, so large tables aren't locked at once
+
+    Usable in migrations with atomic = False, e.g. to backfill a new column
+    :param queryset:
+    :param batch_size: number of rows per range
+    :param values: same as for QuerySet.update()
+    :return: total number of updated rows
+    """
+    updated_count = 0
+    last_id = 0
+
+    while True:
+        # Only the upper bound of the range is selected
+        upper_ids = list(
+            queryset.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[batch_size - 1 :][:1]
+        )
+        batch = queryset.filter(id__gt=last_id)
+
+        if upper_ids:
+            batch = batch.filter(id__lte=upper_ids[0])
+
+        with transaction.atomic(using=queryset.db):
+            updated_count += batch.update(**values)
+
+        if not upper_ids:
+            return updated_count
+
+        last_id = upper_ids[0]
@@ -0,0 +1,126 @@
+"""
+Custom migration operations
+"""
+
+from django.contrib.postgres import operations as postgres_operations
+from django.db import migrations, models
+
+
+class PostgresRunSQL(migrations.RunSQL):
+    """
+    RunSQL which is applied on PostgreSQL only, e.g. for GIN / trigram indexes
+
+    Such indexes are intentionally kept out of model state: SQLite (tests) remakes the whole table on most schema
+    changes and would try to recreate every index from the state, failing on PostgreSQL specific syntax
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class AddIndexConcurrently(postgres_operations.AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL, so that live tables aren't locked for writes while index is built
+
+    Other databases (SQLite in tests) get regular AddIndex. Migration should have atomic = False
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class RemoveFieldIndexConcurrently(migrations.operations.base.Operation):
+    """
+    DROP INDEX CONCURRENTLY of the single column index of a field, e.g. FK index covered by a composite one
+
+    Applied on PostgreSQL only and model state isn't changed, so wrap it with AlterField(db_index=False) in
+    SeparateDatabaseAndState for fields declared in models. Migration should have atomic = False
+    """
+
+    reversible = True
+
+    def __init__(self, model_name: str, field_name: str):
+        self.model_name = model_name
+        self.field_name = field_name
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {"model_name": self.model_name, "field_name": self.field_name}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def _get_index(self, app_label, schema_editor, state) -> tuple[str, str, str]:
+        """
+        :return: quoted index name, table and column, index name is the one generated by Django for db_index fields
+        """
+        model = state.apps.get_model(app_label, self.model_name)
+        column = model._meta.get_field(self.field_name).column
+        name = schema_editor._create_index_name(model._meta.db_table, [column], suffix="")
+        return tuple(schema_editor.quote_name(one) for one in (name, model._meta.db_table, column))
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            name, _, _ = self._get_index(app_label, schema_editor, from_state)
+            schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            name, table, column = self._get_index(app_label, schema_editor, to_state)
+            schema_editor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column});")
+
+    def describe(self):
+        return f"Remove index of {self.model_name}.{self.field_name} concurrently"
+
+    @property
+    def migration_name_fragment(self):
+        return f"remove_{self.model_name.lower()}_{self.field_name.lower()}_index"
+
+
+class AddUniqueConstraintConcurrently(migrations.AddConstraint):
+    """
+    Unique constraint backed by an index built with CREATE UNIQUE INDEX CONCURRENTLY on PostgreSQL
+
+    The index is then attached with ADD CONSTRAINT ... USING INDEX, which doesn't rescan the table. Other databases
+    (SQLite in tests) get regular AddConstraint. Migration should have atomic = False
+    """
+
+    def __init__(self, model_name: str, constraint: models.UniqueConstraint):
+        if not isinstance(constraint, models.UniqueConstraint) or not constraint.fields:
+            raise ValueError("Only unique constraints on fields can be added concurrently")
+        if constraint.condition or constraint.include or constraint.opclasses or constraint.deferrable:
+            raise ValueError("Unique constraints with options can't be added concurrently")
+        super().__init__(model_name, constraint)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        name = schema_editor.quote_name(self.constraint.name)
+        table = schema_editor.quote_name(model._meta.db_table)
+        columns = ", ".join(
+            schema_editor.quote_name(model._meta.get_field(one).column) for one in self.constraint.fields
+        )
+        # Invalid index of interrupted run is left behind by CONCURRENTLY and would be reused by IF NOT EXISTS
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+        schema_editor.execute(f"CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({columns});")
+        schema_editor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name};")
+
+    def describe(self):
+        return f"Create constraint {self.constraint.name} on model {self.model_name} concurrently"
@@ -0,0 +1,196 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page number pagination with opt-in keyset (cursor) mode
+
+    If `cursor` query parameter is present (it can be empty for the first page), results are fetched by seeking
+    on the current queryset ordering plus `id` as tie-breaker, e.g. `(created_at, id)`. Cursor mode never runs
+    `COUNT(*)` and doesn't use OFFSET, so it's cheap for deep pages
+    """
+
+    cursor_query_param = "cursor"
+    cursor_query_description = "Opt-in keyset pagination. Pass empty value for the first page, then follow `next` link"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.is_keyset = self.cursor_query_param in request.query_params
+
+        if not self.is_keyset:
+            return super().paginate_queryset(queryset, request, view=view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request.query_params[self.cursor_query_param])
+
+        if cursor is not None:
+            try:
+                queryset = queryset.filter(self.get_seek_condition(self.ordering, cursor))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset.order_by(*self.ordering)[: page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.is_keyset:
+            return super().get_paginated_response(data)
+
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count"]["description"] = "Not present in keyset (cursor) mode"
+        return response_schema
+
+    def get_next_link(self):
+        if not self.is_keyset:
+            return super().get_next_link()
+
+        if not self.has_next:
+            return None
+
+        last_obj = self.page[-1]
+        values = [self.get_value(last_obj, one.lstrip("-")) for one in self.ordering]
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.ordering, values))
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append(
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": self.cursor_query_description,
+                "schema": {"type": "string"},
+            }
+        )
+        return parameters
+
+    @staticmethod
+    def get_ordering(queryset: models.QuerySet) -> list[str]:
+        ordering = [one for one in queryset.query.order_by or queryset.model._meta.ordering if isinstance(one, str)]
+
+        if not ordering:
+            return ["id"]
+
+        if not {"id", "-id", "pk", "-pk"}.intersection(ordering):
+            prefix = "-" if ordering[-1].startswith("-") else ""
+            ordering.append(f"{prefix}id")
+
+        return ordering
+
+    @staticmethod
+    def get_value(obj, path: str):
+        for name in path.split("__"):
+            obj = getattr(obj, name)
+
+        return obj
+
+    @staticmethod
+    def get_seek_condition(ordering: list[str], values: list) -> models.Q:
+        """
+        Build condition selecting rows strictly after given key, e.g. for `(-created_at, -id)`:
+        `created_at <= v1 AND (created_at < v1 OR (created_at = v1 AND id < v2))`
+
+        Redundant bound on the first column lets the database use range scan over the index
+        :param ordering:
+        :param values:
+        :return:
+        """
+        condition = models.Q()
+        equal_condition = models.Q()
+
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal_condition & models.Q(**{f"{name}__{lookup}": value})
+            equal_condition &= models.Q(**{name: value})
+
+        first_field = ordering[0]
+        lookup = "lte" if first_field.startswith("-") else "gte"
+        return models.Q(**{f"{first_field.lstrip('-')}__{lookup}": values[0]}) & condition
+
+    @staticmethod
+    def encode_cursor(ordering: list[str], values: list) -> str:
+        payload = json.dumps({"o": ordering, "v": values}, default=str)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor: str):
+        """
+        Decode cursor into key values. Cursor must have been issued for the same ordering
+        :param cursor:
+        :return: list of key values or None for the first page
+        """
+        if not cursor:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(payload, dict) or payload.get("o") != self.ordering:
+            raise NotFound(self.invalid_cursor_message)
+
+        values = payload.get("v")
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return values
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists of large tables, which uses planner row estimate instead of `COUNT(*)`
+
+    Estimates are available on PostgreSQL only. Small estimates are replaced with exact count, so that short lists
+    have correct page numbers; for large ones the last pages may turn out to be empty
+    """
+
+    exact_count_threshold = 10_000
+
+    @cached_property
+    def count(self) -> int:
+        estimate = self.get_estimated_count()
+
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+
+        return estimate
+
+    def get_estimated_count(self) -> int | None:
+        queryset = self.object_list
+
+        if not isinstance(queryset, models.QuerySet) or connections[queryset.db].vendor != "postgresql":
+            return None
+
+        plan = json.loads(queryset.order_by().explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,26 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection, models
+from django.db.models import functions
+
+
+def fuzzy_search(queryset: models.QuerySet, field_name: str, value: str, rank_field="similarity") -> models.QuerySet:
+    """
+    Typo-tolerant search annotated with similarity rank in range [0, 1]
+
+    On PostgreSQL uses trigram similarity (`%` operator) over `UPPER(field)`, so that the same trigram GIN index
+    backs both `icontains` and fuzzy search. Other databases fall back to case-insensitive substring search
+    :param queryset:
+    :param field_name:
+    :param value:
+    :param rank_field: name of annotated similarity field
+    :return:
+    """
+    if connection.vendor == "postgresql":
+        expression = functions.Upper(field_name)
+        queryset = queryset.alias(**{f"{field_name}_upper": expression})
+        queryset = queryset.filter(**{f"{field_name}_upper__trigram_similar": value})
+        return queryset.annotate(**{rank_field: TrigramSimilarity(expression, value)})
+
+    queryset = queryset.filter(**{f"{field_name}__icontains": value})
+    similarity = models.Value(float(len(value))) / functions.Length(field_name)
+    return queryset.annotate(**{rank_field: models.ExpressionWrapper(similarity, output_field=models.FloatField())})
@@ -1,4 +1,6 @@
-from rest_framework import serializers
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from rest_framework import relations, serializers
 
 
 class EmptySerializer(serializers.Serializer):
@@ -7,3 +9,141 @@ class EmptySerializer(serializers.Serializer):
     """
 
     pass
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    ManyRelatedField which resolves all primary keys with single query instead of one query per value
+    """
+
+    default_error_messages = {
+        "does_not_exist": 'Invalid pks "{pk_values}" - objects do not exist.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        queryset = self.child_relation.get_queryset()
+        model_pk = queryset.model._meta.pk
+        # Duplicates are dropped, order of the first occurrences is kept
+        pk_values = list(dict.fromkeys(self.to_pk_value(model_pk, one) for one in data))
+
+        objects = queryset.in_bulk(pk_values)
+        missing_pk_values = [one for one in pk_values if one not in objects]
+
+        if missing_pk_values:
+            self.fail("does_not_exist", pk_values=missing_pk_values)
+
+        return [objects[one] for one in pk_values]
+
+    def to_pk_value(self, model_pk: models.Field, value):
+        """
+        :param model_pk: primary key field of related model
+        :param value: item of input list
+        :return: primary key value
+        """
+        if isinstance(model_pk, models.IntegerField):
+            # to_python() would turn floats and booleans into integers, e.g. 1.5 -> 1 and True -> 1
+            is_valid = (isinstance(value, int) and not isinstance(value, bool)) or (
+                isinstance(value, str) and value.isascii() and value.isdigit()
+            )
+
+            if not is_valid:
+                self.child_relation.fail("incorrect_type", data_type=type(value).__name__)
+
+        try:
+            return model_pk.to_python(value)
+        except (DjangoValidationError, TypeError):
+            self.child_relation.fail("incorrect_type", data_type=type(value).__name__)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField which uses BulkManyRelatedField with many=True
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+
+        for key in kwargs:
+            if key in relations.MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class IsLikedListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer which looks up likes of current user for the whole page with single query
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+
+        if "is_liked" in self.child.fields:
+            self.child.liked_ids = self.child.get_liked_ids(items)
+
+        return super().to_representation(items)
+
+
+class IsLikedMixin(serializers.Serializer):
+    """
+    Adds is_liked flag of current user, the field is omitted for anonymous users
+
+    Use with IsLikedListSerializer as Meta.list_serializer_class
+    """
+
+    like_queryset: models.QuerySet = None
+    like_parent_field: str = None
+    liked_ids: set = None
+
+    is_liked = serializers.SerializerMethodField(help_text="Whether current user liked it, only for authorized users")
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+
+        if request is not None and not request.user.is_authenticated:
+            fields.pop("is_liked")
+
+        return fields
+
+    def get_liked_ids(self, items) -> set:
+        """
+        :param items: liked objects, e.g. page of posts
+        :return: ids of items liked by current user
+        """
+        queryset = self.like_queryset.filter(
+            user_id=self.context["request"].user.id,
+            **{f"{self.like_parent_field}__in": [one.id for one in items]},
+        )
+        liked_ids = set(queryset.values_list(self.like_parent_field, flat=True))
+
+        for parent_id, is_liked in self.get_pending_likes().items():
+            if is_liked:
+                liked_ids.add(parent_id)
+            else:
+                liked_ids.discard(parent_id)
+
+        return liked_ids
+
+    def get_pending_likes(self) -> dict:
+        """
+        Likes of current user, which aren't stored yet
+        :return: parent id -> is_liked
+        """
+        return {}
+
+    def to_representation(self, instance):
+        # Single object, e.g. detail response
+        if self.liked_ids is None and "is_liked" in self.fields:
+            self.liked_ids = self.get_liked_ids([instance])
+
+        return super().to_representation(instance)
+
+    def get_is_liked(self, instance) -> bool:
+        return instance.id in self.liked_ids
@@ -0,0 +1,204 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """
+    :param rate: e.g. "10/min", same format as rest_framework rates
+    :return: bucket capacity and tokens added back per second
+    """
+    count, period = rate.split("/")
+    return int(count), int(count) / PERIODS[period[0]]
+
+
+def take_token(bucket: Optional[tuple[float, float]], capacity: int, refill_rate: float, now: float):
+    """
+    :param bucket: tokens left and time of the last update, None for a new bucket
+    :param capacity:
+    :param refill_rate: tokens added back per second
+    :param now:
+    :return: updated bucket and seconds until a token is available, 0 if one was taken
+    """
+    tokens, updated_at = bucket or (capacity, now)
+    tokens = min(capacity, tokens + max(now - updated_at, 0) * refill_rate)
+
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+
+    return (tokens, now), (1 - tokens) / refill_rate
+
+
+class LocalBucketStore:
+    """
+    In-process store of token buckets, each worker process limits requests on its own
+
+    Least recently used buckets are dropped once there are more than max_size of them, so they start full again.
+    Shared stores should implement the same methods and be set by THROTTLING["STORE"] setting
+    """
+
+    max_size = 100000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def consume(self, key: str, capacity: int, refill_rate: float, now: float) -> float:
+        """
+        :return: seconds until a token is available, 0 if one was taken
+        """
+        with self._lock:
+            bucket, wait = take_token(self._buckets.pop(key, None), capacity, refill_rate, now)
+            self._buckets[key] = bucket
+
+            if len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+
+        return wait
+
+
+class CacheBucketStore:
+    """
+    Token buckets in Django cache, shared between processes
+
+    Bucket is read and written without locking, so concurrent requests of the same client may take a few extra tokens
+    """
+
+    namespace = "throttling"
+
+    def consume(self, key: str, capacity: int, refill_rate: float, now: float) -> float:
+        cache_key = f"{self.namespace}:{key}"
+        bucket, wait = take_token(cache.get(cache_key), capacity, refill_rate, now)
+        # Bucket is full again after that time, so it's the same as missing one
+        cache.set(cache_key, bucket, timeout=math.ceil(capacity / refill_rate) + 1)
+        return wait
+
+
+class BucketThrottling:
+    """
+    Token bucket rate limits of views, see THROTTLING setting and TokenBucketThrottle
+    """
+
+    def __init__(self):
+        self._store = None
+        self._rates = {}
+
+    @property
+    def config(self) -> dict:
+        return settings.THROTTLING
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.config["ENABLED"]
+
+    @property
+    def store(self) -> LocalBucketStore:
+        if self._store is None:
+            self._store = import_string(self.config["STORE"])()
+
+        return self._store
+
+    def get_rate(self, scope: str) -> Optional[tuple[int, float]]:
+        """
+        :param scope:
+        :return: bucket capacity and tokens added back per second, None if scope isn't limited
+        """
+        rate = self.config["RATES"].get(scope)
+
+        if rate is None:
+            return None
+
+        if rate not in self._rates:
+            self._rates[rate] = parse_rate(rate)
+
+        return self._rates[rate]
+
+    def consume(self, scope: str, ident: str) -> float:
+        """
+        :param scope:
+        :param ident: client identity, e.g. user id
+        :return: seconds until the client may send request to the scope, 0 if request is allowed
+        """
+        rate = self.get_rate(scope)
+
+        if not self.is_enabled or rate is None:
+            return 0
+
+        return self.store.consume(f"{scope}:{ident}", *rate, time.time())
+
+    def clear(self):
+        self._store = None
+        self._rates = {}
+
+
+bucket_throttling = BucketThrottling()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Limits requests per user, or per IP address for anonymous users, by throttle_scope of the view
+
+    Rate "10/min" lets client send 10 requests at once and then one more every 6 seconds
+    """
+
+    scope_attr = "throttle_scope"
+
+    def __init__(self):
+        self.wait_time = 0
+
+    def allow_request(self, request, view) -> bool:
+        scope = getattr(view, self.scope_attr, None)
+
+        if scope is None:
+            return True
+
+        ident = self.get_client_ident(request)
+
+        if ident is None:
+            return True
+
+        self.wait_time = bucket_throttling.consume(scope, ident)
+        return not self.wait_time
+
+    def get_client_ident(self, request) -> Optional[str]:
+        """
+        :param request:
+        :return: bucket key within the scope, None if request isn't limited
+        """
+        if request.user.is_authenticated:
+            return f"user:{request.user.id}"
+
+        # IP address is taken from X-Forwarded-For only behind NUM_PROXIES trusted proxies
+        return f"ip:{self.get_ident(request)}"
+
+    def wait(self) -> int:
+        # Retry-After header is rounded down by rest_framework
+        return math.ceil(self.wait_time)
+
+
+class UsernameBucketThrottle(TokenBucketThrottle):
+    """
+    Limits requests per submitted username by username_throttle_scope of the view, e.g. logins to one account
+    """
+
+    scope_attr = "username_throttle_scope"
+
+    def get_client_ident(self, request) -> Optional[str]:
+        # Body may be any JSON, e.g. a list
+        username = request.data.get("username") if isinstance(request.data, dict) else None
+
+        if not isinstance(username, str) or not username:
+            return None
+
+        # Username is hashed, so any value is a valid cache key
+        return f"username:{hashlib.sha1(username.lower().encode()).hexdigest()}"
@@ -1,6 +1,11 @@
+import hashlib
+import json
 import typing as t
 
 from django.db import models
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date, parse_http_date_safe
 from rest_framework import permissions, serializers
 from rest_framework.viewsets import GenericViewSet
 
@@ -9,6 +14,7 @@ class ActionViewSet(GenericViewSet):
     action_serializers: dict[str, t.Type[serializers.Serializer]] = {}
     action_permissions: dict[str, t.Type[permissions.BasePermission]] = {}
     action_querysets: dict[str, models.QuerySet] = {}
+    action_throttle_scopes: dict[str, str] = {}
 
     def get_serializer_class(self):
         ser = self.action_serializers.get(self.action, self.serializer_class)
@@ -21,3 +27,112 @@ class ActionViewSet(GenericViewSet):
     def get_queryset(self):
         queryset = self.action_querysets.get(self.action, self.queryset)
         return queryset
+
+    @property
+    def throttle_scope(self):
+        return self.action_throttle_scopes.get(self.action)
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for list and retrieve actions, see ConditionalListMixin and ConditionalRetrieveMixin
+
+    Validators of retrieve action are computed from a single aggregate query over the object (e.g. `updated_at` and
+    counters), so `304 Not Modified` is returned without running the serializer. Lists get ETag of the returned page
+    instead, see ConditionalListMixin.
+
+    Last-Modified is sent by retrieve action only, if the view sets last_modified_aggregate to a value which every change
+    of the object moves. Denormalized counters, deletions and soft deletes don't change `updated_at`, so lists and
+    objects with counters rely on ETag only
+    """
+
+    etag_aggregates: dict[str, models.Aggregate] = {
+        "updated_at": models.Max("updated_at"),
+        "count": models.Count("id"),
+    }
+    last_modified_aggregate: t.Optional[str] = None
+
+    def get_conditional_queryset(self) -> models.QuerySet:
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+
+    def get_etag_values(self) -> dict:
+        """
+        :return: values of etag_aggregates, views may add state which isn't stored in the object yet
+        """
+        return self.get_conditional_queryset().order_by().aggregate(**self.etag_aggregates)
+
+    def get_conditional_headers(self) -> dict[str, str]:
+        values = self.get_etag_values()
+
+        if not values["count"]:
+            # Object doesn't exist
+            return {}
+
+        headers = {"ETag": self.get_etag(sorted((name, str(value)) for name, value in values.items()))}
+
+        if self.last_modified_aggregate is not None:
+            headers["Last-Modified"] = http_date(values[self.last_modified_aggregate].timestamp())
+
+        return headers
+
+    def get_etag(self, value) -> str:
+        """
+        :param value: JSON serializable representation of the response, URL and current user are added to it
+        :return: quoted ETag
+        """
+        payload = [self.request.build_absolute_uri(), self.request.user.id, value]
+        return quote_etag(hashlib.md5(json.dumps(payload, default=str).encode()).hexdigest())
+
+    def get_not_modified_response(self, request, headers: dict[str, str]) -> t.Optional[HttpResponse]:
+        if not headers:
+            return None
+
+        response = HttpResponse(headers=headers)
+        last_modified = parse_http_date_safe(headers["Last-Modified"]) if "Last-Modified" in headers else None
+        conditional_response = get_conditional_response(request, headers["ETag"], last_modified, response)
+        return conditional_response if conditional_response is not response else None
+
+    def conditional(self, handler, request, *args, **kwargs):
+        headers = self.get_conditional_headers()
+
+        not_modified_response = self.get_not_modified_response(request, headers)
+        if not_modified_response is not None:
+            return not_modified_response
+
+        response = handler(request, *args, **kwargs)
+
+        if response.status_code == 200:
+            for name, value in headers.items():
+                response.headers[name] = value
+
+        return response
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+    """
+    ETag of the list is a hash of the serialized page
+
+    Aggregates over the whole filtered queryset would scan it on each request (also in keyset mode) and could collide,
+    e.g. like of one post and unlike of another one on the same page. On match only the response body isn't sent
+    """
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+
+        if response.status_code != 200:
+            return response
+
+        headers = {"ETag": self.get_etag(response.data)}
+        not_modified_response = self.get_not_modified_response(request, headers)
+        if not_modified_response is not None:
+            return not_modified_response
+
+        response.headers["ETag"] = headers["ETag"]
+        return response
+
+
+class ConditionalRetrieveMixin(ConditionalGetMixin):
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
@@ -1,7 +1,10 @@
 from django.contrib import admin
-from django.core.mail.message import EmailMultiAlternatives
 
 import emails.models
+import emails.resend
+from core.pagination import EstimatedCountPaginator
+from emails.balancer import credentials_balancer
+from emails.outbox import email_outbox
 
 
 @admin.register(emails.models.UnsentEmail)
@@ -24,7 +27,13 @@ class UnsentEmailAdmin(admin.ModelAdmin):
     )
     search_fields = ("user__email", "user__username", "subject")
     list_filter = ("reason",)
+    autocomplete_fields = ("user",)
     actions = ["resend_emails"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Larger selections are moved to the outbox instead of being sent within the request
+    resend_sync_limit = 100
+    resend_batch_size = 100
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
@@ -33,20 +42,15 @@ class UnsentEmailAdmin(admin.ModelAdmin):
 
     @admin.action(description="Re-send selected emails")
     def resend_emails(self, request, queryset):
-        sent_count = 0
         total_count = queryset.count()
 
-        for model in queryset:
-            email = EmailMultiAlternatives(
-                subject=model.subject,
-                body=model.plain_text,
-                to=[model.user.email],
-            )
-            email.attach_alternative(model.html_text, "text/html")
-            sent_count += email.send(fail_silently=True)
+        if email_outbox.is_enabled and total_count > self.resend_sync_limit:
+            queued_count = emails.resend.queue_unsent_emails(queryset, self.resend_batch_size)
+            msg = f"Queued {queued_count} emails out of {total_count} requested, they will be sent in background"
+        else:
+            sent_count, failed_count = emails.resend.send_unsent_emails(queryset, self.resend_batch_size)
+            msg = f"Successfully sent {sent_count} emails out of {total_count} requested, {failed_count} failed"
 
-        queryset.delete()
-        msg = f"Successfully sent {sent_count} emails out of {total_count} requested"
         self.message_user(request, message=msg)
 
 
@@ -56,6 +60,7 @@ class EmailCredentialsAdmin(admin.ModelAdmin):
         (None, {"fields": ("host", "port", "username", "password", "from_email")}),
         ("Misc", {"fields": ("id", "created_at", "updated_at", "are_active")}),
         ("Extra", {"fields": ("use_tls", "use_ssl", "fail_silently", "timeout")}),
+        ("Limits", {"fields": ("rate_limit", "max_connections")}),
     )
     readonly_fields = (
         "id",
@@ -66,7 +71,48 @@ class EmailCredentialsAdmin(admin.ModelAdmin):
         "created_at",
         "from_email",
         "are_active",
+        "is_healthy",
+        "sent_count",
+        "failed_count",
     )
     ordering = ("are_active", "-created_at")
     search_fields = ("host", "username", "from_email")
     list_filter = ("are_active", "from_email")
+
+    @admin.display(boolean=True, description="Healthy")
+    def is_healthy(self, obj):
+        return credentials_balancer.get_stats(obj)["is_healthy"]
+
+    @admin.display(description="Sent")
+    def sent_count(self, obj):
+        return credentials_balancer.get_stats(obj)["sent"]
+
+    @admin.display(description="Failed")
+    def failed_count(self, obj):
+        return credentials_balancer.get_stats(obj)["failed"]
+
+
+@admin.register(emails.models.OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    fieldsets = (
+        (None, {"fields": ("user", "to", "from_email")}),
+        ("Delivery", {"fields": ("attempts", "next_attempt_at", "last_error")}),
+        ("Misc", {"fields": ("id", "created_at", "updated_at")}),
+        ("Content", {"fields": ("subject", "plain_text", "html_text"), "classes": ("collapsed",)}),
+    )
+    readonly_fields = (
+        "id",
+        "created_at",
+        "updated_at",
+    )
+    list_display = (
+        "created_at",
+        "to",
+        "subject",
+        "attempts",
+        "next_attempt_at",
+    )
+    search_fields = ("user__email", "subject")
+    autocomplete_fields = ("user",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
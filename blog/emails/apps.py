@@ -6,4 +6,4 @@ class EmailsConfig(AppConfig):
     name = "emails"
 
     def ready(self):
-        from emails.signals import on_reset_password_token_created
+        from emails.signals import on_credentials_changed, on_reset_password_token_created
@@ -1,15 +1,30 @@
 import smtplib
 
+from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 from django.core.mail.backends.smtp import EmailBackend
+from django.core.mail.message import sanitize_address
 
 import emails.models
 import users.models
+from emails.balancer import NoAvailableCredentials, credentials_balancer
+from emails.cache import credentials_cache
+from emails.outbox import email_outbox, get_html_text
+
+# Rejections of a particular message, which other credentials would get as well. SMTP session is still usable after them
+MESSAGE_SMTP_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)
 
 
 class MultiCredentialEmailBackend(EmailBackend):
     """
     Email sending backend which supports multiple credentials administered via emails.models.EmailCredentials model
+
+    Emails are spread over all active credentials, see emails.balancer.CredentialsBalancer. Each email goes to the next
+    credentials in turn and fails over to the following ones. Connections are kept open per credentials until close(),
+    so batches reuse one connection for each of them.
+
+    If outbox is used (see EMAIL_OUTBOX setting), emails are only saved to the database and sent later by
+    send_outbox_emails command
     """
 
     _db_field_names = (
@@ -24,9 +39,13 @@ class MultiCredentialEmailBackend(EmailBackend):
         "fail_silently",
     )
 
-    def __init__(self, fail_silently=None):
+    def __init__(self, fail_silently=None, use_outbox=None):
         self.overrides = {}
         self.from_email = None
+        self._connection_credentials = None
+        # Credentials id -> (credentials, connection) of open connections which aren't used by the current email
+        self._idle_connections = {}
+        self.use_outbox = email_outbox.is_enabled if use_outbox is None else use_outbox
 
         if fail_silently is not None:
             self.overrides["fail_silently"] = fail_silently
@@ -37,10 +56,17 @@ class MultiCredentialEmailBackend(EmailBackend):
     def clear_credentials(self):
         [setattr(self, name, None) for name in self._db_field_names]
 
-    def set_credentials(self):
-        creds = emails.models.EmailCredentials.objects.filter(are_active=True).order_by("-created_at").first()
+    def set_credentials(self, creds: emails.models.EmailCredentials = None):
+        """
+        Set connection params from credentials
+        :param creds: the newest active credentials by default
+        :return:
+        """
+        if creds is None:
+            creds = credentials_cache.get_latest()
 
-        creds_dict = {}
+        # Fields are reset if credentials got deactivated, since backend may be reused (e.g. by outbox worker)
+        creds_dict = dict.fromkeys(self._db_field_names)
         if creds is not None:
             creds_dict = {name: getattr(creds, name) for name in self._db_field_names}
 
@@ -48,68 +74,233 @@ class MultiCredentialEmailBackend(EmailBackend):
         [setattr(self, name, val) for name, val in creds_dict.items()]
 
     def send_messages(self, email_messages):
+        if self.use_outbox:
+            return len(email_outbox.enqueue(email_messages))
+
         self.set_credentials()
 
-        if self.host is not None:
-            return super().send_messages(email_messages)
+        if self.host is None:
+            reason = "Email credentials are not set"
+            self.archive_unsent_messages([(one, reason) for one in email_messages])
+
+            if not self.fail_silently:
+                raise ValueError(reason)
 
-        reason = "Email credentials are not set"
-        [self.archive_unsent_message(one, reason=reason) for one in email_messages]
+            return 0
 
-        if not self.fail_silently:
-            raise ValueError(reason)
+        sent_count = 0
+        failures = []
 
-        return 0
+        with self._lock:
+            is_connected = self.connection is not None or bool(self._idle_connections)
 
-    def _send(self, email_message: EmailMultiAlternatives) -> bool:
+            try:
+                for one in email_messages:
+                    # Email without recipients is silently ignored
+                    if not one.recipients():
+                        continue
+
+                    try:
+                        self.deliver(one)
+                    except smtplib.SMTPException as e:
+                        failures.append((one, str(e)))
+
+                        if not self.fail_silently:
+                            raise e
+                    else:
+                        sent_count += 1
+            finally:
+                self.archive_unsent_messages(failures)
+
+                if not is_connected:
+                    self.close()
+
+        return sent_count
+
+    def deliver(self, email_message: EmailMultiAlternatives):
         """
-        Send email and return result as bool
+        Send email with one of available credentials. Unlike send_messages, failed email isn't archived
 
-        If email_message.to is not specified, message is silently ignored
+        Connection, authentication and sender errors are counted against credentials and email is retried with the next
+        ones. Connection is dropped on such errors, so next call reconnects
+        :param email_message:
+        :return:
+        :raise ValueError: if there are no active credentials
+        :raise smtplib.SMTPException: if email wasn't sent
+        """
+        candidates = credentials_balancer.get_candidates()
+
+        if not candidates and not credentials_cache.get_all():
+            raise ValueError("Email credentials are not set")
+
+        error = None
+
+        for creds in candidates:
+            if not credentials_balancer.acquire_rate(creds) or not self.switch_credentials(creds):
+                continue
+
+            try:
+                self.open()
+
+                if self.connection is None:
+                    raise smtplib.SMTPServerDisconnected("Failed to connect")
+
+                self._sendmail(email_message)
+            except MESSAGE_SMTP_ERRORS:
+                raise
+            except OSError as e:
+                # smtplib.SMTPException is subclass of OSError
+                self.reset_connection()
+                credentials_balancer.record_failure(creds)
+                error = e
+                continue
+
+            credentials_balancer.record_success(creds)
+            return
+
+        raise error or NoAvailableCredentials("All email credentials are unhealthy, rate limited or busy")
+
+    def _sendmail(self, email_message: EmailMultiAlternatives):
+        """
+        Same as EmailBackend._send, but errors aren't silenced, so they can be counted against credentials
         :param email_message:
         :return:
         """
         if email_message.from_email is None:
             email_message.from_email = self.from_email
 
-        try:
-            is_sent = super()._send(email_message)
-        except smtplib.SMTPException as e:
-            self.archive_unsent_message(email_message, reason=str(e))
-            raise e
+        encoding = email_message.encoding or settings.DEFAULT_CHARSET
+        from_email = sanitize_address(email_message.from_email, encoding)
+        recipients = [sanitize_address(one, encoding) for one in email_message.recipients()]
+        message = email_message.message()
+        self.connection.sendmail(from_email, recipients, message.as_bytes(linesep="\r\n"))
 
-        if not is_sent:
-            reason = "Failed silently"
-            self.archive_unsent_message(email_message, reason=reason)
+    def switch_credentials(self, creds: emails.models.EmailCredentials) -> bool:
+        """
+        Use credentials for the next email, current connection is kept idle if it uses other ones
+        :param creds:
+        :return: False if credentials have no free connection slots
+        """
+        current = self._connection_credentials
+
+        # Changed credentials are compared by update time, so connection gets reopened with new params
+        if (
+            self.connection is not None
+            and current is not None
+            and (current.id, current.updated_at)
+            == (
+                creds.id,
+                creds.updated_at,
+            )
+        ):
+            return True
+
+        self.park_connection()
+        idle_creds, connection = self._idle_connections.pop(creds.id, (None, None))
+
+        if idle_creds is not None and idle_creds.updated_at == creds.updated_at:
+            # Connection slot is still held by the idle connection
+            self.connection = connection
+        else:
+            if idle_creds is not None:
+                connection.close()
+                credentials_balancer.release_connection(idle_creds)
 
-        return is_sent
+            if not credentials_balancer.acquire_connection(creds):
+                return False
 
-    def archive_unsent_message(self, email_message: EmailMultiAlternatives, reason="Unknown"):
+        self._connection_credentials = creds
+        self.set_credentials(creds)
+        return True
+
+    def park_connection(self):
         """
-        Save email if it contains valid info but wasn't send for some reason
-        :param email_message:
-        :param reason:
+        Keep current connection open for later emails with the same credentials
         :return:
         """
-        if not email_message.to:
+        if self.connection is None or self._connection_credentials is None:
+            self.reset_connection()
             return
 
-        user = users.models.User.objects.filter(email=email_message.to[0]).first()
-        if user is None:
+        self._idle_connections[self._connection_credentials.id] = (self._connection_credentials, self.connection)
+        self.connection = None
+        self._connection_credentials = None
+
+    def close_idle_connections(self):
+        """
+        Send QUIT over idle connections, errors are ignored since emails were already sent over them
+        :return:
+        """
+        idle_connections, self._idle_connections = self._idle_connections, {}
+
+        for creds, connection in idle_connections.values():
+            try:
+                connection.quit()
+            except OSError:
+                connection.close()
+            finally:
+                credentials_balancer.release_connection(creds)
+
+    def reset_connection(self):
+        """
+        Drop connection without QUIT command, e.g. when it's broken
+        :return:
+        """
+        if self.connection is not None:
+            self.connection.close()
+
+        self.connection = None
+        self.release_connection()
+
+    def release_connection(self):
+        if self._connection_credentials is not None:
+            credentials_balancer.release_connection(self._connection_credentials)
+            self._connection_credentials = None
+
+    def archive_unsent_messages(self, failures: list[tuple[EmailMultiAlternatives, str]]):
+        """
+        Save emails which contain valid info but weren't sent for some reason
+        :param failures: emails with reasons
+        :return:
+        """
+        failures = [(email_message, reason) for email_message, reason in failures if email_message.to]
+
+        if not failures:
             return
 
-        html_content, _ = email_message.alternatives[0]
-        emails.models.UnsentEmail.objects.create(
-            user_id=user.id,
-            subject=email_message.subject,
-            plain_text=email_message.body,
-            html_text=html_content,
-            reason=reason,
+        user_ids = dict(
+            users.models.User.objects.filter(email__in={one.to[0] for one, _ in failures}).values_list("email", "id")
+        )
+        emails.models.UnsentEmail.objects.bulk_create(
+            [
+                emails.models.UnsentEmail(
+                    user_id=user_ids[email_message.to[0]],
+                    subject=email_message.subject,
+                    plain_text=email_message.body,
+                    html_text=get_html_text(email_message),
+                    reason=reason[:255],
+                )
+                for email_message, reason in failures
+                if email_message.to[0] in user_ids
+            ]
         )
 
+    def close_quietly(self):
+        """
+        Close connection, dropping it if QUIT command fails
+        :return:
+        """
+        try:
+            self.close()
+        except OSError:
+            self.reset_connection()
+
     def close(self):
         try:
+            self.close_idle_connections()
             super().close()
         except Exception:
             self.clear_credentials()
             raise
+        finally:
+            self.release_connection()
@@ -0,0 +1,132 @@
+import itertools
+import smtplib
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+import emails.models
+from emails.cache import credentials_cache
+
+
+class NoAvailableCredentials(smtplib.SMTPException):
+    """
+    All active credentials are unhealthy, rate limited or busy at the moment
+    """
+
+
+class CredentialsBalancer:
+    """
+    Spreads emails over all active email credentials, see EMAIL_CREDENTIALS_HEALTH setting
+
+    Health, rate limit windows and sent / failed counters are kept in Django cache, so they are shared between
+    processes. Connection limits are per process. Credentials get unhealthy after FAILURE_THRESHOLD consecutive
+    failures and are skipped until COOL_DOWN seconds pass
+    """
+
+    namespace = "emails:credentials"
+    rate_window = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rotation = itertools.count()
+        self._connections = defaultdict(int)
+
+    @property
+    def config(self) -> dict:
+        return settings.EMAIL_CREDENTIALS_HEALTH
+
+    def _key(self, credentials: emails.models.EmailCredentials, name: str) -> str:
+        return f"{self.namespace}:{credentials.id}:{name}"
+
+    def get_candidates(self) -> list[emails.models.EmailCredentials]:
+        """
+        :return: healthy active credentials, in round-robin order
+        """
+        credentials = credentials_cache.get_all()
+
+        if not credentials:
+            return []
+
+        unhealthy_keys = cache.get_many([self._key(one, "unhealthy") for one in credentials])
+        healthy = [one for one in credentials if self._key(one, "unhealthy") not in unhealthy_keys]
+
+        if not healthy:
+            return []
+
+        shift = next(self._rotation) % len(healthy)
+        return healthy[shift:] + healthy[:shift]
+
+    def acquire_rate(self, credentials: emails.models.EmailCredentials) -> bool:
+        """
+        Count email towards the rate limit of credentials
+        :param credentials:
+        :return: False if limit is reached within current window
+        """
+        if not credentials.rate_limit:
+            return True
+
+        key = self._key(credentials, f"rate:{int(time.time() // self.rate_window)}")
+        cache.add(key, 0, timeout=self.rate_window * 2)
+
+        try:
+            return cache.incr(key) <= credentials.rate_limit
+        except ValueError:
+            cache.set(key, 1, timeout=self.rate_window * 2)
+            return True
+
+    def acquire_connection(self, credentials: emails.models.EmailCredentials) -> bool:
+        """
+        Take one of connection slots of credentials in this process
+        :param credentials:
+        :return: False if all slots are taken
+        """
+        if not credentials.max_connections:
+            return True
+
+        with self._lock:
+            if self._connections[credentials.id] >= credentials.max_connections:
+                return False
+
+            self._connections[credentials.id] += 1
+            return True
+
+    def release_connection(self, credentials: emails.models.EmailCredentials):
+        if not credentials.max_connections:
+            return
+
+        with self._lock:
+            self._connections[credentials.id] = max(self._connections[credentials.id] - 1, 0)
+
+    def record_success(self, credentials: emails.models.EmailCredentials):
+        cache.delete(self._key(credentials, "failures"))
+        self._incr(self._key(credentials, "sent"))
+
+    def record_failure(self, credentials: emails.models.EmailCredentials):
+        self._incr(self._key(credentials, "failed"))
+
+        if self._incr(self._key(credentials, "failures")) >= self.config["FAILURE_THRESHOLD"]:
+            cache.set(self._key(credentials, "unhealthy"), True, timeout=self.config["COOL_DOWN"])
+            cache.delete(self._key(credentials, "failures"))
+
+    def get_stats(self, credentials: emails.models.EmailCredentials) -> dict:
+        values = cache.get_many([self._key(credentials, name) for name in ("sent", "failed", "unhealthy")])
+        return {
+            "sent": values.get(self._key(credentials, "sent"), 0),
+            "failed": values.get(self._key(credentials, "failed"), 0),
+            "is_healthy": self._key(credentials, "unhealthy") not in values,
+        }
+
+    def _incr(self, key: str) -> int:
+        cache.add(key, 0, timeout=None)
+
+        try:
+            return cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+            return 1
+
+
+credentials_balancer = CredentialsBalancer()
@@ -0,0 +1,63 @@
+import threading
+import uuid
+from typing import Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+import emails.models
+
+
+class CredentialsCache:
+    """
+    In-process cache of active email credentials
+
+    Every process keeps its own copy together with the version it was loaded at. The version is shared via Django cache
+    and gets replaced on any credentials change, so other processes reload their copies on next use
+    """
+
+    version_key = "emails:credentials:version"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._credentials = []
+
+    def get_version(self) -> Optional[str]:
+        version = cache.get(self.version_key)
+
+        if version is None:
+            # Version is missing, e.g. evicted, so changes could've been missed and a new one is required
+            cache.add(self.version_key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(self.version_key)
+
+        return version
+
+    def get_all(self) -> list[emails.models.EmailCredentials]:
+        """
+        :return: active credentials, newest first
+        """
+        version = self.get_version()
+
+        with self._lock:
+            # No version means there is no shared cache (e.g. dummy one), so nothing is kept between calls
+            if version is None or version != self._version:
+                self._credentials = list(
+                    emails.models.EmailCredentials.objects.filter(are_active=True).order_by("-created_at")
+                )
+                self._version = version
+
+            return self._credentials
+
+    def get_latest(self) -> Optional[emails.models.EmailCredentials]:
+        credentials = self.get_all()
+        return credentials[0] if credentials else None
+
+    def invalidate(self):
+        cache.set(self.version_key, uuid.uuid4().hex, timeout=None)
+
+    def invalidate_on_commit(self):
+        transaction.on_commit(self.invalidate)
+
+
+credentials_cache = CredentialsCache()
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management import BaseCommand, CommandParser
+from django.db import close_old_connections
+
+from emails.backends import MultiCredentialEmailBackend
+from emails.outbox import email_outbox
+
+
+class Command(BaseCommand):
+    help = "Sends emails from the outbox in batches over a reused SMTP connection, failed emails are retried later"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--batch-size", "-b", type=int, default=100, help="Number of emails claimed at once")
+        parser.add_argument("--loop", "-l", action="store_true", help="Keep waiting for new emails instead of exiting")
+        parser.add_argument(
+            "--interval", "-i", type=float, default=5, help="Delay in seconds between checks of empty outbox"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        backend = MultiCredentialEmailBackend(fail_silently=False, use_outbox=False)
+
+        try:
+            while True:
+                sent_count, failed_count = email_outbox.send_batch(backend, batch_size)
+
+                if sent_count or failed_count:
+                    self.stdout.write(f"Sent {sent_count} email(s), {failed_count} failed")
+
+                if sent_count + failed_count == batch_size:
+                    continue
+
+                if not options["loop"]:
+                    break
+
+                # Servers drop idle connections anyway
+                backend.close_quietly()
+                time.sleep(options["interval"])
+                close_old_connections()
+        finally:
+            backend.close_quietly()
@@ -0,0 +1,28 @@
+# Generated by Django 4.1 on 2026-10-18 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emails", "0008_outboxemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailcredentials",
+            name="max_connections",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Max number of simultaneous SMTP connections per worker process, 0 means no limit",
+            ),
+        ),
+        migrations.AddField(
+            model_name="emailcredentials",
+            name="rate_limit",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Max number of emails sent per minute by all workers, 0 means no limit",
+            ),
+        ),
+    ]
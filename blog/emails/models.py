@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class UnsentEmail(models.Model):
@@ -39,6 +40,13 @@ class EmailCredentials(models.Model):
         default=3600, help_text="Timeout in seconds for blocking operations like the connection attempt"
     )
 
+    rate_limit = models.PositiveIntegerField(
+        default=0, help_text="Max number of emails sent per minute by all workers, 0 means no limit"
+    )
+    max_connections = models.PositiveIntegerField(
+        default=0, help_text="Max number of simultaneous SMTP connections per worker process, 0 means no limit"
+    )
+
     are_active = models.BooleanField(
         default=True,
         help_text="If False, those credentials won't be used to send emails",
@@ -49,3 +57,31 @@ class EmailCredentials(models.Model):
 
     class Meta:
         verbose_name_plural = "Email Credentials"
+
+
+class OutboxEmail(models.Model):
+    """
+    Email waiting to be sent by send_outbox_emails command, see emails.outbox.EmailOutbox
+    """
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Recipient account, used to archive the email as UnsentEmail once all attempts fail
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE, null=True, blank=True)
+    to = models.JSONField(default=list)
+    from_email = models.CharField(max_length=255, blank=True)
+    subject = models.CharField(max_length=255)
+    plain_text = models.TextField()
+    html_text = models.TextField(blank=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.subject
+
+    class Meta:
+        verbose_name_plural = "Outbox Emails"
+        indexes = [models.Index(fields=["next_attempt_at"], name="outbox_next_attempt_at_idx")]
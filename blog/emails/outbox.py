@@ -0,0 +1,190 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+from django.db import transaction
+from django.utils import timezone
+
+import emails.models
+import users.models
+from emails.balancer import NoAvailableCredentials
+
+logger = logging.getLogger(__name__)
+
+
+def get_html_text(email_message: EmailMessage) -> str:
+    for content, mimetype in getattr(email_message, "alternatives", ()):
+        if mimetype == "text/html":
+            return content
+
+    return ""
+
+
+class EmailOutbox:
+    """
+    Database queue of outgoing emails, see EMAIL_OUTBOX setting
+
+    Emails are claimed by send_outbox_emails workers for LEASE_TIMEOUT seconds, so several workers don't send the same
+    email. Failed emails are retried with exponential backoff and archived as UnsentEmail after MAX_ATTEMPTS.
+    Only recipients, subject, plain text and html alternative are kept, which is all the project sends
+    """
+
+    @property
+    def config(self) -> dict:
+        return settings.EMAIL_OUTBOX
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.config["ENABLED"]
+
+    def enqueue(self, email_messages: list[EmailMessage]) -> list[emails.models.OutboxEmail]:
+        """
+        Save emails to the outbox, emails without recipients are ignored the same way backend does it
+        :param email_messages:
+        :return: created outbox rows
+        """
+        email_messages = [one for one in email_messages if one.to]
+
+        if not email_messages:
+            return []
+
+        user_ids = dict(
+            users.models.User.objects.filter(email__in={one.to[0] for one in email_messages}).values_list("email", "id")
+        )
+
+        return emails.models.OutboxEmail.objects.bulk_create(
+            [
+                emails.models.OutboxEmail(
+                    user_id=user_ids.get(one.to[0]),
+                    to=list(one.to),
+                    from_email=one.from_email or "",
+                    subject=one.subject,
+                    plain_text=one.body,
+                    html_text=get_html_text(one),
+                )
+                for one in email_messages
+            ]
+        )
+
+    def make_message(self, outbox_email: emails.models.OutboxEmail) -> EmailMultiAlternatives:
+        email_message = EmailMultiAlternatives(
+            subject=outbox_email.subject,
+            body=outbox_email.plain_text,
+            to=outbox_email.to,
+            from_email=outbox_email.from_email or None,
+        )
+
+        if outbox_email.html_text:
+            email_message.attach_alternative(outbox_email.html_text, "text/html")
+
+        return email_message
+
+    @transaction.atomic
+    def claim(self, batch_size: int) -> list[emails.models.OutboxEmail]:
+        """
+        Select due emails and postpone them by lease timeout, so other workers skip them
+        :param batch_size:
+        :return: claimed emails
+        """
+        now_dt = timezone.now()
+        outbox_emails = list(
+            emails.models.OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now_dt)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+
+        if outbox_emails:
+            emails.models.OutboxEmail.objects.filter(id__in=[one.id for one in outbox_emails]).update(
+                next_attempt_at=now_dt + timedelta(seconds=self.config["LEASE_TIMEOUT"]), updated_at=now_dt
+            )
+
+        return outbox_emails
+
+    def send_batch(self, backend, batch_size: int) -> tuple[int, int]:
+        """
+        Send a batch of due emails over backend connection, which is kept open for next batches
+        :param backend: emails.backends.MultiCredentialEmailBackend instance
+        :param batch_size:
+        :return: numbers of sent and failed emails
+        """
+        outbox_emails = self.claim(batch_size)
+
+        if not outbox_emails:
+            return 0, 0
+
+        sent_ids = []
+        failures = []
+
+        for index, outbox_email in enumerate(outbox_emails):
+            try:
+                backend.deliver(self.make_message(outbox_email))
+            except NoAvailableCredentials:
+                # Credentials are temporarily unavailable, so the rest is postponed without counting an attempt
+                self.postpone(outbox_emails[index:])
+                break
+            except (OSError, ValueError) as e:
+                # smtplib.SMTPException is subclass of OSError
+                failures.append((outbox_email, str(e) or e.__class__.__name__))
+            else:
+                sent_ids.append(outbox_email.id)
+
+        emails.models.OutboxEmail.objects.filter(id__in=sent_ids).delete()
+        self.fail(failures)
+        return len(sent_ids), len(failures)
+
+    def postpone(self, outbox_emails: list[emails.models.OutboxEmail]):
+        now_dt = timezone.now()
+        emails.models.OutboxEmail.objects.filter(id__in=[one.id for one in outbox_emails]).update(
+            next_attempt_at=now_dt + timedelta(seconds=self.config["RETRY_DELAY"]), updated_at=now_dt
+        )
+
+    def fail(self, failures: list[tuple[emails.models.OutboxEmail, str]]):
+        """
+        Schedule failed emails for retry, emails which ran out of attempts are moved to UnsentEmail
+        :param failures: emails with error messages
+        """
+        if not failures:
+            return
+
+        now_dt = timezone.now()
+        retried = []
+        dead = []
+
+        for outbox_email, error in failures:
+            outbox_email.attempts += 1
+            outbox_email.last_error = error
+            outbox_email.updated_at = now_dt
+
+            if outbox_email.attempts >= self.config["MAX_ATTEMPTS"]:
+                dead.append(outbox_email)
+                continue
+
+            delay = self.config["RETRY_DELAY"] * 2 ** (outbox_email.attempts - 1)
+            outbox_email.next_attempt_at = now_dt + timedelta(seconds=delay)
+            retried.append(outbox_email)
+
+        with transaction.atomic():
+            emails.models.OutboxEmail.objects.bulk_update(
+                retried, ["attempts", "last_error", "next_attempt_at", "updated_at"]
+            )
+            emails.models.UnsentEmail.objects.bulk_create(
+                [
+                    emails.models.UnsentEmail(
+                        user_id=one.user_id,
+                        subject=one.subject,
+                        plain_text=one.plain_text,
+                        html_text=one.html_text,
+                        reason=one.last_error[:255],
+                    )
+                    for one in dead
+                    if one.user_id is not None
+                ]
+            )
+            emails.models.OutboxEmail.objects.filter(id__in=[one.id for one in dead]).delete()
+
+        for one in dead:
+            logger.warning("Email %s to %s failed %s time(s): %s", one.id, one.to, one.attempts, one.last_error)
+
+
+email_outbox = EmailOutbox()
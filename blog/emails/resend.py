@@ -0,0 +1,120 @@
+"""
+Re-sending of unsent emails in batches
+
+Small selections are sent right away over one SMTP connection, large ones are moved to the outbox, so they are sent
+by send_outbox_emails command instead of admin request
+"""
+
+from typing import Iterator
+
+from django.core.mail import EmailMultiAlternatives
+from django.db import models, transaction
+from django.utils import timezone
+
+import emails.models
+from emails.backends import MultiCredentialEmailBackend
+from emails.balancer import NoAvailableCredentials
+
+
+def make_message(unsent_email: emails.models.UnsentEmail) -> EmailMultiAlternatives:
+    email_message = EmailMultiAlternatives(
+        subject=unsent_email.subject,
+        body=unsent_email.plain_text,
+        to=[unsent_email.user.email],
+    )
+    email_message.attach_alternative(unsent_email.html_text, "text/html")
+    return email_message
+
+
+def iter_batches(queryset: models.QuerySet, batch_size: int) -> Iterator[list[emails.models.UnsentEmail]]:
+    """
+    Iterate over unsent emails by id ranges, so rows deleted meanwhile don't shift batches
+    :param queryset:
+    :param batch_size:
+    :return:
+    """
+    last_id = 0
+
+    while True:
+        unsent_emails = list(queryset.filter(id__gt=last_id).select_related("user").order_by("id")[:batch_size])
+
+        if not unsent_emails:
+            return
+
+        yield unsent_emails
+        last_id = unsent_emails[-1].id
+
+
+def send_unsent_emails(queryset: models.QuerySet, batch_size: int) -> tuple[int, int]:
+    """
+    Send emails over one connection, sent ones are deleted and failed ones are kept with a new reason
+
+    Sending stops if there are no available credentials, the rest of emails is left as is
+    :param queryset: emails to send
+    :param batch_size: number of emails loaded at once
+    :return: numbers of sent and failed emails
+    """
+    backend = MultiCredentialEmailBackend(fail_silently=False, use_outbox=False)
+    sent_count = 0
+    failed_count = 0
+
+    try:
+        for unsent_emails in iter_batches(queryset, batch_size):
+            sent_ids = []
+            failed = []
+            is_stopped = False
+
+            for unsent_email in unsent_emails:
+                try:
+                    backend.deliver(make_message(unsent_email))
+                except (NoAvailableCredentials, ValueError):
+                    is_stopped = True
+                    break
+                except OSError as e:
+                    unsent_email.reason = (str(e) or e.__class__.__name__)[:255]
+                    unsent_email.updated_at = timezone.now()
+                    failed.append(unsent_email)
+                else:
+                    sent_ids.append(unsent_email.id)
+
+            emails.models.UnsentEmail.objects.filter(id__in=sent_ids).delete()
+            emails.models.UnsentEmail.objects.bulk_update(failed, ["reason", "updated_at"])
+            sent_count += len(sent_ids)
+            failed_count += len(failed)
+
+            if is_stopped:
+                break
+    finally:
+        backend.close_quietly()
+
+    return sent_count, failed_count
+
+
+def queue_unsent_emails(queryset: models.QuerySet, batch_size: int) -> int:
+    """
+    Move emails to the outbox
+    :param queryset: emails to send
+    :param batch_size: number of emails moved per transaction
+    :return: number of queued emails
+    """
+    queued_count = 0
+
+    for unsent_emails in iter_batches(queryset, batch_size):
+        with transaction.atomic():
+            emails.models.OutboxEmail.objects.bulk_create(
+                [
+                    emails.models.OutboxEmail(
+                        user_id=one.user_id,
+                        to=[one.user.email],
+                        subject=one.subject,
+                        plain_text=one.plain_text,
+                        html_text=one.html_text,
+                    )
+                    for one in unsent_emails
+                ]
+            )
+            emails.models.UnsentEmail.objects.filter(id__in=[one.id for one in unsent_emails]).delete()
+
+        queued_count += len(unsent_emails)
+
+    return queued_count
@@ -1,16 +1,21 @@
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django_rest_passwordreset.signals import reset_password_token_created
 
+import emails.models
+from emails.cache import credentials_cache
+
 
 @receiver(reset_password_token_created)
 def on_reset_password_token_created(sender, instance, reset_password_token, *args, **kwargs):
     """
     Handles password reset tokens
-    When a token is created, an e-mail needs to be sent to the user
+    When a token is created, an e-mail needs to be sent to the user. Unless outbox is disabled, the e-mail is only
+    saved to the database here and sent by send_outbox_emails command
     :param sender: View Class that sent the signal
     :param instance: View Instance that sent the signal
     :param reset_password_token: Token Model Object
@@ -37,3 +42,15 @@ def on_reset_password_token_created(sender, instance, reset_password_token, *arg
     )
     msg.attach_alternative(email_html_message, "text/html")
     msg.send()
+
+
+@receiver(post_save, sender=emails.models.EmailCredentials)
+@receiver(post_delete, sender=emails.models.EmailCredentials)
+def on_credentials_changed(sender, **kwargs):
+    """
+    Make all processes reload email credentials once the change is committed
+    :param sender:
+    :param kwargs:
+    :return:
+    """
+    credentials_cache.invalidate_on_commit()
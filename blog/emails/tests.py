@@ -1,13 +1,78 @@
 import smtplib
+import socketserver
+import threading
+from datetime import timedelta
 from unittest.mock import MagicMock, patch
 
 import pytest
 from django.core.mail import EmailMultiAlternatives
+from django.core.management import call_command
+from django.utils import timezone
 
 import emails.factories
 import emails.models
 import users.factories
 from emails.backends import MultiCredentialEmailBackend
+from emails.balancer import NoAvailableCredentials, credentials_balancer
+from emails.cache import credentials_cache
+from emails.outbox import email_outbox
+from emails.resend import queue_unsent_emails, send_unsent_emails
+
+
+class SMTPStandInHandler(socketserver.StreamRequestHandler):
+    """
+    Bare minimum of SMTP protocol to accept emails without authentication and encryption
+    """
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections_count += 1
+        self.reply("220 localhost")
+        data_lines = None
+
+        for raw_line in self.rfile:
+            line = raw_line.decode().rstrip("\r\n")
+
+            if data_lines is not None:
+                if line == ".":
+                    self.server.messages.append("\n".join(data_lines))
+                    data_lines = None
+                    self.reply("250 OK")
+                else:
+                    data_lines.append(line)
+            elif line[:4].upper() == "RCPT" and self.server.reject_recipients:
+                self.reply("550 Mailbox unavailable")
+            elif line[:4].upper() == "DATA":
+                data_lines = []
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif line[:4].upper() == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+@pytest.fixture()
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPStandInHandler)
+    server.daemon_threads = True
+    server.messages = []
+    server.connections_count = 0
+    server.reject_recipients = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def credentials(db, smtp_server):
+    return emails.factories.EmailCredentialsFactory(
+        host="127.0.0.1", port=smtp_server.server_address[1], username="", password="", use_tls=False, timeout=5
+    )
 
 
 class TestMultiCredentialEmailBackend:
@@ -73,6 +138,33 @@ class TestMultiCredentialEmailBackend:
         be.set_credentials()
         assert be.username == cred.username
 
+    def test_credentials_are_cached(self, db, django_assert_num_queries, django_capture_on_commit_callbacks):
+        cred = emails.factories.EmailCredentialsFactory()
+        MultiCredentialEmailBackend().set_credentials()
+
+        be = MultiCredentialEmailBackend()
+        with django_assert_num_queries(0):
+            be.set_credentials()
+        assert be.username == cred.username
+
+        with django_capture_on_commit_callbacks(execute=True):
+            cred.are_active = False
+            cred.save()
+
+        be.set_credentials()
+        assert be.username is None
+
+    def test_credentials_are_reloaded_on_version_change(self, db, django_assert_num_queries):
+        cred = emails.factories.EmailCredentialsFactory()
+        credentials_cache.get_latest()
+
+        # Change made by another process
+        emails.models.EmailCredentials.objects.filter(id=cred.id).update(username="changed")
+        credentials_cache.invalidate()
+
+        with django_assert_num_queries(1):
+            assert credentials_cache.get_latest().username == "changed"
+
     def test_overrides_are_set(self, db):
         override_value = True
         db_value = False
@@ -88,20 +180,34 @@ class TestMultiCredentialEmailBackend:
 
     def test_send_email(self, db, emails_backend_mock, smtp_email):
         emails.factories.EmailCredentialsFactory()
-        be = MultiCredentialEmailBackend()
+        be = MultiCredentialEmailBackend(use_outbox=False)
         count = be.send_messages([smtp_email])
 
         assert count == 1
         assert not emails.models.UnsentEmail.objects.exists()
         emails_backend_mock["connection"].sendmail.assert_called_once()
 
+    def test_send_email_enqueued(self, db, emails_backend_mock, smtp_email):
+        user = users.factories.UserFactory(email=smtp_email.to[0])
+        be = MultiCredentialEmailBackend(use_outbox=True)
+        count = be.send_messages([smtp_email])
+
+        assert count == 1
+        emails_backend_mock["connection"].sendmail.assert_not_called()
+
+        model = emails.models.OutboxEmail.objects.get()
+        assert model.user == user
+        assert model.to == smtp_email.to
+        assert model.subject == smtp_email.subject
+        assert model.html_text == smtp_email.alternatives[0][0]
+
     @pytest.mark.parametrize("fail_silently", (False, True))
     def test_send_email_failed(self, fail_silently, db, emails_backend_mock, smtp_email):
         emails_backend_mock["connection"].sendmail.side_effect = smtplib.SMTPException()
 
         users.factories.UserFactory(email=smtp_email.to[0])
         emails.factories.EmailCredentialsFactory(fail_silently=fail_silently)
-        be = MultiCredentialEmailBackend()
+        be = MultiCredentialEmailBackend(use_outbox=False)
 
         exc_raised = False
         count = None
@@ -123,10 +229,51 @@ class TestMultiCredentialEmailBackend:
         assert model.subject == smtp_email.subject
         assert model.html_text == smtp_email.alternatives[0][0]
 
+    def test_emails_are_spread_over_credentials(self, db, emails_backend_mock, smtp_email):
+        creds = emails.factories.EmailCredentialsFactory.create_batch(2)
+
+        for _ in range(4):
+            MultiCredentialEmailBackend(use_outbox=False).send_messages([smtp_email])
+
+        assert [credentials_balancer.get_stats(one)["sent"] for one in creds] == [2, 2]
+
+    def test_send_email_failover(self, db, emails_backend_mock, smtp_email):
+        creds = emails.factories.EmailCredentialsFactory.create_batch(2)
+        emails_backend_mock["connection"].sendmail.side_effect = [smtplib.SMTPServerDisconnected(), None]
+
+        assert MultiCredentialEmailBackend(use_outbox=False).send_messages([smtp_email]) == 1
+        assert not emails.models.UnsentEmail.objects.exists()
+
+        stats = sorted((credentials_balancer.get_stats(one) for one in creds), key=lambda one: one["sent"])
+        assert [(one["sent"], one["failed"]) for one in stats] == [(0, 1), (1, 0)]
+
+    def test_credentials_get_unhealthy(self, db, settings, emails_backend_mock, smtp_email):
+        settings.EMAIL_CREDENTIALS_HEALTH = {**settings.EMAIL_CREDENTIALS_HEALTH, "FAILURE_THRESHOLD": 2}
+        cred = emails.factories.EmailCredentialsFactory(fail_silently=True)
+        emails_backend_mock["connection"].sendmail.side_effect = smtplib.SMTPAuthenticationError(535, "Rejected")
+        be = MultiCredentialEmailBackend(use_outbox=False)
+
+        assert be.send_messages([smtp_email, smtp_email]) == 0
+        assert credentials_balancer.get_stats(cred) == {"sent": 0, "failed": 2, "is_healthy": False}
+
+        with pytest.raises(NoAvailableCredentials):
+            be.deliver(smtp_email)
+
+        assert emails_backend_mock["connection"].sendmail.call_count == 2
+
+    def test_unsent_emails_are_archived_in_bulk(self, db, django_assert_num_queries, smtp_email):
+        users.factories.UserFactory(email=smtp_email.to[0])
+        be = MultiCredentialEmailBackend()
+
+        with django_assert_num_queries(2):
+            be.archive_unsent_messages([(smtp_email, "First"), (smtp_email, "Second")])
+
+        assert sorted(emails.models.UnsentEmail.objects.values_list("reason", flat=True)) == ["First", "Second"]
+
     @pytest.mark.parametrize("fail_silently", (False, True))
     def test_send_email_no_credentials(self, fail_silently, db, smtp_email):
         users.factories.UserFactory(email=smtp_email.to[0])
-        be = MultiCredentialEmailBackend(fail_silently=fail_silently)
+        be = MultiCredentialEmailBackend(fail_silently=fail_silently, use_outbox=False)
 
         exc_raised = False
         count = None
@@ -143,3 +290,140 @@ class TestMultiCredentialEmailBackend:
 
         model = emails.models.UnsentEmail.objects.get()
         assert model.user.email == smtp_email.to[0]
+
+
+class TestEmailOutbox:
+    @pytest.fixture()
+    def enqueue_emails(self, db):
+        def _enqueue_emails(count):
+            messages = []
+
+            for user in users.factories.UserFactory.create_batch(count):
+                message = EmailMultiAlternatives(to=[user.email], subject="Test", body="Test")
+                message.attach_alternative("<p>Test</p>", "text/html")
+                messages.append(message)
+
+            return MultiCredentialEmailBackend(use_outbox=True).send_messages(messages)
+
+        return _enqueue_emails
+
+    def test_emails_are_sent_over_one_connection(self, credentials, smtp_server, enqueue_emails):
+        assert enqueue_emails(3) == 3
+
+        call_command("send_outbox_emails", batch_size=2)
+
+        assert len(smtp_server.messages) == 3
+        assert smtp_server.connections_count == 1
+        assert not emails.models.OutboxEmail.objects.exists()
+        assert not emails.models.UnsentEmail.objects.exists()
+
+    def test_emails_are_spread_over_connections(self, credentials, smtp_server, enqueue_emails):
+        other_credentials = emails.factories.EmailCredentialsFactory(
+            host=credentials.host, port=credentials.port, username="", password="", use_tls=False, timeout=5
+        )
+        assert enqueue_emails(4) == 4
+
+        call_command("send_outbox_emails", batch_size=4)
+
+        # Each credentials keep own connection, which is reused for every other email
+        assert len(smtp_server.messages) == 4
+        assert smtp_server.connections_count == 2
+        assert [credentials_balancer.get_stats(one)["sent"] for one in (credentials, other_credentials)] == [2, 2]
+
+    def test_claimed_emails_are_skipped(self, enqueue_emails):
+        enqueue_emails(3)
+
+        assert len(email_outbox.claim(2)) == 2
+        assert len(email_outbox.claim(2)) == 1
+        assert email_outbox.claim(2) == []
+
+    def test_failed_email_is_retried_later(self, settings, credentials, smtp_server, enqueue_emails):
+        smtp_server.reject_recipients = True
+        enqueue_emails(1)
+        be = MultiCredentialEmailBackend(fail_silently=False, use_outbox=False)
+
+        assert email_outbox.send_batch(be, 10) == (0, 1)
+
+        model = emails.models.OutboxEmail.objects.get()
+        assert model.attempts == 1
+        assert "Mailbox unavailable" in model.last_error
+        assert model.next_attempt_at >= timezone.now() + timedelta(seconds=settings.EMAIL_OUTBOX["RETRY_DELAY"] - 5)
+
+        # Not due yet
+        assert email_outbox.send_batch(be, 10) == (0, 0)
+        be.close()
+
+        # Recipient rejection isn't a fault of credentials
+        assert credentials_balancer.get_stats(credentials) == {"sent": 0, "failed": 0, "is_healthy": True}
+
+    def test_rate_limited_emails_are_postponed(self, credentials, smtp_server, enqueue_emails):
+        credentials.rate_limit = 1
+        credentials.save()
+        enqueue_emails(2)
+        be = MultiCredentialEmailBackend(fail_silently=False, use_outbox=False)
+
+        assert email_outbox.send_batch(be, 10) == (1, 0)
+        be.close()
+
+        model = emails.models.OutboxEmail.objects.get()
+        assert model.attempts == 0
+        assert model.next_attempt_at > timezone.now()
+        assert len(smtp_server.messages) == 1
+
+    def test_failed_email_is_archived(self, settings, credentials, smtp_server, enqueue_emails):
+        settings.EMAIL_OUTBOX = {**settings.EMAIL_OUTBOX, "MAX_ATTEMPTS": 1}
+        smtp_server.reject_recipients = True
+        enqueue_emails(1)
+        outbox_model = emails.models.OutboxEmail.objects.get()
+
+        call_command("send_outbox_emails")
+
+        model = emails.models.UnsentEmail.objects.get()
+        assert model.user_id == outbox_model.user_id
+        assert model.html_text == outbox_model.html_text
+        assert "Mailbox unavailable" in model.reason
+        assert not emails.models.OutboxEmail.objects.exists()
+
+    def test_no_credentials(self, enqueue_emails):
+        enqueue_emails(1)
+        be = MultiCredentialEmailBackend(fail_silently=False, use_outbox=False)
+
+        assert email_outbox.send_batch(be, 10) == (0, 1)
+        assert emails.models.OutboxEmail.objects.get().last_error == "Email credentials are not set"
+
+
+class TestResendUnsentEmails:
+    def test_send(self, credentials, smtp_server):
+        emails.factories.UnsentEmailFactory.create_batch(3)
+
+        assert send_unsent_emails(emails.models.UnsentEmail.objects.all(), batch_size=2) == (3, 0)
+        assert len(smtp_server.messages) == 3
+        assert smtp_server.connections_count == 1
+        assert not emails.models.UnsentEmail.objects.exists()
+
+    def test_failed_emails_are_kept(self, credentials, smtp_server):
+        smtp_server.reject_recipients = True
+        emails.factories.UnsentEmailFactory.create_batch(2)
+        untouched = emails.factories.UnsentEmailFactory()
+
+        queryset = emails.models.UnsentEmail.objects.exclude(id=untouched.id)
+        assert send_unsent_emails(queryset, batch_size=10) == (0, 2)
+
+        reasons = emails.models.UnsentEmail.objects.exclude(id=untouched.id).values_list("reason", flat=True)
+        assert all("Mailbox unavailable" in one for one in reasons)
+        assert emails.models.UnsentEmail.objects.filter(id=untouched.id, reason=untouched.reason).exists()
+
+    def test_no_credentials(self, db):
+        emails.factories.UnsentEmailFactory.create_batch(2)
+
+        assert send_unsent_emails(emails.models.UnsentEmail.objects.all(), batch_size=10) == (0, 0)
+        assert emails.models.UnsentEmail.objects.count() == 2
+
+    def test_queue(self, db):
+        unsent = emails.factories.UnsentEmailFactory.create_batch(3)
+
+        assert queue_unsent_emails(emails.models.UnsentEmail.objects.all(), batch_size=2) == 3
+        assert not emails.models.UnsentEmail.objects.exists()
+
+        outbox = emails.models.OutboxEmail.objects.order_by("id")
+        assert [(one.user_id, one.to) for one in outbox] == [(one.user_id, [one.user.email]) for one in unsent]
@@ -1,10 +1,39 @@
+from collections import Counter
+
 from django.contrib import admin
+from django.db import models, transaction
 
 import feedback.models
+import posts.models
+from core.pagination import EstimatedCountPaginator
+
+
+class CounterAdminMixin:
+    """
+    Admin deletion which decrements denormalized counter of the parent, e.g. likes_count of liked post
+    """
+
+    # Parent queryset, its counter field and foreign key field of the model
+    counter_queryset: models.QuerySet
+    counter_field: str
+    counter_parent_field: str
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.counter_queryset.filter(id=getattr(obj, self.counter_parent_field)).change_counter(self.counter_field, -1)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        counts = Counter(queryset.values_list(self.counter_parent_field, flat=True))
+        super().delete_queryset(request, queryset)
+
+        for parent_id, count in counts.items():
+            self.counter_queryset.filter(id=parent_id).change_counter(self.counter_field, -count)
 
 
 @admin.register(feedback.models.Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(CounterAdminMixin, admin.ModelAdmin):
     fieldsets = (
         (None, {"fields": ("user", "post", "content")}),
         ("Misc", {"fields": ("id", "created_at", "updated_at")}),
@@ -16,22 +45,31 @@ class CommentAdmin(admin.ModelAdmin):
         "updated_at",
         "likes_count",
     )
-    list_display = ["created_at", "user", "post"]
+    list_display = ["created_at", "user", "post", "likes_count"]
+    counter_queryset = posts.models.Post.all_objects.all()
+    counter_field = "comments_count"
+    counter_parent_field = "post_id"
+    autocomplete_fields = ["user", "post"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        queryset = queryset.with_likes_count().select_related("user", "post")
+        queryset = queryset.select_related("user", "post")
         return queryset
 
-    def likes_count(self, comment):
-        return comment.likes_count
-
 
 @admin.register(feedback.models.PostLike)
-class PostLikeAdmin(admin.ModelAdmin):
+class PostLikeAdmin(CounterAdminMixin, admin.ModelAdmin):
     fields = ("id", "created_at", "post", "user")
     list_display = ("created_at", "post", "user")
+    counter_queryset = posts.models.Post.all_objects.all()
+    counter_field = "likes_count"
+    counter_parent_field = "post_id"
     readonly_fields = ("id", "created_at")
+    autocomplete_fields = ("post", "user")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
@@ -40,10 +78,18 @@ class PostLikeAdmin(admin.ModelAdmin):
 
 
 @admin.register(feedback.models.CommentLike)
-class CommentLikeAdmin(admin.ModelAdmin):
+class CommentLikeAdmin(CounterAdminMixin, admin.ModelAdmin):
     fields = ("id", "created_at", "comment", "user")
     list_display = ("created_at", "comment", "user")
+    counter_queryset = feedback.models.Comment.objects.all()
+    counter_field = "likes_count"
+    counter_parent_field = "comment_id"
     readonly_fields = ("id", "created_at")
+    autocomplete_fields = ("user",)
+    # Comment content isn't indexed for search, so comments are picked by id
+    raw_id_fields = ("comment",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
@@ -0,0 +1,221 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+import feedback.models
+import posts.models
+from core.serializers import IsLikedMixin
+from posts.cache import post_list_cache
+
+logger = logging.getLogger(__name__)
+
+# Liked object kind -> (like model, parent model, parent field of like model)
+LIKE_TARGETS = {
+    "post": (feedback.models.PostLike, posts.models.Post, "post_id"),
+    "comment": (feedback.models.CommentLike, feedback.models.Comment, "comment_id"),
+}
+
+
+class LocalLikeBufferStore:
+    """
+    In-process store of pending like intents
+
+    Intents are coalesced per (kind, user, parent), so only the latest one is kept. Shared stores (e.g. Redis based)
+    should implement the same methods and be set by LIKE_BUFFER["STORE"] setting
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._intents = defaultdict(dict)
+
+    def add(self, kind: str, user_id: int, parent_id: int, is_liked: bool):
+        with self._lock:
+            self._intents[(kind, user_id)][parent_id] = is_liked
+
+    def discard(self, kind: str, user_id: int, parent_id: int):
+        with self._lock:
+            self._intents.get((kind, user_id), {}).pop(parent_id, None)
+
+    def get_pending(self, kind: str, user_id: int) -> dict[int, bool]:
+        """
+        :return: parent id -> is_liked of not flushed intents of the user
+        """
+        with self._lock:
+            return dict(self._intents.get((kind, user_id), {}))
+
+    def restore(self, intents: list[tuple[str, int, int, bool]]):
+        """
+        Put back intents which failed to flush, unless newer ones were added meanwhile
+        """
+        with self._lock:
+            for kind, user_id, parent_id, is_liked in intents:
+                self._intents[(kind, user_id)].setdefault(parent_id, is_liked)
+
+    def pop_all(self) -> list[tuple[str, int, int, bool]]:
+        """
+        :return: (kind, user_id, parent_id, is_liked) of all pending intents, which are removed from the store
+        """
+        with self._lock:
+            intents, self._intents = self._intents, defaultdict(dict)
+
+        return [
+            (kind, user_id, parent_id, is_liked)
+            for (kind, user_id), values in intents.items()
+            for parent_id, is_liked in values.items()
+        ]
+
+
+class LikeBufferWorker(threading.Thread):
+    """
+    Daemon thread which flushes the buffer every flush_interval seconds
+    """
+
+    def __init__(self, buffer: "LikeBuffer", flush_interval: float):
+        super().__init__(name="like-buffer-worker", daemon=True)
+        self.buffer = buffer
+        self.flush_interval = flush_interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            close_old_connections()
+
+            try:
+                self.buffer.flush()
+            except Exception:
+                logger.exception("Failed to flush like buffer")
+
+        close_old_connections()
+
+
+class LikeBuffer:
+    """
+    Write-behind buffer of like toggles, see LIKE_BUFFER setting
+
+    Bursts of likes on the same post are reduced to one bulk insert / delete and one counter UPDATE per flush.
+    Likes written concurrently by other paths may be skipped by ON CONFLICT, reconcile_counters fixes such drift
+    """
+
+    def __init__(self):
+        self._store = None
+        self._worker = None
+        self._lock = threading.Lock()
+
+    @property
+    def config(self) -> dict:
+        return settings.LIKE_BUFFER
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.config["ENABLED"]
+
+    @property
+    def store(self) -> LocalLikeBufferStore:
+        if self._store is None:
+            self._store = import_string(self.config["STORE"])()
+
+        return self._store
+
+    def add(self, kind: str, user_id: int, parent_id: int, is_liked: bool):
+        self.store.add(kind, user_id, parent_id, is_liked)
+        self.ensure_worker()
+
+    def discard(self, kind: str, user_id: int, parent_id: int):
+        """
+        Drop pending intent of the user, e.g. once it's the same as the stored like
+        """
+        self.store.discard(kind, user_id, parent_id)
+
+    def get_pending(self, kind: str, user_id: int) -> dict[int, bool]:
+        if not self.is_enabled:
+            return {}
+
+        return self.store.get_pending(kind, user_id)
+
+    def ensure_worker(self):
+        if self._worker is not None or not self.config["FLUSH_INTERVAL"]:
+            return
+
+        with self._lock:
+            if self._worker is None:
+                self._worker = LikeBufferWorker(self, self.config["FLUSH_INTERVAL"])
+                self._worker.start()
+                atexit.register(self.flush)
+
+    def flush(self) -> int:
+        """
+        Write all pending intents to the database
+        :return: number of processed intents
+        """
+        intents = self.store.pop_all()
+        grouped = defaultdict(dict)
+
+        for kind, user_id, parent_id, is_liked in intents:
+            grouped[kind][(parent_id, user_id)] = is_liked
+
+        flushed_kinds = set()
+
+        for kind, values in grouped.items():
+            try:
+                self._flush_kind(kind, values)
+            except Exception:
+                self.store.restore([one for one in intents if one[0] not in flushed_kinds])
+                raise
+
+            flushed_kinds.add(kind)
+
+        return len(intents)
+
+    @transaction.atomic
+    def _flush_kind(self, kind: str, values: dict[tuple[int, int], bool]):
+        like_model, parent_model, parent_field = LIKE_TARGETS[kind]
+        parent_ids = {parent_id for parent_id, _ in values}
+        user_ids = {user_id for _, user_id in values}
+
+        existing = {
+            (parent_id, user_id): like_id
+            for like_id, parent_id, user_id in like_model.objects.filter(
+                **{f"{parent_field}__in": parent_ids}, user_id__in=user_ids
+            ).values_list("id", parent_field, "user_id")
+        }
+        to_create = [key for key, is_liked in values.items() if is_liked and key not in existing]
+        to_delete = [key for key, is_liked in values.items() if not is_liked and key in existing]
+
+        like_model.objects.bulk_create(
+            [like_model(**{parent_field: parent_id, "user_id": user_id}) for parent_id, user_id in to_create],
+            ignore_conflicts=True,
+        )
+        like_model.objects.filter(id__in=[existing[key] for key in to_delete]).delete_fast()
+
+        deltas = defaultdict(int)
+
+        for parent_id, _ in to_create:
+            deltas[parent_id] += 1
+
+        for parent_id, _ in to_delete:
+            deltas[parent_id] -= 1
+
+        for parent_id, delta in deltas.items():
+            parent_model.objects.filter(id=parent_id).change_counter("likes_count", delta)
+
+        if kind == "post" and deltas:
+            post_list_cache.bump_generation_on_commit()
+
+
+like_buffer = LikeBuffer()
+
+
+class BufferedIsLikedMixin(IsLikedMixin):
+    """
+    IsLikedMixin which also reflects likes of current user pending in like_buffer
+    """
+
+    like_kind: str = None
+
+    def get_pending_likes(self) -> dict:
+        return like_buffer.get_pending(self.like_kind, self.context["request"].user.id)
@@ -0,0 +1,124 @@
+"""
+Deletion of posts and users with many dependants
+
+Objects are hidden at once by setting deleted_at, then purge_deleted command removes dependants in bounded batches
+and only deletes the object itself once it has few related rows left
+"""
+
+from collections import Counter
+from typing import Callable
+
+from django.db import models, transaction
+from django.utils import timezone
+
+import feedback.models
+import posts.models
+import users.models
+from core.models import delete_in_batches
+from posts.cache import post_list_cache
+from users.authentication import user_state_cache
+
+
+def mark_posts_deleted(queryset: models.QuerySet) -> int:
+    """
+    Hide posts immediately, they're removed later by purge_deleted command
+    :param queryset: posts to delete
+    :return: number of hidden posts
+    """
+    now_dt = timezone.now()
+    hidden_count = queryset.filter(deleted_at__isnull=True).update(deleted_at=now_dt, updated_at=now_dt)
+    post_list_cache.bump_generation_on_commit()
+    return hidden_count
+
+
+@transaction.atomic
+def mark_users_deleted(queryset: models.QuerySet) -> int:
+    """
+    Hide users together with their posts immediately, they're removed later by purge_deleted command
+    :param queryset: users to delete
+    :return: number of hidden users
+    """
+    user_ids = list(queryset.filter(deleted_at__isnull=True).values_list("id", flat=True))
+    mark_posts_deleted(posts.models.Post.all_objects.filter(user_id__in=user_ids))
+    now_dt = timezone.now()
+    user_state_cache.publish_deleted(user_ids)
+    return users.models.User.all_objects.filter(id__in=user_ids).update(deleted_at=now_dt, updated_at=now_dt)
+
+
+def _decrement_counters(queryset: models.QuerySet, field_name: str) -> Callable[[Counter], None]:
+    def on_batch(counts: Counter):
+        for parent_id, count in counts.items():
+            queryset.filter(id=parent_id).change_counter(field_name, -count)
+
+    return on_batch
+
+
+def purge_post(post_id: int, batch_size: int, log: Callable[[str], None] = None) -> int:
+    """
+    Delete post with comments, likes of the comments and likes of the post
+    :param post_id:
+    :param batch_size: number of rows deleted per transaction
+    :param log: progress callback
+    :return: number of deleted dependants
+    """
+    deleted_count = 0
+
+    for queryset in (
+        feedback.models.CommentLike.objects.filter(comment__post_id=post_id),
+        feedback.models.Comment.objects.filter(post_id=post_id),
+        feedback.models.PostLike.objects.filter(post_id=post_id),
+    ):
+        count = delete_in_batches(queryset, batch_size)
+        deleted_count += count
+
+        if log is not None and count:
+            log(f"Post {post_id}: deleted {count} {queryset.model.__name__} row(s)")
+
+    # Only tags are left, so collector doesn't load much
+    posts.models.Post.all_objects.filter(id=post_id).delete()
+    return deleted_count
+
+
+def purge_user(user_id: int, batch_size: int, log: Callable[[str], None] = None) -> int:
+    """
+    Delete user with posts, comments and likes. Counters of other users' posts and comments are updated
+    :param user_id:
+    :param batch_size: number of rows deleted per transaction
+    :param log: progress callback
+    :return: number of deleted dependants
+    """
+    deleted_count = 0
+
+    for post_id in posts.models.Post.all_objects.filter(user_id=user_id).values_list("id", flat=True).iterator():
+        deleted_count += purge_post(post_id, batch_size, log=log) + 1
+
+    for queryset, group_by, on_batch in (
+        (feedback.models.CommentLike.objects.filter(comment__user_id=user_id), None, None),
+        (
+            feedback.models.CommentLike.objects.filter(user_id=user_id),
+            "comment_id",
+            _decrement_counters(feedback.models.Comment.objects.all(), "likes_count"),
+        ),
+        (
+            feedback.models.Comment.objects.filter(user_id=user_id),
+            "post_id",
+            _decrement_counters(posts.models.Post.all_objects.all(), "comments_count"),
+        ),
+        (
+            feedback.models.PostLike.objects.filter(user_id=user_id),
+            "post_id",
+            _decrement_counters(posts.models.Post.all_objects.all(), "likes_count"),
+        ),
+    ):
+        count = delete_in_batches(queryset, batch_size, group_by=group_by, on_batch=on_batch)
+        deleted_count += count
+
+        if log is not None and count:
+            log(f"User {user_id}: deleted {count} {queryset.model.__name__} row(s)")
+
+    if deleted_count:
+        post_list_cache.bump_generation_on_commit()
+
+    # Only small dependants (tokens, emails, etc.) are left
+    users.models.User.all_objects.filter(id=user_id).delete()
+    return deleted_count
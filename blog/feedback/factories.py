@@ -3,6 +3,7 @@ from factory.django import DjangoModelFactory
 
 import feedback.models
 import posts.factories
+import posts.models
 import users.factories
 
 
@@ -24,6 +25,8 @@ class CommentFactory(DjangoModelFactory):
             obj.created_at = created_at
             obj.save()
 
+        # Keeping denormalized counter in sync, the same way as CommentCreateSerializer does
+        posts.models.Post.objects.filter(id=obj.post_id).change_counter("comments_count", 1)
         return obj
 
 
@@ -34,6 +37,12 @@ class CommentLikeFactory(DjangoModelFactory):
     comment = factory.SubFactory(CommentFactory)
     user = factory.SubFactory(users.factories.UserFactory)
 
+    @classmethod
+    def _create(cls, target_class, *args, **kwargs):
+        obj = super()._create(target_class, *args, **kwargs)
+        feedback.models.Comment.objects.filter(id=obj.comment_id).change_counter("likes_count", 1)
+        return obj
+
 
 class PostLikeFactory(DjangoModelFactory):
     class Meta:
@@ -41,3 +50,9 @@ class PostLikeFactory(DjangoModelFactory):
 
     post = factory.SubFactory(posts.factories.PostFactory)
     user = factory.SubFactory(users.factories.UserFactory)
+
+    @classmethod
+    def _create(cls, target_class, *args, **kwargs):
+        obj = super()._create(target_class, *args, **kwargs)
+        posts.models.Post.objects.filter(id=obj.post_id).change_counter("likes_count", 1)
+        return obj
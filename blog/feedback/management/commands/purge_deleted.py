@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand, CommandParser
+
+import feedback.deletion
+import posts.models
+import users.models
+
+
+class Command(BaseCommand):
+    help = "Removes deleted (hidden) users and posts together with their comments and likes in batches"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--batch-size", "-b", type=int, default=1000, help="Number of rows deleted per transaction")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        # Users go first, since their posts get purged with them
+        user_ids = users.models.User.all_objects.filter(deleted_at__isnull=False).values_list("id", flat=True)
+
+        for user_id in user_ids.iterator():
+            deleted_count = feedback.deletion.purge_user(user_id, batch_size, log=self.stdout.write)
+            self.stdout.write(f"User {user_id}: purged with {deleted_count} dependant(s)")
+
+        post_ids = posts.models.Post.all_objects.filter(deleted_at__isnull=False).values_list("id", flat=True)
+
+        for post_id in post_ids.iterator():
+            deleted_count = feedback.deletion.purge_post(post_id, batch_size, log=self.stdout.write)
+            self.stdout.write(f"Post {post_id}: purged with {deleted_count} dependant(s)")
@@ -0,0 +1,69 @@
+from django.core.management import BaseCommand, CommandParser
+from django.db import models, transaction
+
+import feedback.models
+import posts.models
+from core.models import count_subquery
+
+
+class Command(BaseCommand):
+    help = "Backfills and repairs denormalized likes / comments counters of posts and comments in batches"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--batch-size", "-b", type=int, default=1000, help="Number of rows checked per transaction")
+
+    def handle(self, *args, **options):
+        targets = (
+            (
+                posts.models.Post.objects.all(),
+                {
+                    "likes_count": count_subquery(
+                        feedback.models.PostLike.objects.filter(post_id=models.OuterRef("id")), "post_id"
+                    ),
+                    "comments_count": count_subquery(
+                        feedback.models.Comment.objects.filter(post_id=models.OuterRef("id")), "post_id"
+                    ),
+                },
+            ),
+            (
+                feedback.models.Comment.objects.all(),
+                {
+                    "likes_count": count_subquery(
+                        feedback.models.CommentLike.objects.filter(comment_id=models.OuterRef("id")), "comment_id"
+                    ),
+                },
+            ),
+        )
+
+        for queryset, counters in targets:
+            repaired_count = self.reconcile(queryset, counters, batch_size=options["batch_size"])
+            self.stdout.write(f"{queryset.model.__name__}: repaired {repaired_count} row(s)")
+
+    def reconcile(self, queryset: models.QuerySet, counters: dict[str, models.Expression], batch_size: int) -> int:
+        """
+        Walk the table by primary key ranges and overwrite counters which differ from actual values
+        :param queryset:
+        :param counters: mapping of counter field name to expression computing actual value
+        :param batch_size:
+        :return: total number of repaired rows
+        """
+        is_mismatched = models.Q()
+        for name in counters:
+            is_mismatched |= ~models.Q(**{name: models.F(f"actual_{name}")})
+
+        repaired_count = 0
+        last_id = 0
+
+        while True:
+            batch_ids = list(queryset.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size])
+
+            if not batch_ids:
+                return repaired_count
+
+            with transaction.atomic():
+                batch = queryset.filter(id__in=batch_ids)
+                batch = batch.annotate(**{f"actual_{name}": expr for name, expr in counters.items()})
+                repaired_count += batch.filter(is_mismatched).update(**counters)
+
+            last_id = batch_ids[-1]
+            self.stdout.write(f"{queryset.model.__name__}: checked up to id {last_id}")
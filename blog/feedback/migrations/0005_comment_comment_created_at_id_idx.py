@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # Index is created concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("feedback", "0004_comment_likes_count"),
+    ]
+
+    operations = [
+        core.operations.AddIndexConcurrently(
+            model_name="comment",
+            index=models.Index(
+                fields=["created_at", "id"], name="comment_created_at_id_idx"
+            ),
+        ),
+    ]
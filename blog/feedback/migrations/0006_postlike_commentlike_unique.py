@@ -0,0 +1,49 @@
+# Generated by Django 4.1 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+import core.operations
+
+
+def delete_duplicate_likes(apps, schema_editor):
+    """
+    Keep the earliest like per (parent, user), likes_count of parents is recomputed by 0008_backfill_counters
+    """
+    for like_model_name, parent_field in (
+        ("feedback.PostLike", "post_id"),
+        ("feedback.CommentLike", "comment_id"),
+    ):
+        like_model = apps.get_model(like_model_name)
+        earlier_likes = like_model.objects.filter(
+            **{parent_field: models.OuterRef(parent_field)},
+            user_id=models.OuterRef("user_id"),
+            id__lt=models.OuterRef("id"),
+        )
+        # Single DELETE ... WHERE EXISTS, likes have no dependent rows
+        like_model.objects.filter(models.Exists(earlier_likes)).delete()
+
+
+class Migration(migrations.Migration):
+    # Unique indexes are built concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("feedback", "0005_comment_comment_created_at_id_idx"),
+        ("posts", "0008_tag_posts_post_id_tag_id_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_likes, migrations.RunPython.noop),
+        core.operations.AddUniqueConstraintConcurrently(
+            model_name="commentlike",
+            constraint=models.UniqueConstraint(
+                fields=("comment", "user"), name="comment_like_comment_user_unique"
+            ),
+        ),
+        core.operations.AddUniqueConstraintConcurrently(
+            model_name="postlike",
+            constraint=models.UniqueConstraint(
+                fields=("post", "user"), name="post_like_post_user_unique"
+            ),
+        ),
+    ]
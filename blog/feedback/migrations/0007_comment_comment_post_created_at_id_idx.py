@@ -0,0 +1,24 @@
+# Generated by Django 4.1 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # Index is created concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("feedback", "0006_postlike_commentlike_unique"),
+    ]
+
+    operations = [
+        core.operations.AddIndexConcurrently(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "created_at", "id"],
+                name="comment_post_created_at_id_idx",
+            ),
+        ),
+    ]
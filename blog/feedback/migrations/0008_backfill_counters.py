@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+from core.models import count_subquery, update_in_batches
+
+# Rows updated per transaction
+BATCH_SIZE = 1000
+
+
+def backfill_counters(apps, schema_editor):
+    """
+    Fill counters added with 0 value, so decrements of existing likes / comments don't go below actual values
+    """
+    post_model = apps.get_model("posts", "Post")
+    comment_model = apps.get_model("feedback", "Comment")
+    post_like_model = apps.get_model("feedback", "PostLike")
+    comment_like_model = apps.get_model("feedback", "CommentLike")
+
+    update_in_batches(
+        post_model.objects.all(),
+        BATCH_SIZE,
+        likes_count=count_subquery(
+            post_like_model.objects.filter(post_id=models.OuterRef("id")), "post_id"
+        ),
+        comments_count=count_subquery(
+            comment_model.objects.filter(post_id=models.OuterRef("id")), "post_id"
+        ),
+    )
+    update_in_batches(
+        comment_model.objects.all(),
+        BATCH_SIZE,
+        likes_count=count_subquery(
+            comment_like_model.objects.filter(comment_id=models.OuterRef("id")),
+            "comment_id",
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    # Counters are backfilled in batches, each in its own transaction
+    atomic = False
+
+    dependencies = [
+        ("feedback", "0007_comment_comment_post_created_at_id_idx"),
+        ("posts", "0003_post_comments_count_post_likes_count"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.1 on 2026-10-18 14:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # Index is dropped concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("feedback", "0008_backfill_counters"),
+    ]
+
+    operations = [
+        # Covered by comment_post_created_at_id_idx
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="comment",
+                    name="post",
+                    field=models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="comments",
+                        to="posts.post",
+                    ),
+                ),
+            ],
+            database_operations=[
+                core.operations.RemoveFieldIndexConcurrently(
+                    model_name="comment", field_name="post"
+                ),
+            ],
+        ),
+    ]
@@ -1,31 +1,46 @@
 from django.db import models
 
+from core.models import CounterQuerySet, InsertIgnoreQuerySet, related_str
 
-class CommentQuerySet(models.QuerySet):
-    def with_likes_count(self, field_name="likes_count"):
-        return self.annotate(**{field_name: models.Count("likes")})
+
+class CommentQuerySet(CounterQuerySet):
+    def visible(self):
+        """
+        Comments shown by API, i.e. neither the post nor the author is deleted
+        """
+        return self.filter(post__deleted_at__isnull=True, user__deleted_at__isnull=True)
+
+
+class LikeQuerySet(InsertIgnoreQuerySet):
+    pass
 
 
 class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    post = models.ForeignKey("posts.Post", on_delete=models.CASCADE, related_name="comments")
+    # Lookups by post are backed by comment_post_created_at_id_idx
+    post = models.ForeignKey("posts.Post", on_delete=models.CASCADE, related_name="comments", db_index=False)
     user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="comments")
     content = models.CharField(max_length=255)
 
-    objects = CommentQuerySet.as_manager()
+    # Denormalized counter, see feedback.serializers and reconcile_counters command
+    likes_count = models.PositiveIntegerField(default=0)
 
-    @classmethod
-    def with_likes_count(cls, queryset: models.QuerySet = None) -> models.QuerySet:
-        if queryset is None:
-            queryset = cls.objects.all()
+    objects = CommentQuerySet.as_manager()
 
-        queryset = queryset.annotate(likes_count=models.Count("likes"))
-        return queryset
+    class Meta:
+        indexes = [
+            # Keyset pagination, see core.pagination.KeysetPagination
+            models.Index(fields=["created_at", "id"], name="comment_created_at_id_idx"),
+            # Comments of the post (post_id filter) in default -created_at order
+            models.Index(fields=["post", "created_at", "id"], name="comment_post_created_at_id_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.created_at.isoformat().split('T')[0]} {self.user.username} on {self.post.title}"
+        user = related_str(self, "user", "username")
+        post = related_str(self, "post", "title")
+        return f"{self.created_at.isoformat().split('T')[0]} {user} on {post}"
 
 
 class PostLike(models.Model):
@@ -33,11 +48,28 @@ class PostLike(models.Model):
     post = models.ForeignKey("posts.Post", on_delete=models.CASCADE, related_name="likes")
     user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="post_likes")
 
+    objects = LikeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["post", "user"], name="post_like_post_user_unique"),
+        ]
+
     def __str__(self):
-        return f"{self.user.username} on {self.post.title}"
+        return f"{related_str(self, 'user', 'username')} on {related_str(self, 'post', 'title')}"
 
 
 class CommentLike(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     comment = models.ForeignKey("feedback.Comment", on_delete=models.CASCADE, related_name="likes")
     user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="comment_likes")
+
+    objects = LikeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["comment", "user"], name="comment_like_comment_user_unique"),
+        ]
+
+    def __str__(self):
+        return f"{related_str(self, 'user', 'username')} on comment #{self.comment_id}"
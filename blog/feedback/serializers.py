@@ -1,12 +1,19 @@
-from django.db import models
+from django.db import models, transaction
 from rest_framework import serializers
 
 import feedback.models
 import posts.models
+from core.serializers import IsLikedListSerializer
+from feedback.buffer import BufferedIsLikedMixin, like_buffer
+from posts.cache import post_list_cache
 from users.serializers import UserListSerializer
 
 
-class CommentListSerializer(serializers.ModelSerializer):
+class CommentListSerializer(BufferedIsLikedMixin, serializers.ModelSerializer):
+    like_queryset = feedback.models.CommentLike.objects.all()
+    like_parent_field = "comment_id"
+    like_kind = "comment"
+
     user = UserListSerializer()
     likes_count = serializers.IntegerField(read_only=True)
 
@@ -17,7 +24,9 @@ class CommentListSerializer(serializers.ModelSerializer):
             "content",
             "user",
             "likes_count",
+            "is_liked",
         ]
+        list_serializer_class = IsLikedListSerializer
 
 
 class CommentCreateSerializer(serializers.ModelSerializer):
@@ -25,7 +34,8 @@ class CommentCreateSerializer(serializers.ModelSerializer):
     post_id = serializers.PrimaryKeyRelatedField(
         write_only=True,
         source="post",
-        queryset=posts.models.Post.objects.all(),
+        # Post is only referenced by id, so large columns aren't loaded
+        queryset=posts.models.Post.objects.only("id"),
     )
     likes_count = serializers.IntegerField(default=0, read_only=True)
 
@@ -43,9 +53,12 @@ class CommentCreateSerializer(serializers.ModelSerializer):
             "user": {"read_only": True},
         }
 
+    @transaction.atomic
     def create(self, validated_data):
-        validated_data["user"] = self.context["request"].user
-        return super().create(validated_data)
+        validated_data["user"] = self.context["request"].user.reference
+        comment = super().create(validated_data)
+        posts.models.Post.objects.filter(id=comment.post_id).change_counter("comments_count", 1)
+        return comment
 
 
 class CommentUpdateSerializer(serializers.ModelSerializer):
@@ -68,21 +81,29 @@ class CommentUpdateSerializer(serializers.ModelSerializer):
 
 class BaseLikeChangeSerializer(serializers.Serializer):
     like_queryset: models.QuerySet = None
+    parent_queryset: models.QuerySet = None
     lookup_parent_field: str = None
+    like_kind: str = None
 
     is_liked = serializers.BooleanField()
+    likes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         fields = [
             "is_liked",
+            "likes_count",
         ]
 
     def update(self, parent_instance, validated_data):
+        if like_buffer.is_enabled:
+            likes_count = self.buffer_like(parent_instance, validated_data["is_liked"])
+            return {**validated_data, "likes_count": likes_count}
+
         action_map = {True: self.add_like, False: self.remove_like}
         # noinspection PyArgumentList
-        action_map[validated_data["is_liked"]](parent_instance)
+        likes_count = action_map[validated_data["is_liked"]](parent_instance)
 
-        return validated_data
+        return {**validated_data, "likes_count": likes_count}
 
     def _get_queryset_kwargs(self, parent_instance):
         user = self.context["request"].user
@@ -91,20 +112,63 @@ class BaseLikeChangeSerializer(serializers.Serializer):
             self.lookup_parent_field: parent_instance.id,
         }
 
-    def add_like(self, parent_instance):
+    def _change_likes_count(self, parent_instance, delta: int) -> int:
+        if delta:
+            self.on_likes_changed(parent_instance)
+
+        return self.parent_queryset.change_counter_returning(parent_instance.id, "likes_count", delta)
+
+    def on_likes_changed(self, parent_instance):
+        """
+        Likes are changed without model signals, see core.models.InsertIgnoreQuerySet
+        :param parent_instance:
+        :return:
+        """
+        pass
+
+    def buffer_like(self, parent_instance, is_liked: bool) -> int:
+        """
+        Queue like change to be flushed later, nothing is written to the database
+
+        Pending intent of the user replaces the previous one, and is dropped once it matches the stored like, so
+        repeated requests don't change the count again
+        :return: expected likes count, other users' pending likes aren't taken into account
+        """
         kwargs = self._get_queryset_kwargs(parent_instance)
-        self.like_queryset.get_or_create(**kwargs)
+        is_stored = self.like_queryset.filter(**kwargs).exists()
+
+        if is_liked == is_stored:
+            like_buffer.discard(self.like_kind, kwargs["user_id"], parent_instance.id)
+        else:
+            like_buffer.add(self.like_kind, kwargs["user_id"], parent_instance.id, is_liked)
+
+        return parent_instance.likes_count + int(is_liked) - int(is_stored)
 
-    def remove_like(self, parent_instance):
+    @transaction.atomic
+    def add_like(self, parent_instance) -> int:
         kwargs = self._get_queryset_kwargs(parent_instance)
-        self.like_queryset.filter(**kwargs).delete()
+        is_created = self.like_queryset.insert_ignore(**kwargs)
+        return self._change_likes_count(parent_instance, int(is_created))
+
+    @transaction.atomic
+    def remove_like(self, parent_instance) -> int:
+        kwargs = self._get_queryset_kwargs(parent_instance)
+        deleted_count = self.like_queryset.filter(**kwargs).delete_fast()
+        return self._change_likes_count(parent_instance, -deleted_count)
 
 
 class PostLikeChangeSerializer(BaseLikeChangeSerializer):
     lookup_parent_field = "post_id"
+    like_kind = "post"
     like_queryset = feedback.models.PostLike.objects.all()
+    parent_queryset = posts.models.Post.objects.all()
+
+    def on_likes_changed(self, parent_instance):
+        post_list_cache.bump_generation_on_commit()
 
 
 class CommentLikeChangeSerializer(BaseLikeChangeSerializer):
     lookup_parent_field = "comment_id"
+    like_kind = "comment"
     like_queryset = feedback.models.CommentLike.objects.all()
+    parent_queryset = feedback.models.Comment.objects.all()
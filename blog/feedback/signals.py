@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+import feedback.models
+from posts.cache import post_list_cache
+
+
+@receiver(post_save, sender=feedback.models.PostLike)
+@receiver(post_delete, sender=feedback.models.PostLike)
+@receiver(post_save, sender=feedback.models.Comment)
+@receiver(post_delete, sender=feedback.models.Comment)
+def on_post_counters_changed(sender, created=True, **kwargs):
+    """
+    Invalidate cached post lists, since likes_count / comments_count of the post has changed
+    :param sender:
+    :param created: comment edits don't change post counters
+    :param kwargs:
+    :return:
+    """
+    if created:
+        post_list_cache.bump_generation_on_commit()
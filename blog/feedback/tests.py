@@ -1,11 +1,27 @@
+import importlib
+from unittest.mock import patch
+
 import pytest
+from django.apps import apps as django_apps
+from django.contrib import admin
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
+import feedback.deletion
 import feedback.factories
+import feedback.filters
 import feedback.models
 import posts.factories
+import posts.models
 import users.factories
+import users.models
+from core.admin import SoftDeleteAdminMixin
+from core.pagination import KeysetPagination
+from feedback.buffer import like_buffer
 
 COMMENT_LIST_URL = reverse("comment-list")
 COMMENT_CREATE_URL = reverse("comment-list")
@@ -81,6 +97,38 @@ class TestComments:
         comment_ids = [one.id for one in comment_list]
         assert [one["id"] for one in data["results"]] == comment_ids
 
+    def test_comment_list_hides_deleted(self, api_client, comment_list):
+        now_dt = timezone.now()
+        posts.models.Post.objects.filter(id=comment_list[0].post_id).update(deleted_at=now_dt)
+        users.models.User.objects.filter(id=comment_list[3].user_id).update(deleted_at=now_dt)
+
+        resp = api_client.get(COMMENT_LIST_URL)
+        assert resp.status_code == 200
+        assert [one["id"] for one in resp.json()["results"]] == [comment_list[2].id]
+
+        api_client.force_authenticate(comment_list[0].user)
+        resp = api_client.patch(COMMENT_CHANGE_LIKE_URL(comment_list[0].id), data={"is_liked": True})
+        assert resp.status_code == 404
+
+    @pytest.mark.parametrize("order_by", ("-created_at", "user__username"))
+    def test_comment_list_cursor(self, order_by, api_client, comment_list):
+        query = {"cursor": "", "order_by": order_by}
+        result_ids = []
+        url = COMMENT_LIST_URL
+
+        with patch.object(KeysetPagination, "page_size", 1):
+            while url is not None:
+                resp = api_client.get(url, data=query)
+                assert resp.status_code == 200
+
+                data = resp.json()
+                assert "count" not in data
+                result_ids += [one["id"] for one in data["results"]]
+                url, query = data["next"], {}
+
+        resp = api_client.get(COMMENT_LIST_URL, data={"order_by": order_by})
+        assert result_ids == [one["id"] for one in resp.json()["results"]]
+
     @pytest.mark.parametrize(
         "post_index,comment_indexes",
         (
@@ -99,6 +147,19 @@ class TestComments:
         data = resp.json()
         assert [one["id"] for one in data["results"]] == comment_ids
 
+    @pytest.mark.parametrize(
+        "query,index_name",
+        (
+            ({"post_id": 0}, "comment_post_created_at_id_idx"),
+            ({"created_at__gte": "2020-01-01T00:00:00Z"}, "comment_created_at_id_idx"),
+        ),
+    )
+    def test_comment_list_filter_uses_index(self, query, index_name, prefer_index_scan, comment_list):
+        query = {key: comment_list[value].post_id if key == "post_id" else value for key, value in query.items()}
+        queryset = feedback.models.Comment.objects.order_by("-created_at")
+        queryset = feedback.filters.CommentFilterSet(query, queryset=queryset).qs
+        assert index_name in queryset.explain()
+
     @pytest.mark.parametrize(
         "query,a_slice",
         (
@@ -144,6 +205,19 @@ class TestComments:
         data = resp.json()
         assert [one["id"] for one in data["results"]] == comment_ids
 
+    def test_comment_list_not_modified(self, api_client, comment_list):
+        query = {"post_id": comment_list[0].post_id}
+        resp = api_client.get(COMMENT_LIST_URL, data=query)
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+
+        resp = api_client.get(COMMENT_LIST_URL, data=query, HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 304
+
+        feedback.factories.CommentLikeFactory(comment=comment_list[0])
+        resp = api_client.get(COMMENT_LIST_URL, data=query, HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200
+
     def test_comment_create(self, db, api_client):
         post = posts.factories.PostFactory()
         api_client.force_authenticate(post.user)
@@ -162,6 +236,19 @@ class TestComments:
         assert comment.post_id == body["post_id"]
         assert comment.user_id == post.user_id
 
+    def test_comment_create_throttled_per_user(self, db, api_client, settings):
+        settings.THROTTLING = {**settings.THROTTLING, "RATES": {"comment": "2/min"}}
+        post = posts.factories.PostFactory()
+        body = {"content": "abcd", "post_id": post.id}
+        api_client.force_authenticate(post.user)
+
+        assert [api_client.post(COMMENT_CREATE_URL, data=body).status_code for _ in range(3)] == [201, 201, 429]
+        # Other actions aren't limited
+        assert api_client.get(COMMENT_LIST_URL).status_code == 200
+
+        api_client.force_authenticate(users.factories.UserFactory())
+        assert api_client.post(COMMENT_CREATE_URL, data=body).status_code == 201
+
     def test_comment_create_invalid_post_id(self, db, api_client):
         user = users.factories.UserFactory()
         api_client.force_authenticate(user)
@@ -193,6 +280,20 @@ class TestComments:
         assert resp.status_code == 204
         assert not feedback.models.Comment.objects.filter(id=comment.id).exists()
 
+    def test_comment_create_delete_comments_count(self, db, api_client):
+        post = posts.factories.PostFactory()
+        api_client.force_authenticate(post.user)
+
+        resp = api_client.post(COMMENT_CREATE_URL, data={"content": "abcd", "post_id": post.id})
+        assert resp.status_code == 201
+        post.refresh_from_db()
+        assert post.comments_count == 1
+
+        resp = api_client.delete(COMMENT_DELETE_URL(resp.json()["id"]))
+        assert resp.status_code == 204
+        post.refresh_from_db()
+        assert post.comments_count == 0
+
 
 class TestLikes:
     @pytest.mark.parametrize(
@@ -243,6 +344,9 @@ class TestLikes:
         assert data["is_liked"] == new_value
         assert feedback.models.CommentLike.objects.filter(comment_id=comment.id, user_id=user.id).exists() == new_value
 
+        comment.refresh_from_db()
+        assert comment.likes_count == data["likes_count"] == int(new_value)
+
     @pytest.mark.parametrize(
         "old_value,new_value",
         (
@@ -267,6 +371,60 @@ class TestLikes:
         assert data["is_liked"] == new_value
         assert feedback.models.PostLike.objects.filter(post_id=post.id, user_id=user.id).exists() == new_value
 
+        post.refresh_from_db()
+        assert post.likes_count == data["likes_count"] == int(new_value)
+
+    def test_unlike_counter_not_negative(self, api_client, db):
+        post = posts.factories.PostFactory()
+        # Counter is behind actual rows, e.g. before reconcile_counters run
+        feedback.models.PostLike.objects.create(post=post, user=post.user)
+        api_client.force_authenticate(post.user)
+
+        resp = api_client.patch(POST_CHANGE_LIKE_URL(post.id), data={"is_liked": False})
+        assert resp.status_code == 200
+        assert resp.json()["likes_count"] == 0
+
+        posts.models.Post.objects.filter(id=post.id).change_counter("likes_count", -1)
+        post.refresh_from_db()
+        assert post.likes_count == 0
+
+    def test_post_change_like_twice(self, api_client, db):
+        post = posts.factories.PostFactory()
+        feedback.factories.PostLikeFactory(post=post)
+        api_client.force_authenticate(post.user)
+
+        for _ in range(2):
+            resp = api_client.patch(POST_CHANGE_LIKE_URL(post.id), data={"is_liked": True})
+            assert resp.status_code == 200
+            assert resp.json()["likes_count"] == 2
+
+        assert feedback.models.PostLike.objects.filter(post_id=post.id).count() == 2
+
+    def test_change_like_throttled(self, api_client, db, settings):
+        settings.THROTTLING = {**settings.THROTTLING, "RATES": {"like": "1/min"}}
+        post = posts.factories.PostFactory()
+        comment = feedback.factories.CommentFactory(post=post)
+        api_client.force_authenticate(post.user)
+
+        assert api_client.patch(POST_CHANGE_LIKE_URL(post.id), data={"is_liked": True}).status_code == 200
+        resp = api_client.patch(COMMENT_CHANGE_LIKE_URL(comment.id), data={"is_liked": True})
+        assert resp.status_code == 429
+        assert resp.headers["Retry-After"] == "60"
+
+    def test_post_change_like_invalidates_post_list(self, api_client, db, django_capture_on_commit_callbacks):
+        post = posts.factories.PostFactory()
+        resp = api_client.get(POST_LIST_URL)
+        assert resp.json()["results"][0]["likes_count"] == 0
+
+        api_client.force_authenticate(post.user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.patch(POST_CHANGE_LIKE_URL(post.id), data={"is_liked": True})
+
+        api_client.force_authenticate(None)
+        resp = api_client.get(POST_LIST_URL)
+        assert resp.json()["results"][0]["likes_count"] == 1
+
     @pytest.fixture()
     def liked_comment_list(self, db):
         comments = feedback.factories.CommentFactory.create_batch(3)
@@ -313,3 +471,325 @@ class TestLikes:
 
         likes_count = post.likes.count()
         assert data["likes_count"] == likes_count
+
+    @pytest.mark.parametrize(
+        "url",
+        (
+            POST_LIST_URL,
+            COMMENT_LIST_URL,
+        ),
+    )
+    def test_list_is_liked_anonymous(self, url, api_client, liked_post_list, liked_comment_list):
+        resp = api_client.get(url)
+        assert resp.status_code == 200
+        assert all("is_liked" not in one for one in resp.json()["results"])
+
+    def test_post_list_is_liked(self, api_client, liked_post_list):
+        user = users.factories.UserFactory()
+        feedback.factories.PostLikeFactory(post_id=liked_post_list[1].id, user_id=user.id)
+        api_client.force_authenticate(user)
+
+        with CaptureQueriesContext(connection) as context:
+            resp = api_client.get(POST_LIST_URL)
+
+        assert resp.status_code == 200
+        like_queries = [one for one in context.captured_queries if "feedback_postlike" in one["sql"]]
+        assert len(like_queries) == 1
+
+        is_liked = {one["id"]: one["is_liked"] for one in resp.json()["results"]}
+        assert all(is_liked[one.id] == (one == liked_post_list[1]) for one in liked_post_list)
+
+    def test_comment_list_is_liked(self, api_client, liked_comment_list):
+        comment = liked_comment_list[0]
+        user = comment.likes.first().user
+        api_client.force_authenticate(user)
+
+        resp = api_client.get(COMMENT_LIST_URL)
+        assert resp.status_code == 200
+        is_liked = {one["id"]: one["is_liked"] for one in resp.json()["results"]}
+        assert all(is_liked[one.id] == (one == comment) for one in liked_comment_list)
+
+    @pytest.mark.parametrize("index", (0, 1))
+    def test_post_detail_is_liked(self, index, api_client, liked_post_list):
+        post = liked_post_list[index]
+        user = liked_post_list[0].likes.first().user
+        api_client.force_authenticate(user)
+
+        resp = api_client.get(POST_DETAIL_URL(post.id))
+        assert resp.status_code == 200
+        assert resp.json()["is_liked"] == (index == 0)
+
+
+class TestReconcileCounters:
+    def test_reconcile_counters(self, db):
+        post = posts.factories.PostFactory()
+        comment = feedback.factories.CommentFactory(post=post)
+        feedback.factories.PostLikeFactory.create_batch(2, post=post)
+        feedback.factories.CommentLikeFactory.create_batch(3, comment=comment)
+        untouched_post = posts.factories.PostFactory()
+
+        posts.models.Post.objects.update(likes_count=10, comments_count=10)
+        feedback.models.Comment.objects.update(likes_count=10)
+
+        call_command("reconcile_counters", batch_size=1)
+
+        post.refresh_from_db()
+        comment.refresh_from_db()
+        untouched_post.refresh_from_db()
+        assert (post.likes_count, post.comments_count) == (2, 1)
+        assert (untouched_post.likes_count, untouched_post.comments_count) == (0, 0)
+        assert comment.likes_count == 3
+
+    def test_backfill_counters_migration(self, db):
+        migration = importlib.import_module("feedback.migrations.0008_backfill_counters")
+        post_list = posts.factories.PostFactory.create_batch(3)
+        comment = feedback.factories.CommentFactory(post=post_list[1])
+        feedback.factories.PostLikeFactory.create_batch(2, post=post_list[2])
+        feedback.factories.CommentLikeFactory(comment=comment)
+        posts.models.Post.objects.update(likes_count=0, comments_count=0)
+        feedback.models.Comment.objects.update(likes_count=0)
+
+        with patch.object(migration, "BATCH_SIZE", 2):
+            migration.backfill_counters(django_apps, connection.schema_editor())
+
+        counts = posts.models.Post.objects.order_by("id").values_list("likes_count", "comments_count")
+        assert list(counts) == [(0, 0), (0, 1), (2, 0)]
+        assert feedback.models.Comment.objects.get().likes_count == 1
+
+
+class TestLikeBuffer:
+    @pytest.fixture()
+    def buffered(self, settings):
+        settings.LIKE_BUFFER = {**settings.LIKE_BUFFER, "ENABLED": True, "FLUSH_INTERVAL": 0}
+        like_buffer.store.pop_all()
+        yield
+        like_buffer.store.pop_all()
+
+    def test_post_change_like_buffered(self, buffered, api_client, db, django_capture_on_commit_callbacks):
+        post = posts.factories.PostFactory()
+        api_client.force_authenticate(post.user)
+
+        resp = api_client.patch(POST_CHANGE_LIKE_URL(post.id), data={"is_liked": True})
+        assert resp.status_code == 200
+        assert resp.json() == {"is_liked": True, "likes_count": 1}
+        assert not feedback.models.PostLike.objects.exists()
+
+        # Own pending like is visible before flush
+        resp = api_client.get(POST_DETAIL_URL(post.id))
+        assert resp.json()["is_liked"] is True
+
+        with django_capture_on_commit_callbacks(execute=True):
+            assert like_buffer.flush() == 1
+
+        post.refresh_from_db()
+        assert post.likes_count == 1
+        assert feedback.models.PostLike.objects.filter(post_id=post.id, user_id=post.user_id).exists()
+
+    def test_change_like_buffered_not_modified(self, buffered, api_client, db):
+        post = posts.factories.PostFactory()
+        comment = feedback.factories.CommentFactory(post=post)
+        api_client.force_authenticate(post.user)
+        etags = {url: api_client.get(url).headers["ETag"] for url in (POST_DETAIL_URL(post.id), COMMENT_LIST_URL)}
+
+        api_client.patch(POST_CHANGE_LIKE_URL(post.id), data={"is_liked": True})
+        api_client.patch(COMMENT_CHANGE_LIKE_URL(comment.id), data={"is_liked": True})
+
+        # Pending likes aren't stored yet, but change the representation
+        for url, etag in etags.items():
+            resp = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert resp.status_code == 200
+            assert resp.headers["ETag"] != etag
+
+        assert resp.json()["results"][0]["is_liked"] is True
+
+    def test_change_like_buffered_coalesced(self, buffered, api_client, db):
+        comment = feedback.factories.CommentFactory()
+        feedback.factories.CommentLikeFactory(comment=comment, user=comment.user)
+        api_client.force_authenticate(comment.user)
+
+        for is_liked in (False, True, False):
+            resp = api_client.patch(COMMENT_CHANGE_LIKE_URL(comment.id), data={"is_liked": is_liked})
+            assert resp.json()["likes_count"] == int(is_liked)
+
+        resp = api_client.get(COMMENT_LIST_URL)
+        assert resp.json()["results"][0]["is_liked"] is False
+
+        assert like_buffer.flush() == 1
+        comment.refresh_from_db()
+        assert comment.likes_count == 0
+        assert not feedback.models.CommentLike.objects.exists()
+
+    def test_change_like_buffered_repeated(self, buffered, api_client, db):
+        post = posts.factories.PostFactory()
+        api_client.force_authenticate(post.user)
+
+        for _ in range(2):
+            resp = api_client.patch(POST_CHANGE_LIKE_URL(post.id), data={"is_liked": True})
+            assert resp.json() == {"is_liked": True, "likes_count": 1}
+
+        assert like_buffer.get_pending("post", post.user_id) == {post.id: True}
+
+        # Unlike cancels the pending like, nothing is left to flush
+        resp = api_client.patch(POST_CHANGE_LIKE_URL(post.id), data={"is_liked": False})
+        assert resp.json() == {"is_liked": False, "likes_count": 0}
+        assert like_buffer.get_pending("post", post.user_id) == {}
+        assert like_buffer.flush() == 0
+
+    def test_flush_many_users(self, buffered, api_client, db, django_assert_max_num_queries):
+        post = posts.factories.PostFactory()
+        user_list = users.factories.UserFactory.create_batch(5)
+
+        for user in user_list:
+            api_client.force_authenticate(user)
+            api_client.patch(POST_CHANGE_LIKE_URL(post.id), data={"is_liked": True})
+
+        # Existing likes, bulk insert, counter update and savepoints
+        with django_assert_max_num_queries(6):
+            assert like_buffer.flush() == len(user_list)
+
+        post.refresh_from_db()
+        assert post.likes_count == feedback.models.PostLike.objects.filter(post_id=post.id).count() == len(user_list)
+
+    def test_flush_failure_restores_intents(self, buffered, db):
+        post = posts.factories.PostFactory()
+        like_buffer.add("post", post.user_id, post.id, True)
+
+        with patch.object(like_buffer, "_flush_kind", side_effect=RuntimeError):
+            with pytest.raises(RuntimeError):
+                like_buffer.flush()
+
+        assert like_buffer.get_pending("post", post.user_id) == {post.id: True}
+
+
+class TestAdmin:
+    @pytest.fixture()
+    def comment_like(self, db):
+        return feedback.factories.CommentLikeFactory()
+
+    def test_str_without_queries(self, comment_like, django_assert_num_queries):
+        comment = feedback.models.Comment.objects.get(id=comment_like.comment_id)
+        post_like = feedback.factories.PostLikeFactory(post_id=comment.post_id)
+        post_like = feedback.models.PostLike.objects.get(id=post_like.id)
+        comment_like = feedback.models.CommentLike.objects.get(id=comment_like.id)
+
+        with django_assert_num_queries(0):
+            assert f"post #{comment.post_id}" in str(comment)
+            assert f"post #{post_like.post_id}" in str(post_like)
+            assert f"comment #{comment_like.comment_id}" in str(comment_like)
+
+        comment = feedback.models.Comment.objects.select_related("user", "post").get(id=comment.id)
+
+        with django_assert_num_queries(0):
+            assert comment.user.username in str(comment)
+            assert comment.post.title in str(comment)
+
+    @pytest.mark.parametrize(
+        "url",
+        (
+            "/admin/feedback/comment/add/",
+            "/admin/feedback/postlike/add/",
+            "/admin/feedback/commentlike/add/",
+            "/admin/emails/unsentemail/add/",
+            "/admin/posts/post/add/",
+        ),
+    )
+    def test_change_form_has_no_select_options(self, url, admin_client, comment_like):
+        resp = admin_client.get(url)
+        assert resp.status_code == 200
+
+        # Related rows are loaded by autocomplete requests or picked by id, never rendered into the form
+        content = resp.content.decode()
+        assert comment_like.comment.post.title not in content
+        assert comment_like.user.email not in content
+
+    def test_autocomplete(self, admin_client, comment_like):
+        query = {"app_label": "feedback", "model_name": "postlike", "field_name": "post", "term": ""}
+        resp = admin_client.get("/admin/autocomplete/", data=query)
+        assert resp.status_code == 200
+        assert [one["id"] for one in resp.json()["results"]] == [str(comment_like.comment.post_id)]
+
+
+class TestDeletion:
+    @pytest.fixture()
+    def post(self, db):
+        post = posts.factories.PostFactory(tags=[posts.factories.TagFactory()])
+        comment_list = feedback.factories.CommentFactory.create_batch(3, post=post)
+        feedback.factories.CommentLikeFactory.create_batch(2, comment=comment_list[0])
+        feedback.factories.PostLikeFactory.create_batch(2, post=post)
+        return post
+
+    def test_post_delete_hides_then_purges(self, api_client, post):
+        api_client.force_authenticate(post.user)
+        resp = api_client.delete(reverse("post-detail", kwargs={"pk": post.id}))
+        assert resp.status_code == 204
+
+        assert api_client.get(POST_DETAIL_URL(post.id)).status_code == 404
+        assert posts.models.Post.all_objects.filter(id=post.id, deleted_at__isnull=False).exists()
+        assert feedback.models.Comment.objects.filter(post_id=post.id).count() == 3
+
+        call_command("purge_deleted", batch_size=1)
+
+        assert not posts.models.Post.all_objects.filter(id=post.id).exists()
+        assert not feedback.models.Comment.objects.exists()
+        assert not feedback.models.CommentLike.objects.exists()
+        assert not feedback.models.PostLike.objects.exists()
+
+    def test_user_delete_hides_then_purges(self, api_client, post, django_capture_on_commit_callbacks):
+        user = users.factories.UserFactory()
+        own_post = posts.factories.PostFactory(user=user)
+        feedback.factories.CommentFactory(post=own_post)
+        feedback.factories.CommentFactory(post=post, user=user)
+        feedback.factories.PostLikeFactory(post=post, user=user)
+        feedback.factories.CommentLikeFactory(comment=post.comments.first(), user=user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            feedback.deletion.mark_users_deleted(users.models.User.objects.filter(id=user.id))
+
+        # Hidden user can't authenticate, own posts are hidden at once
+        api_client.force_authenticate(user)
+        assert api_client.get(POST_LIST_URL).status_code == 401
+        assert not posts.models.Post.objects.filter(id=own_post.id).exists()
+
+        call_command("purge_deleted", batch_size=2)
+
+        assert not users.models.User.all_objects.filter(id=user.id).exists()
+        assert not posts.models.Post.all_objects.filter(id=own_post.id).exists()
+
+        post.refresh_from_db()
+        assert (post.likes_count, post.comments_count) == (2, 3)
+        assert post.comments.order_by("id").first().likes_count == 2
+
+    def test_admin_delete_hides(self, admin_client, post):
+        resp = admin_client.post(f"/admin/posts/post/{post.id}/delete/", data={"post": "yes"})
+        assert resp.status_code == 302
+
+        assert not posts.models.Post.objects.filter(id=post.id).exists()
+        assert posts.models.Post.all_objects.filter(id=post.id).exists()
+
+    def test_admin_mark_deleted_required(self):
+        with pytest.raises(ImproperlyConfigured):
+
+            class PostAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
+                pass
+
+    def test_admin_delete_likes_and_comments_counters(self, admin_client, post):
+        comment = post.comments.order_by("id").first()
+        post_like = feedback.models.PostLike.objects.filter(post_id=post.id).first()
+
+        resp = admin_client.post(f"/admin/feedback/postlike/{post_like.id}/delete/", data={"post": "yes"})
+        assert resp.status_code == 302
+
+        body = {
+            "action": "delete_selected",
+            "post": "yes",
+            "_selected_action": list(feedback.models.CommentLike.objects.values_list("id", flat=True)),
+        }
+        resp = admin_client.post("/admin/feedback/commentlike/", data=body)
+        assert resp.status_code == 302
+
+        resp = admin_client.post(f"/admin/feedback/comment/{comment.id}/delete/", data={"post": "yes"})
+        assert resp.status_code == 302
+
+        post.refresh_from_db()
+        assert (post.likes_count, post.comments_count) == (1, 2)
+        assert not feedback.models.CommentLike.objects.exists()
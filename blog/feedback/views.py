@@ -1,3 +1,4 @@
+from django.db import transaction
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from rest_framework import generics, mixins, permissions
 
@@ -6,8 +7,10 @@ import feedback.models
 import feedback.permissions
 import feedback.serializers
 import posts.models
+from core.pagination import KeysetPagination
 from core.serializers import EmptySerializer
-from core.viewsets import ActionViewSet
+from core.throttling import TokenBucketThrottle
+from core.viewsets import ActionViewSet, ConditionalListMixin
 
 
 @extend_schema_view(
@@ -27,6 +30,7 @@ from core.viewsets import ActionViewSet
     destroy=extend_schema(description=("Delete comment\n\n" "Only authorized owner can delete comment")),
 )
 class CommentViewSet(
+    ConditionalListMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
@@ -34,10 +38,11 @@ class CommentViewSet(
     ActionViewSet,
 ):
     http_method_names = ["get", "post", "patch", "delete"]
-    queryset = feedback.models.Comment.with_likes_count().select_related("user")
+    queryset = feedback.models.Comment.objects.visible().select_related("user")
     filterset_class = feedback.filters.CommentFilterSet
+    pagination_class = KeysetPagination
 
-    action_querysets = {"destroy": feedback.models.Comment.objects.all(), "list": queryset.order_by("-created_at")}
+    action_querysets = {"destroy": feedback.models.Comment.objects.visible(), "list": queryset.order_by("-created_at")}
     action_serializers = {
         "list": feedback.serializers.CommentListSerializer,
         "create": feedback.serializers.CommentCreateSerializer,
@@ -49,6 +54,13 @@ class CommentViewSet(
         "partial_update": [permissions.IsAuthenticated, feedback.permissions.IsMyComment],
         "destroy": [permissions.IsAuthenticated, feedback.permissions.IsMyComment],
     }
+    throttle_classes = [TokenBucketThrottle]
+    action_throttle_scopes = {"create": "comment"}
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        posts.models.Post.objects.filter(id=instance.post_id).change_counter("comments_count", -1)
+        instance.delete()
 
 
 @extend_schema(
@@ -67,6 +79,8 @@ class PostLikeChangeView(generics.UpdateAPIView):
     lookup_field = "id"
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = feedback.serializers.PostLikeChangeSerializer
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "like"
 
 
 @extend_schema(
@@ -80,8 +94,10 @@ class PostLikeChangeView(generics.UpdateAPIView):
 )
 class CommentLikeChange(generics.UpdateAPIView):
     http_method_names = ["patch"]
-    queryset = feedback.models.Comment.objects.all()
+    queryset = feedback.models.Comment.objects.visible()
     lookup_field = "id"
     lookup_url_kwarg = "id"
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = feedback.serializers.CommentLikeChangeSerializer
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "like"
@@ -1,16 +1,16 @@
 from django.contrib import admin
 
+import feedback.deletion
 import posts.models
+from core.admin import SoftDeleteAdminMixin
+from core.pagination import EstimatedCountPaginator
 
 
 @admin.register(posts.models.Post)
-class PostAdmin(admin.ModelAdmin):
-    search_fields = [
-        "title",
-        "created_at__day",
-        "created_at__year",
-        "created_at__month",
-    ]
+class PostAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
+    # Only trigram-indexed fields, date lookups are available via date_hierarchy
+    search_fields = ["title"]
+    date_hierarchy = "created_at"
     fieldsets = [
         (None, {"fields": ("title", "user", "content", "tags")}),
         ("Misc", {"fields": ("id", "created_at", "updated_at")}),
@@ -23,29 +23,23 @@ class PostAdmin(admin.ModelAdmin):
         "likes_count",
         "comments_count",
     ]
-    filter_horizontal = ["tags"]
-    list_display = ["created_at", "title", "user"]
-
-    def likes_count(self, post):
-        return post.likes_count
-
-    def comments_count(self, post):
-        return post.comments_count
+    autocomplete_fields = ["user", "tags"]
+    list_display = ["created_at", "title", "user", "likes_count", "comments_count"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    mark_deleted = staticmethod(feedback.deletion.mark_posts_deleted)
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        queryset = queryset.with_likes_count().with_comments_count().select_related("user")
+        queryset = queryset.select_related("user")
         return queryset
 
 
 @admin.register(posts.models.Tag)
 class TagAdmin(admin.ModelAdmin):
-    search_fields = [
-        "name",
-        "created_at__day",
-        "created_at__year",
-        "created_at__month",
-    ]
+    # Only trigram-indexed fields, date lookups are available via date_hierarchy
+    search_fields = ["name"]
+    date_hierarchy = "created_at"
     fields = [
         "id",
         "created_at",
@@ -0,0 +1,134 @@
+import hashlib
+import json
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.request import Request
+
+import posts.models
+from core.cache import TieredCache
+
+
+class PostListCache:
+    """
+    Cache of anonymous post list responses in core.cache.TieredCache
+
+    Any post change bumps the namespace version instead of deleting every cached page. Only one worker renders an
+    expired or missing page, others serve the stale one or wait for it
+    """
+
+    namespace = "posts:list"
+
+    def __init__(self):
+        self.cache = TieredCache(self.namespace)
+
+    @property
+    def config(self) -> dict:
+        return settings.POST_LIST_CACHE
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.config["ENABLED"]
+
+    def get_generation(self) -> int:
+        return self.cache.get_version()
+
+    def bump_generation(self):
+        self.cache.bump_version()
+
+    def bump_generation_on_commit(self):
+        self.cache.bump_version_on_commit()
+
+    def normalize_params(self, request: Request) -> list:
+        params = []
+
+        for name, values in request.query_params.lists():
+            values = sorted(one for one in values if one)
+
+            if not values or (name == "page" and values == ["1"]):
+                continue
+
+            params.append([name, values])
+
+        return sorted(params)
+
+    def make_key(self, request: Request) -> str:
+        payload = json.dumps([request.build_absolute_uri(request.path), self.normalize_params(request)])
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def get_timeout(self, request: Request) -> int:
+        # Search queries have long tail of unique keys, so they are kept for shorter period
+        if request.query_params.get("search"):
+            return self.config["SEARCH_TIMEOUT"]
+
+        return self.config["TIMEOUT"]
+
+    def get_or_set(self, request: Request, render: Callable[[], Any]):
+        """
+        :param request:
+        :param render: returns response data and headers to cache, None if response shouldn't be cached
+        :return: cached or rendered data and headers
+        """
+        return self.cache.get_or_set(
+            self.make_key(request),
+            render,
+            timeout=self.get_timeout(request),
+            stale_timeout=self.config["STALE_TIMEOUT"],
+        )
+
+    def get_stats(self) -> dict:
+        stats = self.cache.get_stats()
+        return {"generation": stats.pop("version"), **stats}
+
+
+post_list_cache = PostListCache()
+
+
+class TagRegistry:
+    """
+    Cached set of existing tag ids, used to validate tag filters without a query per request
+
+    Cleared on tag changes, ids missing from it (e.g. created by bulk insert) are looked up and added to it
+    """
+
+    key = "posts:tag_ids"
+    timeout = 60 * 60
+
+    def get_ids(self) -> frozenset[int]:
+        ids = cache.get(self.key)
+
+        if ids is None:
+            ids = self.reload()
+
+        return frozenset(ids)
+
+    def reload(self) -> frozenset[int]:
+        ids = frozenset(posts.models.Tag.objects.values_list("id", flat=True))
+        cache.set(self.key, ids, timeout=self.timeout)
+        return ids
+
+    def get_missing_ids(self, tag_ids: list[int]) -> set[int]:
+        ids = self.get_ids()
+        missing_ids = set(tag_ids).difference(ids)
+
+        if missing_ids:
+            # Only unknown ids are looked up, so requests with random ids don't reload all tags
+            found_ids = set(posts.models.Tag.objects.filter(id__in=missing_ids).values_list("id", flat=True))
+
+            if found_ids:
+                cache.set(self.key, ids | found_ids, timeout=self.timeout)
+
+            missing_ids.difference_update(found_ids)
+
+        return missing_ids
+
+    def clear(self):
+        cache.delete(self.key)
+
+    def clear_on_commit(self):
+        transaction.on_commit(self.clear)
+
+
+tag_registry = TagRegistry()
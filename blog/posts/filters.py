@@ -3,18 +3,40 @@ from django_filters import rest_framework as filters
 from rest_framework.serializers import ValidationError
 
 import posts.models
+from core.search import fuzzy_search
+from posts.cache import tag_registry
+from posts.search import get_post_search
+
+MAX_TAG_IDS = 20
 
 
 class PostFilterSet(filters.FilterSet):
     order_by = filters.OrderingFilter(fields=["created_at", "title"])
     tag_ids = filters.CharFilter(
-        method="filter_tag_ids", help_text="Comma-separated integers. At most 3 `tag_ids` can be specified"
+        method="filter_tag_ids",
+        help_text=f"Comma-separated integers. At most {MAX_TAG_IDS} `tag_ids` can be specified",
+    )
+    tag_ids_match = filters.ChoiceFilter(
+        method="filter_tag_ids_match",
+        choices=[("any", "any"), ("all", "all")],
+        help_text="Whether posts should have any (default) or all of `tag_ids`. Used with `tag_ids` only",
     )
     title = filters.CharFilter(
         field_name="title",
         lookup_expr="icontains",
         help_text="Case-insensitive search",
     )
+    search = filters.CharFilter(
+        method="filter_search",
+        help_text=(
+            "Full-text search in title and content. Supports quoted phrases, `or` and `-` to exclude words. "
+            "Unless `order_by` is specified, results are ordered by relevance"
+        ),
+    )
+    search_headline = filters.BooleanFilter(
+        method="filter_search_headline",
+        help_text="If true, each post gets `search_headline` snippet with highlighted matches. Used with `search` only",
+    )
 
     class Meta:
         model = posts.models.Post
@@ -24,30 +46,60 @@ class PostFilterSet(filters.FilterSet):
         }
 
     def filter_tag_ids(self, queryset: models.QuerySet, name, value: str):
-        tag_ids = value.split(",")
-        tag_ids = self.validate_tag_ids(tag_ids)
+        tag_ids = self.validate_tag_ids(value.split(","))
 
-        tag_subquery = posts.models.Tag.objects.filter(posts__id=models.OuterRef("id"), id__in=tag_ids)
-        queryset = queryset.annotate(has_tags=models.Exists(tag_subquery)).filter(has_tags=True)
+        through_objects = posts.models.Post.tags.through.objects
 
+        if self.form.cleaned_data.get("tag_ids_match") == "all":
+            # Posts are found from the through table rows of given tags, instead of counting tags of every post
+            post_ids = (
+                through_objects.filter(tag_id__in=tag_ids)
+                .values("post_id")
+                .annotate(matched_tags_count=models.Count("tag_id"))
+                .filter(matched_tags_count=len(tag_ids))
+                .values("post_id")
+            )
+            return queryset.filter(id__in=post_ids)
+
+        # Probes (post_id, tag_id) index of the through table for each post
+        tag_posts = through_objects.filter(post_id=models.OuterRef("id"), tag_id__in=tag_ids)
+        return queryset.filter(models.Exists(tag_posts))
+
+    def filter_tag_ids_match(self, queryset: models.QuerySet, name, value: str):
+        # Handled by filter_tag_ids
         return queryset
 
-    def validate_tag_ids(self, tag_ids):
-        if len(tag_ids) > 3:
-            raise ValidationError({"tag_ids": "At most 3 tag_ids can be specified"})
+    def filter_search(self, queryset: models.QuerySet, name, value: str):
+        search = get_post_search()
+        queryset = search.search(queryset, value)
+
+        if self.form.cleaned_data.get("search_headline"):
+            queryset = search.with_headline(queryset, value)
+
+        if not self.form.cleaned_data.get("order_by"):
+            queryset = queryset.order_by("-search_rank", "-created_at")
+
+        return queryset
+
+    def filter_search_headline(self, queryset: models.QuerySet, name, value: bool):
+        # Handled by filter_search
+        return queryset
+
+    def validate_tag_ids(self, tag_ids) -> list[int]:
+        if len(tag_ids) > MAX_TAG_IDS:
+            raise ValidationError({"tag_ids": f"At most {MAX_TAG_IDS} tag_ids can be specified"})
 
         try:
-            value = [int(one) for one in tag_ids]
+            value = sorted({int(one) for one in tag_ids})
         except ValueError:
             raise ValidationError({"tag_ids": "All values must be integers"})
 
-        found_ids = posts.models.Tag.objects.filter(id__in=value).values_list("id", flat=True)
-        invalid_ids = set(value).difference(found_ids)
+        invalid_ids = tag_registry.get_missing_ids(value)
 
         if invalid_ids:
-            raise ValidationError({"tag_ids": f"Tags with ids {list(invalid_ids)} don't exist"})
+            raise ValidationError({"tag_ids": f"Tags with ids {sorted(invalid_ids)} don't exist"})
 
-        return tag_ids
+        return value
 
 
 class TagFilterSet(filters.FilterSet):
@@ -55,7 +107,15 @@ class TagFilterSet(filters.FilterSet):
         lookup_expr="icontains",
         help_text="Case-insensitive search",
     )
+    fuzzy_name = filters.CharFilter(
+        method="filter_fuzzy_name",
+        help_text="Typo-tolerant search, results are ordered by similarity",
+    )
 
     class Meta:
         model = posts.models.Tag
         fields = []
+
+    def filter_fuzzy_name(self, queryset: models.QuerySet, name, value: str):
+        queryset = fuzzy_search(queryset, "name", value)
+        return queryset.order_by("-similarity", "name")
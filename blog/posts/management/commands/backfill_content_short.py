@@ -0,0 +1,44 @@
+from django.core.management import BaseCommand, CommandParser
+from django.db import transaction
+
+import posts.models
+
+
+class Command(BaseCommand):
+    help = "Fills stored post excerpts (content_short) in batches"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--batch-size", "-b", type=int, default=500, help="Number of posts updated per transaction")
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute excerpts of all posts, by default only posts with empty excerpt are processed",
+        )
+
+    def handle(self, *args, **options):
+        queryset = posts.models.Post.objects.all()
+
+        if not options["all"]:
+            queryset = queryset.filter(content_short="")
+
+        updated_count = 0
+        last_id = 0
+
+        while True:
+            # Only id and content are loaded, updated_at is kept intact by bulk_update
+            batch = list(queryset.filter(id__gt=last_id).order_by("id").only("id", "content")[: options["batch_size"]])
+
+            if not batch:
+                break
+
+            for post in batch:
+                post.content_short = posts.models.make_content_short(post.content)
+
+            with transaction.atomic():
+                posts.models.Post.objects.bulk_update(batch, ["content_short"])
+
+            updated_count += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"Post: updated excerpts up to id {last_id}")
+
+        self.stdout.write(f"Post: updated {updated_count} excerpt(s)")
@@ -0,0 +1,27 @@
+# Generated by Django 4.1 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # Indexes are created concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("posts", "0003_post_comments_count_post_likes_count"),
+    ]
+
+    operations = [
+        core.operations.AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                fields=["created_at", "id"], name="post_created_at_id_idx"
+            ),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(fields=["title", "id"], name="post_title_id_idx"),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.1 on 2026-10-18 11:10
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+import core.operations
+from core.models import update_in_batches
+
+BATCH_SIZE = 1000
+
+CREATE_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION posts_post_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER posts_post_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content ON posts_post
+    FOR EACH ROW EXECUTE FUNCTION posts_post_search_vector_update();
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS posts_post_search_vector_trigger ON posts_post;
+DROP FUNCTION IF EXISTS posts_post_search_vector_update();
+"""
+
+
+def create_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_TRIGGER_SQL)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_TRIGGER_SQL)
+
+
+def backfill_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        # Trigger fills search_vector on UPDATE OF title
+        post_model = apps.get_model("posts", "Post")
+        update_in_batches(post_model.objects.all(), BATCH_SIZE, title=models.F("title"))
+
+
+class Migration(migrations.Migration):
+    # Existing posts are backfilled in batches and the index is built concurrently
+    atomic = False
+
+    dependencies = [
+        ("posts", "0004_post_post_created_at_id_idx_post_post_title_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        # Trigger and GIN index are PostgreSQL only, other databases use posts.search.FallbackPostSearch
+        migrations.RunPython(create_trigger, drop_trigger),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        core.operations.PostgresRunSQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS post_search_vector_idx ON posts_post USING gin (search_vector);",
+            "DROP INDEX CONCURRENTLY IF EXISTS post_search_vector_idx;",
+        ),
+    ]
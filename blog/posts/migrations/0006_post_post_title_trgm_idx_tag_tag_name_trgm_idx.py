@@ -0,0 +1,26 @@
+# Generated by Django 4.1 on 2026-10-18 11:12
+
+from django.db import migrations
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # Indexes are created concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("posts", "0005_post_search_vector"),
+        ("users", "0005_user_user_username_trgm_idx_user_user_email_trgm_idx"),
+    ]
+
+    operations = [
+        core.operations.PostgresRunSQL(
+            "CREATE INDEX CONCURRENTLY post_title_trgm_idx ON posts_post USING gin (UPPER(title) gin_trgm_ops);",
+            "DROP INDEX CONCURRENTLY IF EXISTS post_title_trgm_idx;",
+        ),
+        core.operations.PostgresRunSQL(
+            "CREATE INDEX CONCURRENTLY tag_name_trgm_idx ON posts_tag USING gin (UPPER(name) gin_trgm_ops);",
+            "DROP INDEX CONCURRENTLY IF EXISTS tag_name_trgm_idx;",
+        ),
+    ]
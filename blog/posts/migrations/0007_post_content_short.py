@@ -0,0 +1,19 @@
+# Generated by Django 4.1 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0006_post_post_title_trgm_idx_tag_tag_name_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="content_short",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=128
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 12:05
+
+from django.db import migrations
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # Index is created concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("posts", "0007_post_content_short"),
+    ]
+
+    operations = [
+        # Through table is auto-created by Tag.posts, so the index can't be declared in model Meta.
+        # Unique (tag_id, post_id) constraint already exists, this one backs tag filtering per post
+        core.operations.PostgresRunSQL(
+            "CREATE INDEX CONCURRENTLY tag_posts_post_id_tag_id_idx ON posts_tag_posts (post_id, tag_id);",
+            "DROP INDEX CONCURRENTLY IF EXISTS tag_posts_post_id_tag_id_idx;",
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # Index is created concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("posts", "0008_tag_posts_post_id_tag_id_idx"),
+    ]
+
+    operations = [
+        core.operations.AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                fields=["user", "created_at", "id"], name="post_user_created_at_id_idx"
+            ),
+        ),
+    ]
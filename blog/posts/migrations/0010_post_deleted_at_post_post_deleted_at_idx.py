@@ -0,0 +1,30 @@
+# Generated by Django 4.1 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # Index is created concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("posts", "0009_post_post_user_created_at_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", False)),
+                fields=["deleted_at"],
+                name="post_deleted_at_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.1 on 2026-10-18 14:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # Indexes are dropped concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("posts", "0010_post_deleted_at_post_post_deleted_at_idx"),
+    ]
+
+    operations = [
+        # Covered by post_user_created_at_id_idx
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="post",
+                    name="user",
+                    field=models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="posts",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            database_operations=[
+                core.operations.RemoveFieldIndexConcurrently(
+                    model_name="post", field_name="user"
+                ),
+            ],
+        ),
+        # Covered by tag_posts_post_id_tag_id_idx, auto-created through table keeps the index in model state
+        core.operations.RemoveFieldIndexConcurrently(
+            model_name="tag_posts", field_name="post"
+        ),
+    ]
@@ -1,21 +1,54 @@
+import re
+
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-from django.db.models import functions
+
+from core.models import CounterQuerySet, count_subquery
+
+CONTENT_SHORT_LENGTH = 128
+
+
+def make_content_short(content: str, max_length: int = CONTENT_SHORT_LENGTH) -> str:
+    """
+    Excerpt of at most max_length characters, cut at word boundary if possible
+    :param content:
+    :param max_length:
+    :return:
+    """
+    if len(content) <= max_length:
+        return content
+
+    excerpt = content[:max_length]
+
+    # Last word is complete
+    if content[max_length].isspace():
+        return excerpt.rstrip()
+
+    last_word = re.search(r"\s+\S*$", excerpt)
+
+    # Long words without whitespace get cut in the middle
+    if last_word is None or last_word.start() < max_length // 2:
+        return excerpt
+
+    return excerpt[: last_word.start()]
 
 
 class TagQuerySet(models.QuerySet):
     def with_posts_count(self, field_name="posts_count"):
-        return self.annotate(**{field_name: models.Count("posts")})
+        # Correlated subquery, so that only tags of the current page are counted instead of grouping whole join
+        tag_posts = Tag.posts.through.objects.filter(tag_id=models.OuterRef("id"))
+        return self.annotate(**{field_name: count_subquery(tag_posts, "tag_id")})
 
 
-class PostQuerySet(models.QuerySet):
-    def with_content_short(self, field_name="content_short"):
-        return self.annotate(**{field_name: functions.Left("content", 128)})
+class PostQuerySet(CounterQuerySet):
+    pass
 
-    def with_likes_count(self, field_name="likes_count"):
-        return self.annotate(**{field_name: models.Count("likes")})
 
-    def with_comments_count(self, field_name="comments_count"):
-        return self.annotate(**{field_name: models.Count("comments")})
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    def get_queryset(self):
+        # Search vector is only used in WHERE clause, so it's never loaded.
+        # Deleted posts are hidden until purge_deleted command removes them, see Post.all_objects
+        return super().get_queryset().defer("search_vector").filter(deleted_at__isnull=True)
 
 
 class Tag(models.Model):
@@ -25,6 +58,9 @@ class Tag(models.Model):
 
     objects = TagQuerySet.as_manager()
 
+    # Case-insensitive substring (icontains) and fuzzy search are backed by tag_name_trgm_idx trigram index,
+    # PostgreSQL only, so it's created by migration and kept out of model state, see core.operations.PostgresRunSQL
+
     def __str__(self):
         return self.name
 
@@ -33,15 +69,56 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="posts")
+    # Lookups by user are backed by post_user_created_at_id_idx
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="posts", db_index=False)
     title = models.CharField(max_length=320)
     content = models.TextField()
+    # Stored excerpt, so that lists never read large content column, see save() and backfill_content_short command
+    content_short = models.CharField(max_length=CONTENT_SHORT_LENGTH, blank=True, default="", editable=False)
+
+    # Denormalized counters, see feedback.serializers and reconcile_counters command
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    # Maintained by database trigger on PostgreSQL, see posts.search and migrations
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Set when post is deleted, dependants are removed in batches later, see feedback.deletion
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     # workaround to use M2M field in both directions in admin panel
     # noinspection PyUnresolvedReferences
     tags = models.ManyToManyField("posts.Tag", through="posts.tag_posts")
 
-    objects = PostQuerySet.as_manager()
+    objects = PostManager()
+    all_objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Lookup of posts waiting for purge
+            models.Index(
+                fields=["deleted_at"], condition=models.Q(deleted_at__isnull=False), name="post_deleted_at_idx"
+            ),
+            # Keyset pagination, see core.pagination.KeysetPagination
+            models.Index(fields=["created_at", "id"], name="post_created_at_id_idx"),
+            models.Index(fields=["title", "id"], name="post_title_id_idx"),
+            # Posts of the user (user_id filter) in default -created_at order
+            models.Index(fields=["user", "created_at", "id"], name="post_user_created_at_id_idx"),
+            # Case-insensitive substring (icontains) search is backed by post_title_trgm_idx trigram index,
+            # PostgreSQL only, see core.operations.PostgresRunSQL
+        ]
 
     def __str__(self):
         return f"{self.created_at.isoformat().split('T')[0]}: {self.title}"
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        is_content_loaded = "content" not in self.get_deferred_fields()
+
+        if is_content_loaded and (update_fields is None or "content" in update_fields):
+            self.content_short = make_content_short(self.content)
+
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "content_short"}
+
+        super().save(*args, **kwargs)
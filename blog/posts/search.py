@@ -0,0 +1,119 @@
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection, models
+from django.db.models import functions
+from django.db.models.lookups import GreaterThan
+
+SEARCH_CONFIG = "english"
+HEADLINE_START_SEL = "<b>"
+HEADLINE_STOP_SEL = "</b>"
+# Characters of content before the first match and total length of fallback headline
+HEADLINE_CONTEXT = 60
+HEADLINE_LENGTH = 240
+
+# Same replacements as django.utils.html.escape, ampersand goes first
+HTML_ESCAPES = [("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;"), ("'", "&#x27;")]
+
+
+def escape_html(expression: models.Expression) -> models.Expression:
+    """
+    Escape text in SQL, so headline markup is the only HTML in it
+    :param expression: text expression
+    :return:
+    """
+    for char, escaped in HTML_ESCAPES:
+        expression = functions.Replace(expression, models.Value(char), models.Value(escaped))
+
+    return expression
+
+
+class PostgresPostSearch:
+    """
+    Full-text search over posts.Post.search_vector, which is maintained by database trigger, see migrations
+    """
+
+    def get_query(self, text: str) -> SearchQuery:
+        return SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+
+    def search(self, queryset: models.QuerySet, text: str, rank_field="search_rank") -> models.QuerySet:
+        query = self.get_query(text)
+        queryset = queryset.filter(search_vector=query)
+        return queryset.annotate(**{rank_field: SearchRank(models.F("search_vector"), query)})
+
+    def with_headline(self, queryset: models.QuerySet, text: str, field_name="search_headline") -> models.QuerySet:
+        # Content is escaped before highlighting, so it's safe to render as HTML
+        headline = SearchHeadline(
+            escape_html(models.F("content")),
+            self.get_query(text),
+            config=SEARCH_CONFIG,
+            start_sel=HEADLINE_START_SEL,
+            stop_sel=HEADLINE_STOP_SEL,
+        )
+        return queryset.annotate(**{field_name: headline})
+
+
+class FallbackPostSearch:
+    """
+    Substring based search for databases without full-text support (e.g. SQLite in tests)
+
+    Every word should be found either in title or content. Matches in title get higher rank
+    """
+
+    def get_terms(self, text: str) -> list[str]:
+        return [one.strip('"') for one in text.split() if one.strip('"')]
+
+    def search(self, queryset: models.QuerySet, text: str, rank_field="search_rank") -> models.QuerySet:
+        terms = self.get_terms(text)
+        rank = models.Value(0.0)
+
+        for term in terms:
+            queryset = queryset.filter(models.Q(title__icontains=term) | models.Q(content__icontains=term))
+            rank += models.Case(
+                models.When(title__icontains=term, then=models.Value(1.0)),
+                models.When(content__icontains=term, then=models.Value(0.4)),
+                default=models.Value(0.0),
+            )
+
+        return queryset.annotate(**{rank_field: models.ExpressionWrapper(rank, output_field=models.FloatField())})
+
+    def with_headline(self, queryset: models.QuerySet, text: str, field_name="search_headline") -> models.QuerySet:
+        """
+        Escaped fragment of content around the first match of the first term found in content
+
+        Terms are found case-insensitively as by search(), occurrences in the case of the first match get highlighted
+        """
+        terms = self.get_terms(text)
+        lower_content = functions.Lower("content")
+        positions = [functions.StrIndex(lower_content, models.Value(term.lower())) for term in terms]
+        # StrIndex is 1-based and gives 0 if term isn't found
+        first_position = models.Case(
+            *[models.When(models.Q(**{"content__icontains": term}), then=one) for term, one in zip(terms, positions)],
+            default=models.Value(1),
+        )
+        start = functions.Greatest(first_position - HEADLINE_CONTEXT, 1)
+        fragment = functions.Substr("content", start, HEADLINE_LENGTH)
+        headline = escape_html(fragment)
+
+        for term in terms:
+            # Text of the first match in the fragment, in its original case
+            match_position = functions.StrIndex(functions.Lower(fragment), models.Value(term.lower()))
+            match = escape_html(functions.Substr(fragment, match_position, len(term)))
+            highlighted = functions.Concat(
+                models.Value(HEADLINE_START_SEL),
+                match,
+                models.Value(HEADLINE_STOP_SEL),
+                output_field=models.TextField(),
+            )
+            headline = models.Case(
+                models.When(GreaterThan(match_position, 0), then=functions.Replace(headline, match, highlighted)),
+                default=headline,
+                output_field=models.TextField(),
+            )
+
+        return queryset.annotate(**{field_name: headline})
+
+
+def get_post_search():
+    if connection.vendor == "postgresql":
+        return PostgresPostSearch()
+
+    return FallbackPostSearch()
@@ -1,6 +1,10 @@
+from django.db import transaction
 from rest_framework import serializers
 
+import feedback.models
 import posts.models
+from core.serializers import BulkPrimaryKeyRelatedField, IsLikedListSerializer
+from feedback.buffer import BufferedIsLikedMixin
 from users.serializers import UserListSerializer
 
 
@@ -21,10 +25,15 @@ class TagSerializer(serializers.ModelSerializer):
         return val.lower()
 
 
-class PostDetailSerializer(serializers.ModelSerializer):
+class PostDetailSerializer(BufferedIsLikedMixin, serializers.ModelSerializer):
+    like_queryset = feedback.models.PostLike.objects.all()
+    like_parent_field = "post_id"
+    like_kind = "post"
+
     user = UserListSerializer()
     tags = TagSerializer(many=True)
     likes_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = posts.models.Post
@@ -37,13 +46,23 @@ class PostDetailSerializer(serializers.ModelSerializer):
             "user",
             "tags",
             "likes_count",
+            "comments_count",
+            "is_liked",
         ]
 
 
-class PostListSerializer(serializers.ModelSerializer):
+class PostListSerializer(BufferedIsLikedMixin, serializers.ModelSerializer):
+    like_queryset = feedback.models.PostLike.objects.all()
+    like_parent_field = "post_id"
+    like_kind = "post"
+
     user = UserListSerializer()
-    content_short = serializers.CharField()
+    content_short = serializers.CharField(read_only=True)
     likes_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
+    search_headline = serializers.CharField(
+        read_only=True, allow_null=True, help_text="`null` unless `search` and `search_headline` are specified"
+    )
 
     class Meta:
         model = posts.models.Post
@@ -55,13 +74,17 @@ class PostListSerializer(serializers.ModelSerializer):
             "updated_at",
             "user",
             "likes_count",
+            "comments_count",
+            "is_liked",
+            "search_headline",
         ]
+        list_serializer_class = IsLikedListSerializer
 
 
 class PostCreateSerializer(serializers.ModelSerializer):
     user = UserListSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
-    tag_ids = serializers.PrimaryKeyRelatedField(
+    tag_ids = BulkPrimaryKeyRelatedField(
         source="tags", queryset=posts.models.Tag.objects.all(), many=True, write_only=True
     )
     likes_count = serializers.IntegerField(default=0, read_only=True)
@@ -85,13 +108,14 @@ class PostCreateSerializer(serializers.ModelSerializer):
             "updated_at": {"read_only": True},
         }
 
+    @transaction.atomic
     def create(self, validated_data):
-        validated_data["user"] = self.context["request"].user
+        validated_data["user"] = self.context["request"].user.reference
         return super().create(validated_data)
 
 
 class PostUpdateSerializer(serializers.ModelSerializer):
-    tag_ids = serializers.PrimaryKeyRelatedField(
+    tag_ids = BulkPrimaryKeyRelatedField(
         source="tags",
         queryset=posts.models.Tag.objects.all(),
         many=True,
@@ -120,6 +144,7 @@ class PostUpdateSerializer(serializers.ModelSerializer):
             "updated_at": {"read_only": True},
         }
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if "tags" in validated_data:
             self.update_tags(instance, validated_data.pop("tags"))
@@ -127,5 +152,14 @@ class PostUpdateSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
     def update_tags(self, instance: posts.models.Post, tags: list[posts.models.Tag]):
-        instance.tags.clear()
-        instance.tags.add(*tags)
+        # Only rows of removed / added tags are deleted / inserted
+        instance.tags.set(tags)
+
+
+class PostListCacheStatsSerializer(serializers.Serializer):
+    generation = serializers.IntegerField()
+    hits = serializers.IntegerField()
+    local_hits = serializers.IntegerField()
+    stale = serializers.IntegerField()
+    misses = serializers.IntegerField()
+    hit_rate = serializers.FloatField(allow_null=True)
@@ -0,0 +1,32 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+import posts.models
+from posts.cache import post_list_cache, tag_registry
+
+
+@receiver(post_save, sender=posts.models.Post)
+@receiver(post_delete, sender=posts.models.Post)
+@receiver(post_save, sender=posts.models.Tag)
+@receiver(post_delete, sender=posts.models.Tag)
+@receiver(m2m_changed, sender=posts.models.Post.tags.through)
+def on_post_list_changed(sender, **kwargs):
+    """
+    Invalidate cached post lists once the change is committed
+    :param sender:
+    :param kwargs:
+    :return:
+    """
+    post_list_cache.bump_generation_on_commit()
+
+
+@receiver(post_save, sender=posts.models.Tag)
+@receiver(post_delete, sender=posts.models.Tag)
+def on_tags_changed(sender, **kwargs):
+    """
+    Reset cached tag ids once the change is committed
+    :param sender:
+    :param kwargs:
+    :return:
+    """
+    tag_registry.clear_on_commit()
@@ -1,17 +1,30 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+
 import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
+import feedback.factories
 import posts.factories
+import posts.filters
 import posts.models
 import posts.serializers
 import users.factories
+from core.cache import TieredCache, get_shared_cache, local_cache
+from core.pagination import EstimatedCountPaginator, KeysetPagination
+from posts.cache import post_list_cache, tag_registry
 
 POST_LIST_URL = reverse("post-list")
 POST_CREATE_URL = reverse("post-list")
 POST_DETAIL_URL = lambda post_id: reverse("post-detail", kwargs={"pk": post_id})
 POST_UPDATE_URL = lambda post_id: reverse("post-detail", kwargs={"pk": post_id})
 POST_DELETE_URL = lambda post_id: reverse("post-detail", kwargs={"pk": post_id})
+POST_CACHE_STATS_URL = reverse("post-cache-stats")
 
 TAG_LIST_URL = reverse("tag-list")
 TAG_CREATE_URL = reverse("tag-list")
@@ -152,6 +165,35 @@ class TestPosts:
         ordered_ids = [one.id for one in sorted(post_list, key=key, reverse=is_reversed)]
         assert [one["id"] for one in data["results"]] == ordered_ids
 
+    @pytest.mark.parametrize("order_by", (None, "created_at", "-created_at", "title", "-title"))
+    def test_post_list_cursor(self, order_by, api_client, post_list):
+        query = {"cursor": ""}
+        sorted_posts = post_list
+
+        if order_by is not None:
+            query["order_by"] = order_by
+            key = lambda p: getattr(p, order_by.lstrip("-"))
+            sorted_posts = sorted(post_list, key=key, reverse=order_by.startswith("-"))
+
+        result_ids = []
+        url = POST_LIST_URL
+
+        with patch.object(KeysetPagination, "page_size", 3):
+            while url is not None:
+                resp = api_client.get(url, data=query)
+                assert resp.status_code == 200
+
+                data = resp.json()
+                assert "count" not in data
+                result_ids += [one["id"] for one in data["results"]]
+                url, query = data["next"], {}
+
+        assert result_ids == [one.id for one in sorted_posts]
+
+    def test_post_list_cursor_invalid(self, api_client, post_list):
+        resp = api_client.get(POST_LIST_URL, data={"cursor": "invalid"})
+        assert resp.status_code == 404
+
     @pytest.mark.parametrize(
         "tag_indexes,post_indexes",
         (
@@ -173,6 +215,70 @@ class TestPosts:
         assert data["count"] == len(post_ids)
         assert [one["id"] for one in data["results"]] == post_ids
 
+    @pytest.mark.parametrize(
+        "tag_indexes,post_indexes",
+        (
+            ([0], range(3)),
+            ([0, 1], [1]),
+            ([0, 2], [2]),
+            (range(3), []),
+        ),
+    )
+    def test_post_list_filter_tag_ids_all(self, tag_indexes, post_indexes, api_client, post_list, tag_list):
+        tag_ids = map(lambda i: tag_list[i].id, tag_indexes)
+        post_ids = list(map(lambda i: post_list[i].id, post_indexes))
+
+        query = {"tag_ids": ",".join(map(str, tag_ids)), "tag_ids_match": "all"}
+        resp = api_client.get(POST_LIST_URL, data=query)
+        assert resp.status_code == 200
+
+        data = resp.json()
+        assert [one["id"] for one in data["results"]] == post_ids
+
+    @pytest.mark.parametrize(
+        "tag_ids",
+        (
+            "a",
+            "0",
+            ",".join(map(str, range(1, posts.filters.MAX_TAG_IDS + 2))),
+        ),
+    )
+    def test_post_list_filter_tag_ids_invalid(self, tag_ids, api_client, tag_list):
+        resp = api_client.get(POST_LIST_URL, data={"tag_ids": tag_ids})
+        assert resp.status_code == 400
+        assert "tag_ids" in resp.json()
+
+    def test_post_list_filter_tag_ids_cached(self, api_client, tag_list, django_assert_num_queries):
+        query = {"tag_ids": tag_list[0].id}
+        api_client.get(POST_LIST_URL, data=query)
+
+        # Count and page queries only, tags are validated by the cached registry
+        with django_assert_num_queries(2):
+            resp = api_client.get(POST_LIST_URL, data={"tag_ids": tag_list[1].id})
+
+        assert resp.status_code == 200
+
+    def test_post_list_filter_tag_ids_unknown(self, api_client, tag_list):
+        tag_registry.get_ids()
+        new_tag = posts.models.Tag.objects.bulk_create([posts.models.Tag(name="new")])[0]
+
+        with CaptureQueriesContext(connection) as queries:
+            assert tag_registry.get_missing_ids([tag_list[0].id, new_tag.id, 0]) == {0}
+
+        # Only unknown ids are looked up, known ones are added to the registry
+        assert len(queries) == 1
+        assert "IN" in queries[0]["sql"]
+        assert new_tag.id in tag_registry.get_ids()
+
+        # Tags created without signals are found by reloading the registry
+        new_tag = posts.models.Tag.objects.bulk_create([posts.models.Tag(name="bulk")])[0]
+        resp = api_client.get(POST_LIST_URL, data={"tag_ids": new_tag.id})
+        assert resp.status_code == 200
+
+    def test_post_list_filter_tag_ids_uses_index(self, no_seqscan, tag_list):
+        queryset = posts.filters.PostFilterSet({"tag_ids": str(tag_list[0].id)}).qs
+        assert "tag_posts_post_id_tag_id_idx" in queryset.explain()
+
     @pytest.mark.parametrize("title", ("po", "pO", "a", "ac"))
     def test_post_list_filter_title(self, title, api_client, post_list):
         query = {"title": title}
@@ -184,6 +290,87 @@ class TestPosts:
         assert [one["id"] for one in data["results"]] == post_ids
         assert data["count"] == len(post_ids)
 
+    @pytest.fixture()
+    def searchable_post_list(self, db):
+        post1 = posts.factories.PostFactory(title="Potato salad", content="Boil potatoes and onions")
+        post2 = posts.factories.PostFactory(title="Onion soup", content="Fry onions, then add potato")
+        post3 = posts.factories.PostFactory(title="Tomato soup", content="Only tomatoes")
+        return [post1, post2, post3]
+
+    @pytest.mark.parametrize(
+        "search,indexes",
+        (
+            ("potato", [0, 1]),
+            ("onion", [1, 0]),
+            ("potato soup", [1]),
+            ("carrot", []),
+        ),
+    )
+    def test_post_list_search(self, search, indexes, api_client, searchable_post_list):
+        resp = api_client.get(POST_LIST_URL, data={"search": search})
+        assert resp.status_code == 200
+
+        data = resp.json()
+        post_ids = [searchable_post_list[i].id for i in indexes]
+        assert [one["id"] for one in data["results"]] == post_ids
+        assert all(one["search_headline"] is None for one in data["results"])
+
+    def test_post_list_search_order_by(self, api_client, searchable_post_list):
+        resp = api_client.get(POST_LIST_URL, data={"search": "soup", "order_by": "title"})
+        assert resp.status_code == 200
+
+        data = resp.json()
+        post_ids = [searchable_post_list[i].id for i in (1, 2)]
+        assert [one["id"] for one in data["results"]] == post_ids
+
+    def test_post_list_search_headline(self, api_client, searchable_post_list):
+        resp = api_client.get(POST_LIST_URL, data={"search": "tomatoes", "search_headline": True})
+        assert resp.status_code == 200
+
+        data = resp.json()
+        assert [one["id"] for one in data["results"]] == [searchable_post_list[2].id]
+        assert "<b>" in data["results"][0]["search_headline"]
+
+    def test_post_list_search_headline_escaped(self, api_client, db):
+        content = "<script>alert(1)</script> " + "word " * 100 + "Tomato & <i>TOMATO</i> " + "word " * 100
+        posts.factories.PostFactory(title="Soup", content=content)
+
+        resp = api_client.get(POST_LIST_URL, data={"search": "tomato", "search_headline": True})
+        assert resp.status_code == 200
+
+        headline = resp.json()["results"][0]["search_headline"]
+        assert "<script>" not in headline and "<i>" not in headline
+        assert "&lt;i&gt;" in headline
+        assert "<b>Tomato</b>" in headline
+        # Only a fragment around the match is returned
+        assert len(headline) < len(content)
+
+    @pytest.mark.skipif(connection.vendor != "postgresql", reason="Search vector trigger requires PostgreSQL")
+    def test_post_search_vector_trigger(self, searchable_post_list):
+        post = searchable_post_list[0]
+        assert posts.models.Post.objects.filter(id=post.id, search_vector__isnull=False).exists()
+
+        post.title = "Tomato"
+        post.save()
+        assert posts.models.Post.objects.filter(id=post.id, search_vector="tomato").exists()
+
+    @pytest.mark.parametrize(
+        "query,index_name",
+        (
+            ({"user_id": 0}, "post_user_created_at_id_idx"),
+            ({"created_at__gte": "2020-01-01T00:00:00Z"}, "post_created_at_id_idx"),
+        ),
+    )
+    def test_post_list_filter_uses_index(self, query, index_name, prefer_index_scan, post_list):
+        query = {key: post_list[value].user_id if key == "user_id" else value for key, value in query.items()}
+        queryset = posts.models.Post.objects.order_by("-created_at")
+        queryset = posts.filters.PostFilterSet(query, queryset=queryset).qs
+        assert index_name in queryset.explain()
+
+    def test_post_title_search_uses_index(self, no_seqscan, post_list):
+        queryset = posts.models.Post.objects.filter(title__icontains="post")
+        assert "post_title_trgm_idx" in queryset.explain()
+
     def test_post_create(self, db, api_client):
         tag = posts.factories.TagFactory()
         user = users.factories.UserFactory()
@@ -216,6 +403,42 @@ class TestPosts:
         assert resp.status_code == 400
         assert not posts.models.Post.objects.exists()
 
+    @pytest.mark.parametrize(
+        "tag_ids,invalid_ids",
+        (
+            ([1, 10, 11], [10, 11]),
+            (["a"], "str"),
+            ([1.0], "float"),
+            ([True], "bool"),
+            ([1, "1.5"], "str"),
+        ),
+    )
+    def test_post_create_invalid_tag_ids(self, tag_ids, invalid_ids, db, api_client):
+        posts.factories.TagFactory(id=1)
+        api_client.force_authenticate(users.factories.UserFactory())
+        payload = {"title": "Test post", "content": "abcd", "tag_ids": tag_ids}
+
+        resp = api_client.post(POST_CREATE_URL, data=payload)
+        assert resp.status_code == 400
+
+        error = resp.json()["tag_ids"]
+        assert len(error) == 1
+
+        # Missing ids or type of the invalid item
+        assert str(invalid_ids) in error[0]
+
+    def test_post_create_tag_ids_single_query(self, db, api_client):
+        tags = posts.factories.TagFactory.create_batch(5)
+        api_client.force_authenticate(users.factories.UserFactory())
+        payload = {"title": "Test post", "content": "abcd", "tag_ids": [one.id for one in tags]}
+
+        with CaptureQueriesContext(connection) as context:
+            resp = api_client.post(POST_CREATE_URL, data=payload)
+
+        assert resp.status_code == 201
+        tag_lookups = [one for one in context.captured_queries if 'WHERE "posts_tag"."id" IN' in one["sql"]]
+        assert len(tag_lookups) == 1
+
     def test_post_detail(self, api_client, post_list, tag_list):
         post = post_list[0]
         resp = api_client.get(POST_DETAIL_URL(post.id))
@@ -224,6 +447,72 @@ class TestPosts:
         assert data["id"] == post.id
         assert list(map(lambda t: t["id"], data["tags"])) == list(map(lambda t: t.id, post.tags.all()))
 
+    def test_post_detail_not_modified(self, api_client, post_list, django_assert_num_queries):
+        post = post_list[0]
+        resp = api_client.get(POST_DETAIL_URL(post.id))
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+
+        with django_assert_num_queries(1):
+            resp = api_client.get(POST_DETAIL_URL(post.id), HTTP_IF_NONE_MATCH=etag)
+
+        assert resp.status_code == 304
+        assert resp.headers["ETag"] == etag
+
+        # Likes don't change updated_at, so modification date isn't a valid validator
+        assert "Last-Modified" not in resp.headers
+
+        feedback.factories.PostLikeFactory(post=post)
+        resp = api_client.get(POST_DETAIL_URL(post.id), HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+
+    @pytest.mark.parametrize("is_authorized", (True, False))
+    def test_post_list_not_modified(self, is_authorized, api_client, post_list, django_capture_on_commit_callbacks):
+        if is_authorized:
+            api_client.force_authenticate(post_list[0].user)
+
+        resp = api_client.get(POST_LIST_URL, data={"order_by": "title"})
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+        # Deletions and counter changes don't move max updated_at, so lists have ETag only
+        assert "Last-Modified" not in resp.headers
+
+        resp = api_client.get(POST_LIST_URL, data={"order_by": "title"}, HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 304
+
+        resp = api_client.get(POST_LIST_URL, data={"order_by": "-title"}, HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200
+
+        with django_capture_on_commit_callbacks(execute=True):
+            post_list[-1].delete()
+
+        resp = api_client.get(POST_LIST_URL, data={"order_by": "title"}, HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200
+
+    def test_post_list_not_modified_counters(self, api_client, post_list, django_assert_num_queries):
+        query = {"cursor": "", "order_by": "title"}
+        api_client.force_authenticate(post_list[0].user)
+        feedback.factories.PostLikeFactory(post=post_list[1])
+        resp = api_client.get(POST_LIST_URL, data=query)
+        etag = resp.headers["ETag"]
+
+        # Page and is_liked queries only, ETag is computed from the page without aggregates over all posts
+        with django_assert_num_queries(2):
+            resp = api_client.get(POST_LIST_URL, data=query, HTTP_IF_NONE_MATCH=etag)
+
+        assert resp.status_code == 304
+
+        # Sums of counters don't change, but the page does
+        feedback.factories.PostLikeFactory(post=post_list[0])
+        feedback.models.PostLike.objects.filter(post=post_list[1]).delete()
+        posts.models.Post.objects.filter(id=post_list[0].id).update(likes_count=1)
+        posts.models.Post.objects.filter(id=post_list[1].id).update(likes_count=0)
+
+        resp = api_client.get(POST_LIST_URL, data=query, HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+
     @pytest.mark.parametrize(
         "field,value",
         (
@@ -242,6 +531,50 @@ class TestPosts:
         post.refresh_from_db()
         assert getattr(post, field) == value
 
+    def test_post_update_content_short(self, api_client, post_list):
+        post = post_list[0]
+        api_client.force_authenticate(post.user)
+        content = "word " * 100
+
+        resp = api_client.patch(POST_UPDATE_URL(post.id), data={"content": content})
+        assert resp.status_code == 200
+
+        post.refresh_from_db()
+        assert post.content_short == posts.models.make_content_short(content)
+
+        resp = api_client.get(POST_LIST_URL)
+        assert resp.json()["results"][0]["content_short"] == post.content_short
+
+    @pytest.mark.parametrize(
+        "content,max_length,expected",
+        (
+            ("short text", 20, "short text"),
+            ("cut at word boundary", 15, "cut at word"),
+            ("cut before space here", 15, "cut before"),
+            ("complete words end", 14, "complete words"),
+            ("a verylongwordwithoutspaces", 10, "a verylong"),
+        ),
+    )
+    def test_make_content_short(self, content, max_length, expected):
+        assert posts.models.make_content_short(content, max_length) == expected
+
+    def test_backfill_content_short(self, post_list):
+        posts.models.Post.objects.filter(id__in=[one.id for one in post_list[:3]]).update(content_short="")
+        posts.models.Post.objects.filter(id=post_list[3].id).update(content_short="stale")
+
+        call_command("backfill_content_short", batch_size=1)
+
+        for post in post_list[:3]:
+            post.refresh_from_db()
+            assert post.content_short == posts.models.make_content_short(post.content)
+
+        post_list[3].refresh_from_db()
+        assert post_list[3].content_short == "stale"
+
+        call_command("backfill_content_short", batch_size=2, all=True)
+        post_list[3].refresh_from_db()
+        assert post_list[3].content_short == posts.models.make_content_short(post_list[3].content)
+
     @pytest.mark.parametrize(
         "indexes",
         (
@@ -266,6 +599,19 @@ class TestPosts:
         post.refresh_from_db()
         assert list(post.tags.values_list("id", flat=True)) == tag_ids
 
+    def test_post_update_tag_ids_keeps_unchanged(self, api_client, tag_list, post_list):
+        post = post_list[1]
+        through_model = posts.models.Post.tags.through
+        kept = through_model.objects.get(post=post, tag=tag_list[1])
+
+        api_client.force_authenticate(post.user)
+        resp = api_client.patch(POST_UPDATE_URL(post.id), data={"tag_ids": [tag_list[1].id, tag_list[2].id]})
+        assert resp.status_code == 200
+
+        rows = through_model.objects.filter(post=post)
+        assert {one.tag_id for one in rows} == {tag_list[1].id, tag_list[2].id}
+        assert kept.id in {one.id for one in rows}
+
     def test_post_delete(self, api_client, post_list):
         post = post_list[0]
         api_client.force_authenticate(post.user)
@@ -276,6 +622,170 @@ class TestPosts:
         assert not posts.models.Post.objects.filter(id=post.id).exists()
 
 
+class TestPostListCache:
+    @pytest.fixture()
+    def post(self, db):
+        return posts.factories.PostFactory()
+
+    def test_post_list_cached(self, api_client, post, django_assert_num_queries):
+        resp = api_client.get(POST_LIST_URL, data={"order_by": "title", "page": 1})
+        assert resp.status_code == 200
+
+        with django_assert_num_queries(0):
+            cached_resp = api_client.get(POST_LIST_URL, data={"order_by": "title"})
+
+        assert cached_resp.status_code == 200
+        assert cached_resp.json() == resp.json()
+
+    def test_post_list_not_cached_for_authorized(self, api_client, post):
+        api_client.force_authenticate(post.user)
+        api_client.get(POST_LIST_URL)
+        posts.models.Post.objects.update(title="Changed")
+
+        resp = api_client.get(POST_LIST_URL)
+        assert resp.json()["results"][0]["title"] == "Changed"
+
+    @pytest.mark.parametrize(
+        "change",
+        (
+            lambda post: posts.factories.PostFactory(),
+            lambda post: post.delete(),
+            lambda post: post.tags.add(posts.factories.TagFactory()),
+            lambda post: feedback.factories.PostLikeFactory(post=post),
+            lambda post: feedback.factories.CommentFactory(post=post),
+            lambda post: setattr(post.user, "username", "changed") or post.user.save(),
+        ),
+    )
+    def test_post_list_cache_invalidated(self, change, api_client, post, django_capture_on_commit_callbacks):
+        resp = api_client.get(POST_LIST_URL)
+        assert resp.status_code == 200
+
+        with django_capture_on_commit_callbacks(execute=True):
+            change(post)
+
+        api_client.get(POST_LIST_URL)
+        # Page of the previous generation is found as stale one, but nobody else renders the page, so it's rendered
+        stats = post_list_cache.get_stats()
+        assert (stats["hits"], stats["misses"] + stats["stale"]) == (0, 2)
+
+    def test_post_list_cache_kept_on_other_user_changes(self, api_client, post, django_capture_on_commit_callbacks):
+        api_client.get(POST_LIST_URL)
+        user = users.models.User.objects.get(id=post.user_id)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            user.email = "changed@email.com"
+            user.save()
+
+        api_client.get(POST_LIST_URL)
+        assert post_list_cache.get_stats()["misses"] == 1
+
+    def test_post_list_cache_stats(self, api_client, post):
+        api_client.get(POST_LIST_URL)
+        api_client.get(POST_LIST_URL)
+
+        user = users.factories.UserFactory(is_staff=True)
+        api_client.force_authenticate(user)
+        resp = api_client.get(POST_CACHE_STATS_URL)
+        assert resp.status_code == 200
+
+        data = resp.json()
+        assert (data["hits"], data["local_hits"], data["misses"], data["hit_rate"]) == (1, 1, 1, 0.5)
+
+    def test_post_list_cache_stats_not_admin(self, api_client, post):
+        api_client.force_authenticate(post.user)
+        resp = api_client.get(POST_CACHE_STATS_URL)
+        assert resp.status_code == 403
+
+
+class TestTieredCache:
+    @pytest.fixture()
+    def tiered_cache(self):
+        return TieredCache("test")
+
+    def test_get_or_set(self, tiered_cache):
+        compute = Mock(return_value={"a": 1})
+
+        assert tiered_cache.get_or_set("key", compute, timeout=60) == {"a": 1}
+        assert tiered_cache.get_or_set("key", compute, timeout=60) == {"a": 1}
+        local_cache.clear()
+        assert tiered_cache.get_or_set("key", compute, timeout=60) == {"a": 1}
+
+        assert compute.call_count == 1
+        stats = tiered_cache.get_stats()
+        assert (stats["hits"], stats["local_hits"], stats["misses"]) == (2, 1, 1)
+
+    def test_none_not_cached(self, tiered_cache):
+        compute = Mock(return_value=None)
+        tiered_cache.get_or_set("key", compute, timeout=60)
+        tiered_cache.get_or_set("key", compute, timeout=60)
+        assert compute.call_count == 2
+
+    def test_bump_version(self, tiered_cache):
+        tiered_cache.get_or_set("key", lambda: 1, timeout=60)
+        tiered_cache.bump_version()
+
+        assert tiered_cache.get_version() == 2
+        assert tiered_cache.get_or_set("key", lambda: 2, timeout=60) == 2
+
+    def test_version_of_other_process(self, tiered_cache):
+        tiered_cache.get_or_set("key", lambda: 1, timeout=60)
+        get_shared_cache().incr(tiered_cache.version_key)
+
+        # Local copy of the version is used until it expires
+        assert tiered_cache.get_or_set("key", lambda: 2, timeout=60) == 1
+        local_cache.clear()
+        assert tiered_cache.get_or_set("key", lambda: 2, timeout=60) == 2
+
+    def test_stale_while_revalidate(self, tiered_cache):
+        tiered_cache.get_or_set("key", lambda: 1, timeout=1, stale_timeout=60)
+        full_key = tiered_cache.make_key("key")
+
+        with patch("core.cache.time.time", return_value=time.time() + 10):
+            # Other process holds the lock, so the stale value is served
+            get_shared_cache().add(f"{full_key}:lock", "other")
+            assert tiered_cache.get_or_set("key", lambda: 2, timeout=1, stale_timeout=60) == 1
+
+            get_shared_cache().delete(f"{full_key}:lock")
+            assert tiered_cache.get_or_set("key", lambda: 2, timeout=1, stale_timeout=60) == 2
+
+        assert tiered_cache.get_stats()["stale"] == 2
+
+    @pytest.mark.parametrize("stale_timeout,expected", ((60, 1), (0, 2)))
+    def test_stale_after_bump(self, stale_timeout, expected, tiered_cache):
+        tiered_cache.get_or_set("key", lambda: 1, timeout=60, stale_timeout=stale_timeout)
+        tiered_cache.bump_version()
+
+        # Other process renders the value of the new version, value of the previous one is served meanwhile
+        lock_key = f"{tiered_cache.make_key('key')}:lock"
+        get_shared_cache().add(lock_key, "other")
+        threading.Timer(0.2, lambda: get_shared_cache().delete(lock_key)).start()
+        assert tiered_cache.get_or_set("key", lambda: 2, timeout=60, stale_timeout=stale_timeout) == expected
+
+    def test_wait_released_without_value(self, tiered_cache, settings):
+        settings.TIERED_CACHE = {**settings.TIERED_CACHE, "WAIT_TIMEOUT": 10}
+        lock_key = f"{tiered_cache.make_key('key')}:lock"
+        get_shared_cache().add(lock_key, "other")
+        # Lock holder got nothing to cache, e.g. error response
+        threading.Timer(0.2, lambda: get_shared_cache().delete(lock_key)).start()
+
+        started_at = time.monotonic()
+        assert tiered_cache.get_or_set("key", lambda: "mine", timeout=60) == "mine"
+        assert time.monotonic() - started_at < 5
+
+    def test_coalesced(self, tiered_cache):
+        compute = Mock(side_effect=lambda: time.sleep(0.2) or "value")
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(tiered_cache.get_or_set("key", compute, timeout=60)))
+            for _ in range(4)
+        ]
+        [one.start() for one in threads]
+        [one.join() for one in threads]
+
+        assert results == ["value"] * 4
+        assert compute.call_count == 1
+
+
 class TestTags:
     @pytest.fixture()
     def tag_list(self, db):
@@ -316,6 +826,29 @@ class TestTags:
         tag_ids = [tag_list[one].id for one in indexes]
         assert [one["id"] for one in data["results"]] == tag_ids
 
+    @pytest.mark.parametrize(
+        "name,indexes",
+        (
+            ("dog", [2]),
+            ("bat", [0]),
+            ("test", []),
+        ),
+    )
+    def test_tags_list_filter_fuzzy_name(self, name, indexes, api_client, tag_list):
+        resp = api_client.get(TAG_LIST_URL, data={"fuzzy_name": name})
+        assert resp.status_code == 200
+
+        data = resp.json()
+        tag_ids = [tag_list[one].id for one in indexes]
+        assert [one["id"] for one in data["results"]] == tag_ids
+
+    def test_tags_name_search_uses_index(self, no_seqscan, tag_list):
+        queryset = posts.models.Tag.objects.filter(name__icontains="bat")
+        assert "tag_name_trgm_idx" in queryset.explain()
+
+        queryset = posts.filters.TagFilterSet({"fuzzy_name": "bat"}, queryset=posts.models.Tag.objects.all()).qs
+        assert "tag_name_trgm_idx" in queryset.explain()
+
     def test_create_tag(self, api_client, db):
         user = users.factories.UserFactory()
         api_client.force_authenticate(user)
@@ -336,3 +869,49 @@ class TestTags:
         resp = api_client.post(TAG_CREATE_URL, data=body)
         assert resp.status_code == 400
         assert posts.models.Tag.objects.filter(name=tag_list[0].name).count() == 1
+
+    def test_tags_with_posts_count(self, tag_list):
+        post_list = posts.factories.PostFactory.create_batch(3, tags=[tag_list[0]])
+        post_list[0].tags.add(tag_list[1])
+
+        queryset = posts.models.Tag.objects.with_posts_count().order_by("name")
+        assert [one.posts_count for one in queryset] == [3, 1, 0]
+
+
+class TestAdmin:
+    @pytest.fixture()
+    def post(self, db):
+        return posts.factories.PostFactory(tags=[posts.factories.TagFactory()])
+
+    @pytest.mark.parametrize(
+        "model_name",
+        (
+            "posts/post",
+            "posts/tag",
+            "feedback/comment",
+            "feedback/postlike",
+            "feedback/commentlike",
+            "emails/unsentemail",
+        ),
+    )
+    def test_changelist(self, model_name, admin_client, post):
+        feedback.factories.CommentLikeFactory(comment=feedback.factories.CommentFactory(post=post))
+        feedback.factories.PostLikeFactory(post=post)
+
+        resp = admin_client.get(f"/admin/{model_name}/")
+        assert resp.status_code == 200
+
+    @pytest.mark.parametrize(
+        "estimate,expected",
+        (
+            (None, 2),
+            (10, 2),
+            (50_000, 50_000),
+        ),
+    )
+    def test_estimated_count_paginator(self, estimate, expected, db):
+        posts.factories.PostFactory.create_batch(2)
+        paginator = EstimatedCountPaginator(posts.models.Post.objects.order_by("id"), per_page=10)
+
+        with patch.object(EstimatedCountPaginator, "get_estimated_count", return_value=estimate):
+            assert paginator.count == expected
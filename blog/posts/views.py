@@ -1,23 +1,38 @@
+from django.db import models
 from drf_spectacular.utils import extend_schema, extend_schema_view
-from rest_framework import mixins, permissions, viewsets
+from rest_framework import decorators, mixins, permissions, viewsets
+from rest_framework.response import Response
 
+import feedback.deletion
 import posts.filters
 import posts.models
 import posts.permissions
 import posts.serializers
+from core.pagination import KeysetPagination
 from core.serializers import EmptySerializer
-from core.viewsets import ActionViewSet
+from core.viewsets import ActionViewSet, ConditionalListMixin, ConditionalRetrieveMixin
+from feedback.buffer import like_buffer
+from posts.cache import post_list_cache
 
 
 @extend_schema_view(
     retrieve=extend_schema(description=("Get detailed post info")),
     partial_update=extend_schema(description=("Update post\n\n" "Only authorized owner has permission to update post")),
-    list=extend_schema(description=("List and / or filter posts")),
+    list=extend_schema(
+        description=("List and / or filter posts\n\n" "Responses for anonymous users are cached until any post changes")
+    ),
     create=extend_schema(description=("Create new post\n\n" "Current authorized user becomes owner of the post")),
-    destroy=extend_schema(description=("Delete post\n\n" "Only authorized owner has permission to delete post")),
+    destroy=extend_schema(
+        description=(
+            "Delete post\n\n"
+            "- Only authorized owner has permission to delete post\n\n"
+            "- Post disappears at once, its comments and likes are removed in background"
+        )
+    ),
+    cache_stats=extend_schema(description=("Post list cache hit / miss stats\n\n" "Only admin users have access")),
 )
-class PostViewSet(ActionViewSet, viewsets.ModelViewSet):
-    queryset = posts.models.Post.objects.with_likes_count().select_related("user")
+class PostViewSet(ConditionalListMixin, ConditionalRetrieveMixin, ActionViewSet, viewsets.ModelViewSet):
+    queryset = posts.models.Post.objects.select_related("user")
 
     action_serializers = {
         "retrieve": posts.serializers.PostDetailSerializer,
@@ -25,19 +40,74 @@ class PostViewSet(ActionViewSet, viewsets.ModelViewSet):
         "list": posts.serializers.PostListSerializer,
         "create": posts.serializers.PostCreateSerializer,
         "destroy": EmptySerializer,
+        "cache_stats": posts.serializers.PostListCacheStatsSerializer,
     }
     action_permissions = {
+        "cache_stats": [permissions.IsAdminUser],
         "partial_update": [permissions.IsAuthenticated, posts.permissions.IsMyPost],
         "create": [permissions.IsAuthenticated],
         "destroy": [permissions.IsAuthenticated, posts.permissions.IsMyPost],
     }
     action_querysets = {
-        "list": queryset.with_content_short().defer("content").order_by("-created_at"),
+        "list": queryset.defer("content").order_by("-created_at"),
         "destroy": posts.models.Post.objects.all(),
     }
 
     http_method_names = ["get", "post", "patch", "delete"]
     filterset_class = posts.filters.PostFilterSet
+    pagination_class = KeysetPagination
+
+    etag_aggregates = {
+        "updated_at": models.Max("updated_at"),
+        "user_updated_at": models.Max("user__updated_at"),
+        "likes_count": models.Sum("likes_count"),
+        "comments_count": models.Sum("comments_count"),
+        "count": models.Count("id"),
+    }
+
+    def get_etag_values(self):
+        values = super().get_etag_values()
+
+        if values["count"]:
+            # Buffered like of the user isn't flushed yet, but is shown by is_liked
+            pending = like_buffer.get_pending("post", self.request.user.id)
+            values["pending_is_liked"] = pending.get(int(self.kwargs["pk"]))
+
+        return values
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated or not post_list_cache.is_enabled:
+            return super().list(request, *args, **kwargs)
+
+        responses = []
+
+        def render():
+            response = super(PostViewSet, self).list(request, *args, **kwargs)
+            responses.append(response)
+
+            if response.status_code != 200:
+                return None
+
+            headers = {name: response.headers[name] for name in ("ETag", "Last-Modified") if name in response.headers}
+            return response.data, headers
+
+        cached = post_list_cache.get_or_set(request, render)
+
+        if responses:
+            return responses[0]
+
+        data, headers = cached
+        not_modified_response = self.get_not_modified_response(request, headers)
+        return not_modified_response if not_modified_response is not None else Response(data, headers=headers)
+
+    def perform_destroy(self, instance):
+        # Post is hidden at once, comments and likes are removed by purge_deleted command
+        feedback.deletion.mark_posts_deleted(posts.models.Post.objects.filter(id=instance.id))
+
+    @decorators.action(detail=False, methods=["get"])
+    def cache_stats(self, request, *args, **kwargs):
+        serializer = self.get_serializer(post_list_cache.get_stats())
+        return Response(serializer.data)
 
 
 @extend_schema_view(
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework_simplejwt",
     "rest_framework_simplejwt.token_blacklist",
@@ -118,6 +119,28 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Default hashers, with PBKDF2 computed in a process pool if PASSWORD_HASHING is enabled
+PASSWORD_HASHERS = [
+    "users.hashers.PooledPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# Password hashing off request threads, see users.hashers.PasswordHashingPool
+PASSWORD_HASHING = {
+    "ENABLED": env.bool("PASSWORD_HASHING_POOL_ENABLED", False),
+    # Worker processes per server process, that many hashes run at once
+    "WORKERS": env.int("PASSWORD_HASHING_WORKERS", 2),
+    # Max number of hashes waiting for a free worker, the rest get 503 response right away
+    "MAX_QUEUE": env.int("PASSWORD_HASHING_MAX_QUEUE", 16),
+    # Seconds to wait for a free worker before 503 response
+    "QUEUE_TIMEOUT": env.float("PASSWORD_HASHING_QUEUE_TIMEOUT", 5),
+    # Waits longer than that many seconds are logged
+    "SLOW_QUEUE_TIME": env.float("PASSWORD_HASHING_SLOW_QUEUE_TIME", 0.5),
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
 
@@ -145,7 +168,10 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 10,
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
-    "DEFAULT_AUTHENTICATION_CLASSES": ["rest_framework_simplejwt.authentication.JWTAuthentication"],
+    "DEFAULT_AUTHENTICATION_CLASSES": ["users.authentication.ClaimsJWTAuthentication"],
+    # Reverse proxies in front of the app, client IP address is taken from X-Forwarded-For only if they are set,
+    # otherwise it's REMOTE_ADDR, so clients can't choose their throttling bucket
+    "NUM_PROXIES": env.int("NUM_PROXIES", 0),
 }
 
 AUTH_USER_MODEL = "users.User"
@@ -155,6 +181,28 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(minutes=env.int("REFRESH_TOKEN_LIFETIME", 60 * 24 * 7)),
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
+    # Adds username / is_staff claims, see users.authentication.ClaimsJWTAuthentication
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.LoginSerializer",
+    # Checks blacklist through users.blacklist.BlacklistFilter
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.RefreshSerializer",
+}
+
+# In-process filter of blacklisted refresh tokens, see users.blacklist.BlacklistFilter
+TOKEN_BLACKLIST_FILTER = {
+    "ENABLED": env.bool("TOKEN_BLACKLIST_FILTER_ENABLED", True),
+    # Seconds between syncs, token blacklisted by another process may be accepted for that long
+    "SYNC_INTERVAL": env.float("TOKEN_BLACKLIST_FILTER_SYNC_INTERVAL", 1),
+    # Initial number of tokens, filter is rebuilt with larger capacity once it's exceeded
+    "CAPACITY": env.int("TOKEN_BLACKLIST_FILTER_CAPACITY", 100000),
+    "ERROR_RATE": env.float("TOKEN_BLACKLIST_FILTER_ERROR_RATE", 0.001),
+}
+
+# Recent user changes checked by users.authentication.ClaimsJWTAuthentication instead of loading user per request
+AUTH_USER_CACHE = {
+    # Max number of users kept in process memory
+    "MAX_SIZE": env.int("AUTH_USER_CACHE_MAX_SIZE", 10000),
+    # Seconds before change made by another process is seen
+    "TTL": env.int("AUTH_USER_CACHE_TTL", 30),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -200,6 +248,85 @@ EMAIL_HOST_PASSWORD = None
 DEFAULT_FROM_EMAIL = None
 EMAIL_PORT = None
 
+# Failover between active email credentials, see emails.balancer.CredentialsBalancer
+EMAIL_CREDENTIALS_HEALTH = {
+    # Credentials are skipped after that many consecutive failures
+    "FAILURE_THRESHOLD": env.int("EMAIL_CREDENTIALS_FAILURE_THRESHOLD", 3),
+    # Seconds before unhealthy credentials are tried again
+    "COOL_DOWN": env.int("EMAIL_CREDENTIALS_COOL_DOWN", 60 * 5),
+}
+
+# Outbox of emails sent via emails.backends.MultiCredentialEmailBackend, see emails.outbox.EmailOutbox
+EMAIL_OUTBOX = {
+    # If enabled, emails are saved to the database and sent by send_outbox_emails command instead of request thread,
+    # so the command should run as a separate worker
+    "ENABLED": env.bool("EMAIL_OUTBOX_ENABLED", False),
+    # Email is archived as emails.models.UnsentEmail after that many failed attempts
+    "MAX_ATTEMPTS": env.int("EMAIL_OUTBOX_MAX_ATTEMPTS", 5),
+    # Seconds before the first retry, doubled after each failed attempt
+    "RETRY_DELAY": env.int("EMAIL_OUTBOX_RETRY_DELAY", 60),
+    # Seconds before email claimed by a crashed worker becomes available to others again
+    "LEASE_TIMEOUT": env.int("EMAIL_OUTBOX_LEASE_TIMEOUT", 60 * 10),
+}
+
 DJANGO_REST_PASSWORDRESET_NO_INFORMATION_LEAKAGE = True
 # Time in hours about how long the password reset token is active
 DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME = env.int("PASSWORD_RESET_TOKEN_LIFETIME", 1)
+
+# Shared cache, e.g. redis://host:6379/0, per process memory is used by default
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+
+# In-process tier in front of the shared cache, see core.cache.TieredCache
+TIERED_CACHE = {
+    # Alias of the shared tier in CACHES
+    "SHARED_CACHE": "default",
+    # Max number of values kept in process memory
+    "LOCAL_MAX_SIZE": env.int("TIERED_CACHE_LOCAL_MAX_SIZE", 10000),
+    # Seconds before changes made by other processes are seen, 0 disables the in-process tier
+    "LOCAL_TIMEOUT": env.float("TIERED_CACHE_LOCAL_TIMEOUT", 2),
+    # Seconds one process may take to compute a value before others compute it as well
+    "LOCK_TIMEOUT": env.int("TIERED_CACHE_LOCK_TIMEOUT", 10),
+    # Seconds others wait for the value computed by that process
+    "WAIT_TIMEOUT": env.float("TIERED_CACHE_WAIT_TIMEOUT", 3),
+    # Seconds between writes of hit / miss counters to the shared cache
+    "STATS_INTERVAL": env.float("TIERED_CACHE_STATS_INTERVAL", 10),
+}
+
+# Cache of anonymous post list responses, see posts.cache.PostListCache
+POST_LIST_CACHE = {
+    "ENABLED": env.bool("POST_LIST_CACHE_ENABLED", True),
+    # Timeouts in seconds, cache also gets invalidated on any post / tag / like / comment change
+    "TIMEOUT": env.int("POST_LIST_CACHE_TIMEOUT", 60 * 5),
+    "SEARCH_TIMEOUT": env.int("POST_LIST_CACHE_SEARCH_TIMEOUT", 30),
+    # Seconds expired page is served while one worker renders it again, page of the previous generation is served
+    # the same way after a change
+    "STALE_TIMEOUT": env.int("POST_LIST_CACHE_STALE_TIMEOUT", 30),
+}
+
+# Token bucket rate limits of auth and write views, see core.throttling.TokenBucketThrottle
+THROTTLING = {
+    "ENABLED": env.bool("THROTTLING_ENABLED", True),
+    # Buckets are kept in process memory, core.throttling.CacheBucketStore shares them between processes via cache
+    "STORE": env.str("THROTTLING_STORE", "core.throttling.LocalBucketStore"),
+    # View throttle_scope -> rate per user or IP address, scopes missing here aren't limited
+    "RATES": {
+        "login": env.str("THROTTLING_LOGIN_RATE", "10/min"),
+        # Per submitted username, limits password guessing of one account from many addresses
+        "login_username": env.str("THROTTLING_LOGIN_USERNAME_RATE", "20/hour"),
+        "register": env.str("THROTTLING_REGISTER_RATE", "10/hour"),
+        "reset_password": env.str("THROTTLING_RESET_PASSWORD_RATE", "5/hour"),
+        "comment": env.str("THROTTLING_COMMENT_RATE", "30/min"),
+        "like": env.str("THROTTLING_LIKE_RATE", "60/min"),
+    },
+}
+
+# Write-behind buffer of like toggles, see feedback.buffer.LikeBuffer
+LIKE_BUFFER = {
+    "ENABLED": env.bool("LIKE_BUFFER_ENABLED", False),
+    # Pending likes are kept in process memory, each worker process flushes its own buffer
+    "STORE": "feedback.buffer.LocalLikeBufferStore",
+    # Seconds between flushes by background thread, 0 disables the thread
+    "FLUSH_INTERVAL": env.float("LIKE_BUFFER_FLUSH_INTERVAL", 5),
+}
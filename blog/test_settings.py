@@ -1,3 +1,5 @@
+import tempfile
+
 from settings import *
 
 # noinspection PyUnresolvedReferences
@@ -8,6 +10,17 @@ DATABASES = {
     }
 }
 
+# Stand-in for shared cache, values are pickled and stored outside of the process as with Redis.
+# Each pytest-xdist worker gets its own directory, as tests clear the cache
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(
+            tempfile.gettempdir(), f"blog-test-cache-{os.environ.get('PYTEST_XDIST_WORKER', 'main')}"
+        ),
+    }
+}
+
 REST_FRAMEWORK = {
     **REST_FRAMEWORK,
     "TEST_REQUEST_DEFAULT_FORMAT": "json",
@@ -1,11 +1,13 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DefaultUserAdmin
 
+import feedback.deletion
 import users.models
+from core.admin import SoftDeleteAdminMixin
 
 
 @admin.register(users.models.User)
-class UserAdmin(DefaultUserAdmin):
+class UserAdmin(SoftDeleteAdminMixin, DefaultUserAdmin):
     fieldsets = (
         (None, {"fields": ("username", "email", "password")}),
         ("Misc", {"fields": ("created_at", "id")}),
@@ -28,3 +30,4 @@ class UserAdmin(DefaultUserAdmin):
     list_filter = ("is_staff", "is_superuser", "groups")
     search_fields = ("username", "email")
     filter_horizontal = ("groups",)
+    mark_deleted = staticmethod(feedback.deletion.mark_users_deleted)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
+
+    def ready(self):
+        from users.signals import on_user_deleted, on_user_saved
+        from users.swagger import ClaimsJWTScheme, LoginSerializerExtension, RefreshSerializerExtension
@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+import users.models
+from users.blacklist import blacklist_filter
+
+
+class UserRefreshToken(RefreshToken):
+    """
+    Refresh token with user fields most views need, they are copied to access tokens as well
+
+    Blacklist is checked through in-process filter, see users.blacklist.BlacklistFilter
+    """
+
+    @classmethod
+    def for_user(cls, user: users.models.User) -> "UserRefreshToken":
+        token = super().for_user(user)
+        token["username"] = user.username
+        token["is_staff"] = user.is_staff
+        return token
+
+    def check_blacklist(self):
+        # Most tokens aren't blacklisted, so the query is skipped for the ones missing from the filter
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return result
+
+
+class UserStateCache:
+    """
+    Bounded in-process LRU cache of user changes made after tokens were issued, see AUTH_USER_CACHE setting
+
+    User signals publish changes to Django cache for refresh token lifetime, so every token issued before a change sees
+    it. Lookups (including misses) are kept in process for TTL seconds, so most requests don't reach even Django cache
+    """
+
+    namespace = "users:auth"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @property
+    def config(self) -> dict:
+        return settings.AUTH_USER_CACHE
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.namespace}:{user_id}"
+
+    def get(self, user_id: int) -> Optional[dict]:
+        """
+        :param user_id:
+        :return: current username / is_staff / is_deleted of the user if it was changed recently
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+
+        state = cache.get(self._key(user_id))
+        self._remember(user_id, state, now)
+        return state
+
+    def publish(self, states: dict[int, dict]):
+        cache.set_many(
+            {self._key(user_id): state for user_id, state in states.items()},
+            timeout=int(settings.SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"].total_seconds()),
+        )
+        now = time.monotonic()
+
+        for user_id, state in states.items():
+            self._remember(user_id, state, now)
+
+    def publish_user(self, user: users.models.User):
+        state = {"username": user.username, "is_staff": user.is_staff, "is_deleted": user.deleted_at is not None}
+        transaction.on_commit(lambda: self.publish({user.id: state}))
+
+    def publish_deleted(self, user_ids: Iterable[int]):
+        states = {user_id: {"is_deleted": True} for user_id in user_ids}
+        transaction.on_commit(lambda: self.publish(states))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, user_id: int, state: Optional[dict], now: float):
+        with self._lock:
+            self._entries[user_id] = (state, now + self.config["TTL"])
+            self._entries.move_to_end(user_id)
+
+            while len(self._entries) > self.config["MAX_SIZE"]:
+                self._entries.popitem(last=False)
+
+
+user_state_cache = UserStateCache()
+
+
+class ClaimsUser(TokenUser):
+    """
+    Authenticated user built from access token claims and recent changes, see ClaimsJWTAuthentication
+
+    Full users.User model is loaded only if instance attribute is accessed
+    """
+
+    def __init__(self, token, state: Optional[dict] = None):
+        super().__init__(token)
+        self.state = state or {}
+
+    @cached_property
+    def username(self) -> str:
+        # Tokens issued before claims were added have no username
+        return self.state.get("username") or self.token.get("username") or self.instance.username
+
+    @cached_property
+    def is_staff(self) -> bool:
+        return self.state.get("is_staff", self.token.get("is_staff", False))
+
+    @cached_property
+    def instance(self) -> users.models.User:
+        return users.models.User.objects.get(id=self.id)
+
+    @cached_property
+    def reference(self) -> users.models.User:
+        """
+        Unsaved user with claim fields only, enough to set foreign keys and render id / username without a query
+        """
+        return users.models.User(id=self.id, username=self.username, is_staff=self.is_staff)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication which doesn't load user from the database, see ClaimsUser
+
+    Cached user changes are only a fast path for access tokens, refresh loads the user, see users.serializers
+    """
+
+    def get_user(self, validated_token) -> ClaimsUser:
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        state = user_state_cache.get(user_id)
+
+        if state is not None and state["is_deleted"]:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        return ClaimsUser(validated_token, state)
@@ -0,0 +1,89 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from core.bloom import BloomFilter
+
+
+class BlacklistFilter:
+    """
+    In-process Bloom filter of blacklisted refresh token ids, see TOKEN_BLACKLIST_FILTER setting
+
+    Tokens missing from the filter aren't blacklisted, so their refresh skips the blacklist query. The filter gets rows
+    blacklisted since the previous sync at most every SYNC_INTERVAL seconds, so token blacklisted by another process
+    may be accepted for that long. Once over capacity, the filter is rebuilt, which also drops pruned tokens
+    """
+
+    # Rows are synced by blacklisted_at with overlap, since concurrent transactions may commit out of order
+    sync_overlap = timedelta(minutes=1)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._synced_at = None
+        self._checked_at = None
+
+    @property
+    def config(self) -> dict:
+        return settings.TOKEN_BLACKLIST_FILTER
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.config["ENABLED"]
+
+    def might_contain(self, jti: str) -> bool:
+        """
+        :param jti: token id
+        :return: False if token is surely not blacklisted
+        """
+        if not self.is_enabled:
+            return True
+
+        self.sync()
+
+        with self._lock:
+            return jti in self._filter
+
+    def add(self, jti: str):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+
+    def sync(self):
+        now = time.monotonic()
+
+        if self._checked_at is not None and now - self._checked_at < self.config["SYNC_INTERVAL"]:
+            return
+
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.config["SYNC_INTERVAL"]:
+                return
+
+            queryset = BlacklistedToken.objects.all()
+
+            if self._filter is None or self._filter.is_full():
+                capacity = max(self.config["CAPACITY"], queryset.count() * 2)
+                self._filter = BloomFilter(capacity, self.config["ERROR_RATE"])
+            else:
+                queryset = queryset.filter(blacklisted_at__gte=self._synced_at - self.sync_overlap)
+
+            synced_at = timezone.now()
+
+            for jti in queryset.values_list("token__jti", flat=True).iterator():
+                self._filter.add(jti)
+
+            self._synced_at = synced_at
+            self._checked_at = now
+
+    def clear(self):
+        with self._lock:
+            self._filter = None
+            self._synced_at = None
+            self._checked_at = None
+
+
+blacklist_filter = BlacklistFilter()
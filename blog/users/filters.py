@@ -1,12 +1,22 @@
+from django.db import models
 from django_filters import rest_framework as filters
 
 import users.models
+from core.search import fuzzy_search
 
 
 class UserFilterSet(filters.FilterSet):
     username = filters.CharFilter(lookup_expr="icontains", help_text="Case-insensitive search")
+    fuzzy_username = filters.CharFilter(
+        method="filter_fuzzy_username",
+        help_text="Typo-tolerant search. Unless `order_by` is specified, results are ordered by similarity",
+    )
     order_by = filters.OrderingFilter(fields=["username"])
 
     class Meta:
         model = users.models.User
         fields = []
+
+    def filter_fuzzy_username(self, queryset: models.QuerySet, name, value: str):
+        queryset = fuzzy_search(queryset, "username", value)
+        return queryset.order_by("-similarity", "username")
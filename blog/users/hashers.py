@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache
+from django.utils.encoding import force_bytes
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("Too many password checks at the moment, try again later")
+    default_code = "password_hashing_busy"
+
+    def __init__(self, wait: int):
+        super().__init__()
+        # Sent as Retry-After header by rest_framework exception handler
+        self.wait = wait
+
+
+class PasswordHashingPool:
+    """
+    Bounded process pool for password hash computations, see PASSWORD_HASHING setting
+
+    At most WORKERS hashes run at once per server process, up to MAX_QUEUE more wait for a free worker and the rest is
+    rejected right away, so a burst of logins can't take every request thread. Hashed / rejected counters and total
+    queue / hash times are kept in Django cache, so they are shared between processes
+    """
+
+    namespace = "users:hashing"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._slots = None
+        self._waiting = 0
+
+    @property
+    def config(self) -> dict:
+        return settings.PASSWORD_HASHING
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.config["ENABLED"]
+
+    def _key(self, name: str) -> str:
+        return f"{self.namespace}:{name}"
+
+    def pbkdf2(self, digest_name: str, password: bytes, salt: bytes, iterations: int) -> bytes:
+        if not self.is_enabled:
+            return hashlib.pbkdf2_hmac(digest_name, password, salt, iterations)
+
+        return self.run(hashlib.pbkdf2_hmac, digest_name, password, salt, iterations)
+
+    def run(self, func: Callable, *args):
+        """
+        Run function in the pool once there is a free worker
+        :param func: picklable function, it runs in a process without Django set up
+        :param args:
+        :return: function result
+        """
+        executor, slots = self._get_executor()
+        queued_at = time.monotonic()
+
+        if not slots.acquire(blocking=False):
+            self._wait(slots)
+
+        started_at = time.monotonic()
+
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            # Worker was killed, e.g. by OOM killer, the pool is started again by the next call
+            logger.exception("Password hashing pool is broken")
+            self._reset(executor)
+            return func(*args)
+        finally:
+            slots.release()
+            self._record(started_at - queued_at, time.monotonic() - started_at)
+
+    def get_stats(self) -> dict:
+        names = ["hashed", "rejected", "queue_ms", "hash_ms"]
+        values = cache.get_many([self._key(name) for name in names])
+        stats = {name: values.get(self._key(name), 0) for name in names}
+        hashed = stats.pop("hashed")
+        return {
+            "hashed": hashed,
+            "rejected": stats["rejected"],
+            "avg_queue_ms": stats["queue_ms"] / hashed if hashed else 0,
+            "avg_hash_ms": stats["hash_ms"] / hashed if hashed else 0,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor = self._executor
+            self._pid = None
+            self._executor = None
+            self._slots = None
+            self._waiting = 0
+
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _get_executor(self) -> tuple[ProcessPoolExecutor, threading.BoundedSemaphore]:
+        with self._lock:
+            # Pool of the parent is useless after fork, e.g. with gunicorn --preload
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                # Workers only run hashlib functions, so they are spawned without copying server process memory
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.config["WORKERS"], mp_context=multiprocessing.get_context("spawn")
+                )
+                self._slots = threading.BoundedSemaphore(self.config["WORKERS"])
+                self._waiting = 0
+
+            return self._executor, self._slots
+
+    def _wait(self, slots: threading.BoundedSemaphore):
+        with self._lock:
+            if self._waiting >= self.config["MAX_QUEUE"]:
+                self._reject()
+
+            self._waiting += 1
+
+        try:
+            acquired = slots.acquire(timeout=self.config["QUEUE_TIMEOUT"])
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        if not acquired:
+            self._reject()
+
+    def _reject(self):
+        self._incr("rejected")
+        raise PasswordHashingBusy(wait=max(int(self.config["QUEUE_TIMEOUT"]), 1))
+
+    def _reset(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+        executor.shutdown(wait=False)
+
+    def _record(self, queue_time: float, hash_time: float):
+        self._incr("hashed")
+        self._incr("queue_ms", int(queue_time * 1000))
+        self._incr("hash_ms", int(hash_time * 1000))
+
+        if queue_time >= self.config["SLOW_QUEUE_TIME"]:
+            logger.warning("Password hash waited %.3f seconds for a free worker", queue_time)
+
+    def _incr(self, name: str, delta: int = 1) -> Optional[int]:
+        if not delta:
+            return None
+
+        key = self._key(name)
+        cache.add(key, 0, timeout=None)
+
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, timeout=None)
+            return delta
+
+
+password_hashing_pool = PasswordHashingPool()
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Same hashes as the default PBKDF2 hasher, computed in users.hashers.PasswordHashingPool
+
+    Every password check goes through the hasher, including authenticate() for unknown users
+    """
+
+    def encode(self, password, salt, iterations=None):
+        self._check_encode_args(password, salt)
+        iterations = iterations or self.iterations
+        hash = password_hashing_pool.pbkdf2(self.digest().name, force_bytes(password), force_bytes(salt), iterations)
+        hash = base64.b64encode(hash).decode("ascii").strip()
+        return "%s$%d$%s$%s" % (self.algorithm, iterations, salt, hash)
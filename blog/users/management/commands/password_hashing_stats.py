@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from users.hashers import password_hashing_pool
+
+
+class Command(BaseCommand):
+    help = "Shows counters of password hashes computed in the pool by all server processes"
+
+    def handle(self, *args, **options):
+        stats = password_hashing_pool.get_stats()
+        self.stdout.write(
+            f"Hashed: {stats['hashed']}, rejected: {stats['rejected']}, "
+            f"avg queue time: {stats['avg_queue_ms']:.1f} ms, avg hash time: {stats['avg_hash_ms']:.1f} ms"
+        )
@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand, CommandParser
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from core.models import delete_in_batches
+
+
+class Command(BaseCommand):
+    help = "Removes expired outstanding and blacklisted refresh tokens in batches"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--batch-size", "-b", type=int, default=1000, help="Number of rows deleted per transaction")
+
+    def handle(self, *args, **options):
+        now_dt = timezone.now()
+
+        # Expired tokens fail signature check anyway, so their blacklist entries aren't needed
+        for queryset in (
+            BlacklistedToken.objects.filter(token__expires_at__lte=now_dt),
+            OutstandingToken.objects.filter(expires_at__lte=now_dt),
+        ):
+            deleted_count = delete_in_batches(queryset, options["batch_size"])
+            self.stdout.write(f"Deleted {deleted_count} {queryset.model.__name__} row(s)")
@@ -0,0 +1,27 @@
+# Generated by Django 4.1 on 2026-10-18 11:12
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # Indexes are created concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("users", "0004_user_updated_at"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        core.operations.PostgresRunSQL(
+            "CREATE INDEX CONCURRENTLY user_username_trgm_idx ON users_user USING gin (UPPER(username) gin_trgm_ops);",
+            "DROP INDEX CONCURRENTLY IF EXISTS user_username_trgm_idx;",
+        ),
+        core.operations.PostgresRunSQL(
+            "CREATE INDEX CONCURRENTLY user_email_trgm_idx ON users_user USING gin (UPPER(email) gin_trgm_ops);",
+            "DROP INDEX CONCURRENTLY IF EXISTS user_email_trgm_idx;",
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1 on 2026-10-18 13:40
+
+from django.db import migrations
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # Indexes are created concurrently, which can't run inside transaction
+    atomic = False
+
+    dependencies = [
+        ("users", "0006_alter_user_managers_user_deleted_at_and_more"),
+        ("token_blacklist", "0012_alter_outstandingtoken_user"),
+    ]
+
+    operations = [
+        # Token tables belong to simplejwt, so the indexes can't be declared in model Meta.
+        # They back prune_tokens command and incremental sync of users.blacklist.BlacklistFilter
+        core.operations.PostgresRunSQL(
+            "CREATE INDEX CONCURRENTLY outstanding_token_expires_at_idx ON token_blacklist_outstandingtoken (expires_at);",
+            "DROP INDEX CONCURRENTLY IF EXISTS outstanding_token_expires_at_idx;",
+        ),
+        core.operations.PostgresRunSQL(
+            "CREATE INDEX CONCURRENTLY blacklisted_token_blacklisted_at_idx ON token_blacklist_blacklistedtoken (blacklisted_at);",
+            "DROP INDEX CONCURRENTLY IF EXISTS blacklisted_token_blacklisted_at_idx;",
+        ),
+    ]
@@ -4,6 +4,13 @@ from django.db import models
 
 
 class UserManager(DefaultUserManager):
+    # Historical models in migrations may lack deleted_at field, so they get plain manager
+    use_in_migrations = False
+
+    def get_queryset(self):
+        # Deleted users are hidden (and can't authenticate) until purge_deleted command removes them
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
     # Patch to allow nullable emails
     @classmethod
     def normalize_email(cls, email):
@@ -36,12 +43,27 @@ class User(AbstractBaseUser, PermissionsMixin):
         help_text="Designates whether the user can log into this admin site.",
     )
 
+    # Set when user is deleted, dependants are removed in batches later, see feedback.deletion
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
     objects = UserManager()
+    all_objects = models.Manager()
 
     EMAIL_FIELD = "email"
     USERNAME_FIELD = "username"
     REQUIRED_FIELDS = ["email"]
 
+    # Case-insensitive substring (icontains) and fuzzy search are backed by user_username_trgm_idx and
+    # user_email_trgm_idx trigram indexes, PostgreSQL only, see core.operations.PostgresRunSQL
+
+    class Meta:
+        indexes = [
+            # Lookup of users waiting for purge
+            models.Index(
+                fields=["deleted_at"], condition=models.Q(deleted_at__isnull=False), name="user_deleted_at_idx"
+            ),
+        ]
+
     def __str__(self):
         text = self.username
 
@@ -2,12 +2,31 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
 from django_rest_passwordreset.serializers import PasswordValidateMixin
 from drf_spectacular.utils import extend_schema_field
-from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework import exceptions, serializers
+from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 
 import users.models
+from users.authentication import UserRefreshToken
+
+
+def get_unique_validator(field_name: str) -> UniqueValidator:
+    """
+    Deleted users keep username and email until they're purged, so uniqueness is checked against all users
+    :param field_name: unique field of users.models.User
+    :return:
+    """
+    model_field = users.models.User._meta.get_field(field_name)
+    return UniqueValidator(users.models.User.all_objects.all(), message=model_field.error_messages["unique"])
+
+
+# Replace default validators, which check uniqueness against non-deleted users only
+USERNAME_VALIDATORS = [users.models.User.username_validator, get_unique_validator("username")]
+EMAIL_VALIDATORS = [get_unique_validator("email")]
 
 
 class UserDetailSerializer(serializers.ModelSerializer):
@@ -54,7 +73,11 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             "username",
             "email",
         ]
-        extra_kwargs = {"id": {"read_only": True}}
+        extra_kwargs = {
+            "id": {"read_only": True},
+            "username": {"validators": USERNAME_VALIDATORS},
+            "email": {"validators": EMAIL_VALIDATORS},
+        }
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -71,14 +94,14 @@ class RegisterSerializer(serializers.ModelSerializer):
             "refresh",
         ]
         extra_kwargs = {
-            "username": {"write_only": True},
-            "email": {"write_only": True},
+            "username": {"write_only": True, "validators": USERNAME_VALIDATORS},
+            "email": {"write_only": True, "validators": EMAIL_VALIDATORS},
             "password": {"write_only": True},
         }
 
     def create(self, validated_data):
         user = users.models.User.objects.create_user(**validated_data)
-        self.context["token"] = RefreshToken.for_user(user)
+        self.context["token"] = UserRefreshToken.for_user(user)
         return user
 
     @extend_schema_field(serializers.CharField())
@@ -90,6 +113,46 @@ class RegisterSerializer(serializers.ModelSerializer):
         return str(self.context["token"])
 
 
+class LoginSerializer(TokenObtainPairSerializer):
+    token_class = UserRefreshToken
+
+
+class RefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh loads the user, so deleted users get no new tokens and claims are taken from the current row
+
+    Cached user changes only keep access tokens up to date, see users.authentication.ClaimsJWTAuthentication
+    """
+
+    token_class = UserRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user = (
+            users.models.User.objects.filter(**{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]})
+            .only("id", "username", "is_staff")
+            .first()
+        )
+
+        if user is None:
+            raise exceptions.AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        refresh["username"] = user.username
+        refresh["is_staff"] = user.is_staff
+        data = {"access": str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+
+        return data
+
+
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(write_only=True)
     new_password = serializers.CharField(write_only=True)
@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+import users.models
+from posts.cache import post_list_cache
+from users.authentication import user_state_cache
+
+
+@receiver(post_init, sender=users.models.User)
+def on_user_loaded(sender, instance, **kwargs):
+    """
+    Remember loaded username to detect its change on save, deferred username isn't loaded
+    :param sender:
+    :param instance:
+    :param kwargs:
+    :return:
+    """
+    instance._loaded_username = instance.__dict__.get("username")
+
+
+@receiver(post_save, sender=users.models.User)
+def on_user_saved(sender, instance, created=False, **kwargs):
+    """
+    Publish username / staff status / password changes, so tokens issued before see them once the change is committed
+
+    Cached post lists show usernames of authors, so they get invalidated on username change
+    :param sender:
+    :param instance:
+    :param created:
+    :param kwargs:
+    :return:
+    """
+    user_state_cache.publish_user(instance)
+
+    if not created and instance.username != instance._loaded_username:
+        post_list_cache.bump_generation_on_commit()
+
+    instance._loaded_username = instance.username
+
+
+@receiver(post_delete, sender=users.models.User)
+def on_user_deleted(sender, instance, **kwargs):
+    """
+    Reject tokens of deleted user once the change is committed
+    :param sender:
+    :param instance:
+    :param kwargs:
+    :return:
+    """
+    user_state_cache.publish_deleted([instance.id])
@@ -0,0 +1,23 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import (
+    SimpleJWTScheme,
+    TokenObtainPairSerializerExtension,
+    TokenRefreshSerializerExtension,
+)
+
+
+class ClaimsJWTScheme(SimpleJWTScheme):
+    target_class = "users.authentication.ClaimsJWTAuthentication"
+
+
+class LoginSerializerExtension(TokenObtainPairSerializerExtension):
+    target_class = "users.serializers.LoginSerializer"
+
+    def get_name(self, auto_schema, direction):
+        return "TokenObtainPair"
+
+
+class RefreshSerializerExtension(TokenRefreshSerializerExtension):
+    target_class = "users.serializers.RefreshSerializer"
+
+    def get_name(self, auto_schema, direction):
+        return "TokenRefresh"
@@ -1,11 +1,27 @@
+from unittest.mock import patch
+
 import factory
 import pytest
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
 from django.core import mail as django_mail
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django_rest_passwordreset.models import ResetPasswordToken
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 import users.factories
 import users.models
+from core.bloom import BloomFilter
+from core.pagination import KeysetPagination
+from core.throttling import bucket_throttling, take_token
+from users.authentication import ClaimsJWTAuthentication, UserRefreshToken, user_state_cache
+from users.blacklist import blacklist_filter
+from users.hashers import PooledPBKDF2PasswordHasher, password_hashing_pool
 
 USER_LIST_URL = reverse("user-list")
 USER_DETAIL_URL = lambda user_id: reverse("user-detail", kwargs={"pk": user_id})
@@ -13,6 +29,8 @@ USER_ME_URL = reverse("user-me")
 USER_UPDATE_ME_URL = reverse("user-me")
 
 AUTH_REGISTER_URL = reverse("auth-register")
+AUTH_LOGIN_URL = reverse("auth-login")
+AUTH_REFRESH_URL = reverse("auth-refresh")
 AUTH_RESET_PASSWORD_URL = reverse("auth-reset-password")
 AUTH_CHANGE_PASSWORD_URL = reverse("auth-change-password")
 
@@ -59,6 +77,33 @@ class TestUsers:
         data = resp.json()
         assert resp_usernames == {one["username"] for one in data["results"]}
 
+    @pytest.mark.parametrize(
+        "search,resp_usernames",
+        (
+            ("flash", ["flash"]),
+            ("batman", ["batman"]),
+            ("invalid", []),
+        ),
+    )
+    def test_user_list_filter_fuzzy_username(self, search, resp_usernames, api_client, user_list):
+        resp = api_client.get(USER_LIST_URL, data={"fuzzy_username": search})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert resp_usernames == [one["username"] for one in data["results"]]
+
+    @pytest.mark.skipif(connection.vendor != "postgresql", reason="Trigram similarity requires PostgreSQL")
+    def test_user_list_filter_fuzzy_username_typo(self, api_client, user_list):
+        resp = api_client.get(USER_LIST_URL, data={"fuzzy_username": "supermn"})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert [one["username"] for one in data["results"]] == ["superman"]
+
+    @pytest.mark.parametrize("lookup", ("username__icontains", "email__icontains"))
+    def test_user_search_uses_index(self, lookup, no_seqscan, user_list):
+        field_name = lookup.split("__")[0]
+        queryset = users.models.User.objects.filter(**{lookup: "man"})
+        assert f"user_{field_name}_trgm_idx" in queryset.explain()
+
     @pytest.mark.parametrize(
         "order_by,resp_usernames",
         (
@@ -72,6 +117,23 @@ class TestUsers:
         data = resp.json()
         assert resp_usernames == [one["username"] for one in data["results"]]
 
+    @pytest.mark.parametrize("order_by", ("username", "-username"))
+    def test_user_list_cursor(self, order_by, api_client, user_list):
+        with patch.object(KeysetPagination, "page_size", 2):
+            resp = api_client.get(USER_LIST_URL, data={"order_by": order_by, "cursor": ""})
+            assert resp.status_code == 200
+            data = resp.json()
+            assert "count" not in data
+
+            next_resp = api_client.get(data["next"])
+            assert next_resp.status_code == 200
+            next_data = next_resp.json()
+
+        assert next_data["next"] is None
+
+        usernames = [one["username"] for one in data["results"] + next_data["results"]]
+        assert usernames == sorted(USERNAMES, reverse=order_by.startswith("-"))
+
     def test_user_list_sort_invalid(self, db, api_client):
         resp = api_client.get(USER_LIST_URL, data={"order_by": "invalid"})
         assert resp.status_code == 400
@@ -111,6 +173,31 @@ class TestUsers:
         assert data["email"] == user.email
         assert data["is_me"] == True
 
+    def test_user_me_not_modified(self, api_client, user_list):
+        user = user_list[0]
+        api_client.force_authenticate(user)
+
+        resp = api_client.get(USER_ME_URL)
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+
+        resp = api_client.get(USER_ME_URL, HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 304
+
+        resp = api_client.get(USER_ME_URL, HTTP_IF_MODIFIED_SINCE=resp.headers["Last-Modified"])
+        assert resp.status_code == 304
+
+        # Same resource for another user has different representation, e.g. is_me / email
+        api_client.force_authenticate(user_list[1])
+        resp = api_client.get(USER_DETAIL_URL(user.id), HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200
+
+        user.email = "a" + user.email
+        user.save()
+        api_client.force_authenticate(user)
+        resp = api_client.get(USER_ME_URL, HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200
+
     @pytest.mark.parametrize("updated_field", ("username", "email"))
     def test_user_update_me(self, updated_field, api_client, user_list):
         user = user_list[0]
@@ -125,11 +212,16 @@ class TestUsers:
         user.refresh_from_db()
         assert getattr(user, updated_field) == updated_value
 
+    @pytest.mark.parametrize("is_deleted", (False, True))
     @pytest.mark.parametrize("unique_field", ("username", "email"))
-    def test_update_me_unique(self, unique_field, api_client, user_list):
+    def test_update_me_unique(self, unique_field, is_deleted, api_client, user_list):
         user = user_list[0]
         existing_user = user_list[1]
 
+        if is_deleted:
+            # Deleted users keep username and email until purge
+            users.models.User.objects.filter(id=existing_user.id).update(deleted_at=timezone.now())
+
         old_value = getattr(user, unique_field)
         existing_value = getattr(existing_user, unique_field)
         body = {unique_field: existing_value}
@@ -181,8 +273,12 @@ class TestAuthorization:
             ("username", USERNAMES[0]),
         ),
     )
-    def test_register_unique(self, unique_field, unique_value, api_client, registered_user):
-        initial_user_count = users.models.User.objects.count()
+    @pytest.mark.parametrize("is_deleted", (False, True))
+    def test_register_unique(self, unique_field, unique_value, is_deleted, api_client, registered_user):
+        if is_deleted:
+            users.models.User.objects.filter(id=registered_user.id).update(deleted_at=timezone.now())
+
+        initial_user_count = users.models.User.all_objects.count()
         body = {
             "username": "a" + registered_user.username,
             "email": "a" + registered_user.email,
@@ -191,7 +287,7 @@ class TestAuthorization:
         }
         resp = api_client.post(AUTH_REGISTER_URL, data=body)
         assert resp.status_code == 400
-        assert users.models.User.objects.count() == initial_user_count
+        assert users.models.User.all_objects.count() == initial_user_count
 
     def test_reset_password_email_sent(self, api_client, registered_user):
         body = {"email": registered_user.email}
@@ -231,3 +327,280 @@ class TestAuthorization:
 
         registered_user.refresh_from_db()
         assert registered_user.password == old_hash
+
+
+class TestClaimsAuthentication:
+    @pytest.fixture()
+    def user(self, db):
+        return users.factories.UserFactory(username=USERNAMES[0], is_staff=True)
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return ClaimsJWTAuthentication().authenticate(request)[0]
+
+    def test_login_token_claims(self, api_client, user):
+        user.set_password("1234abcd!")
+        user.save()
+
+        resp = api_client.post(AUTH_LOGIN_URL, data={"username": user.username, "password": "1234abcd!"})
+        assert resp.status_code == 200
+
+        token = AccessToken(resp.json()["access"])
+        assert (token["username"], token["is_staff"]) == (user.username, True)
+
+    def test_user_without_query(self, user, django_assert_num_queries):
+        token = UserRefreshToken.for_user(user).access_token
+
+        with django_assert_num_queries(0):
+            request_user = self.authenticate(token)
+            assert (request_user.id, request_user.username, request_user.is_staff) == (user.id, user.username, True)
+            assert request_user.reference.username == user.username
+
+        with django_assert_num_queries(1):
+            assert request_user.instance == user
+
+    def test_user_changes_are_seen(self, user, django_assert_num_queries, django_capture_on_commit_callbacks):
+        token = UserRefreshToken.for_user(user).access_token
+
+        with django_capture_on_commit_callbacks(execute=True):
+            user.username = "renamed"
+            user.is_staff = False
+            user.save()
+
+        with django_assert_num_queries(0):
+            request_user = self.authenticate(token)
+            assert (request_user.username, request_user.is_staff) == ("renamed", False)
+
+        # Other process sees changes after TTL
+        user_state_cache.clear()
+        assert self.authenticate(token).username == "renamed"
+
+    def test_deleted_user(self, api_client, user, django_capture_on_commit_callbacks):
+        api_client.force_authenticate(user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            user.delete()
+
+        assert api_client.get(USER_ME_URL).status_code == 401
+
+    def test_refresh_reloads_user(self, api_client, user):
+        refresh = str(UserRefreshToken.for_user(user))
+        # Cached changes aren't published (no on_commit), refresh relies on the database
+        users.models.User.objects.filter(id=user.id).update(username="renamed", is_staff=False)
+
+        resp = api_client.post(AUTH_REFRESH_URL, data={"refresh": refresh})
+        assert resp.status_code == 200
+        access = AccessToken(resp.json()["access"])
+        assert (access["username"], access["is_staff"]) == ("renamed", False)
+        assert RefreshToken(resp.json()["refresh"])["username"] == "renamed"
+
+        users.models.User.objects.filter(id=user.id).update(deleted_at=timezone.now())
+        resp = api_client.post(AUTH_REFRESH_URL, data={"refresh": resp.json()["refresh"]})
+        assert resp.status_code == 401
+
+    def test_token_without_claims(self, user, django_assert_num_queries):
+        token = RefreshToken.for_user(user).access_token
+
+        with django_assert_num_queries(1):
+            assert self.authenticate(token).username == user.username
+
+    def test_cache_size(self, settings, db):
+        settings.AUTH_USER_CACHE = {**settings.AUTH_USER_CACHE, "MAX_SIZE": 2}
+
+        for user_id in range(1, 4):
+            user_state_cache.get(user_id)
+
+        assert list(user_state_cache._entries) == [2, 3]
+
+
+class TestTokenBlacklist:
+    @pytest.fixture()
+    def user(self, db):
+        return users.factories.UserFactory()
+
+    def get_blacklist_checks(self, queries: CaptureQueriesContext) -> list[str]:
+        return [
+            one["sql"]
+            for one in queries
+            if 'FROM "token_blacklist_blacklistedtoken"' in one["sql"] and '"jti" =' in one["sql"]
+        ]
+
+    def test_refresh_skips_blacklist_query(self, api_client, user):
+        refresh = str(UserRefreshToken.for_user(user))
+        blacklist_filter.sync()
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = api_client.post(AUTH_REFRESH_URL, data={"refresh": refresh})
+
+        assert resp.status_code == 200
+        assert not self.get_blacklist_checks(queries)
+
+        # Rotated token is blacklisted
+        resp = api_client.post(AUTH_REFRESH_URL, data={"refresh": refresh})
+        assert resp.status_code == 401
+
+    def test_token_blacklisted_by_other_process(self, api_client, user):
+        token = UserRefreshToken.for_user(user)
+        blacklist_filter.sync()
+
+        outstanding = OutstandingToken.objects.get(jti=token["jti"])
+        BlacklistedToken.objects.create(token=outstanding)
+        blacklist_filter.clear()
+
+        resp = api_client.post(AUTH_REFRESH_URL, data={"refresh": str(token)})
+        assert resp.status_code == 401
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(capacity=100, error_rate=0.01)
+        values = [f"token-{i}" for i in range(100)]
+        [bloom.add(one) for one in values]
+        bloom.add(values[0])
+
+        assert all(one in bloom for one in values)
+        # False positives aren't counted as new values
+        assert 90 <= bloom.count <= 100
+        assert sum(f"other-{i}" in bloom for i in range(1000)) < 50
+
+    def test_prune_tokens(self, user):
+        expired, active = UserRefreshToken.for_user(user), UserRefreshToken.for_user(user)
+        OutstandingToken.objects.filter(jti=expired["jti"]).update(expires_at=timezone.now())
+        expired.blacklist()
+        active.blacklist()
+
+        call_command("prune_tokens", batch_size=1)
+
+        assert list(OutstandingToken.objects.values_list("jti", flat=True)) == [active["jti"]]
+        assert list(BlacklistedToken.objects.values_list("token__jti", flat=True)) == [active["jti"]]
+
+
+class TestPasswordHashingPool:
+    @pytest.fixture(autouse=True)
+    def pool_settings(self, settings):
+        settings.PASSWORD_HASHING = {**settings.PASSWORD_HASHING, "ENABLED": True, "WORKERS": 1, "MAX_QUEUE": 0}
+        yield settings.PASSWORD_HASHING
+        password_hashing_pool.shutdown()
+
+    def test_same_hash(self):
+        salt = PBKDF2PasswordHasher().salt()
+
+        assert PooledPBKDF2PasswordHasher().encode("1234abcd!", salt) == PBKDF2PasswordHasher().encode(
+            "1234abcd!", salt
+        )
+
+    def test_register_login_change_password(self, db, api_client):
+        body = {"username": "bob", "password": "1234abcd!", "email": "dylan@email.com"}
+        resp = api_client.post(AUTH_REGISTER_URL, data=body)
+        assert resp.status_code == 201
+
+        resp = api_client.post(AUTH_LOGIN_URL, data={"username": "bob", "password": "1234abcd!"})
+        assert resp.status_code == 200
+
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {resp.json()['access']}")
+        resp = api_client.post(
+            AUTH_CHANGE_PASSWORD_URL, data={"old_password": "1234abcd!", "new_password": "abcd1234!"}
+        )
+        assert resp.status_code == 201
+
+        # Change password checks old one and hashes new one
+        stats = password_hashing_pool.get_stats()
+        assert stats["hashed"] == 4
+        assert stats["rejected"] == 0
+        assert users.models.User.objects.get(username="bob").check_password("abcd1234!")
+
+    def test_busy_pool(self, db, api_client):
+        users.models.User.objects.create_user(username="bob", password="1234abcd!")
+        _, slots = password_hashing_pool._get_executor()
+        slots.acquire()
+
+        try:
+            resp = api_client.post(AUTH_LOGIN_URL, data={"username": "bob", "password": "1234abcd!"})
+        finally:
+            slots.release()
+
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "5"
+        assert password_hashing_pool.get_stats()["rejected"] == 1
+
+
+class TestThrottling:
+    @pytest.fixture()
+    def rates(self, settings):
+        settings.THROTTLING = {**settings.THROTTLING, "RATES": {"login": "2/min", "register": "1/hour"}}
+        return settings.THROTTLING
+
+    def test_login_throttled_per_ip(self, db, api_client, rates):
+        body = {"username": "bob", "password": "1234abcd!"}
+
+        # Time is frozen, so slow password checks don't refill the bucket
+        with patch("core.throttling.time.time", return_value=1000):
+            for _ in range(2):
+                assert api_client.post(AUTH_LOGIN_URL, data=body).status_code == 401
+
+            resp = api_client.post(AUTH_LOGIN_URL, data=body)
+            assert resp.status_code == 429
+            assert resp.headers["Retry-After"] == "30"
+
+            resp = api_client.post(AUTH_LOGIN_URL, data=body, REMOTE_ADDR="10.0.0.1")
+            assert resp.status_code == 401
+
+    def test_login_forwarded_for_ignored(self, db, api_client, rates):
+        body = {"username": "bob", "password": "1234abcd!"}
+
+        for index in range(2):
+            resp = api_client.post(AUTH_LOGIN_URL, data=body, HTTP_X_FORWARDED_FOR=f"10.0.0.{index}")
+            assert resp.status_code == 401
+
+        # Without trusted proxies (NUM_PROXIES) client can't pick another bucket
+        resp = api_client.post(AUTH_LOGIN_URL, data=body, HTTP_X_FORWARDED_FOR="10.0.0.9")
+        assert resp.status_code == 429
+
+    def test_login_throttled_per_username(self, db, api_client, rates):
+        rates["RATES"] = {**rates["RATES"], "login_username": "3/hour"}
+
+        for index in range(3):
+            resp = api_client.post(
+                AUTH_LOGIN_URL, data={"username": "bob", "password": str(index)}, REMOTE_ADDR=f"10.0.0.{index}"
+            )
+            assert resp.status_code == 401
+
+        resp = api_client.post(AUTH_LOGIN_URL, data={"username": "Bob", "password": "x"}, REMOTE_ADDR="10.0.0.9")
+        assert resp.status_code == 429
+
+        resp = api_client.post(AUTH_LOGIN_URL, data={"username": "alice", "password": "x"}, REMOTE_ADDR="10.0.0.9")
+        assert resp.status_code == 401
+
+    def test_token_refilled(self, db, api_client, rates):
+        body = {"username": "bob", "password": "1234abcd!", "email": None}
+
+        with patch("core.throttling.time.time", return_value=1000):
+            assert api_client.post(AUTH_REGISTER_URL, data=body).status_code == 201
+            assert api_client.post(AUTH_REGISTER_URL, data=body).status_code == 429
+
+        with patch("core.throttling.time.time", return_value=1000 + 60 * 60):
+            # Not throttled, but username is taken already
+            assert api_client.post(AUTH_REGISTER_URL, data=body).status_code == 400
+
+    def test_disabled(self, db, api_client, rates):
+        rates["ENABLED"] = False
+        body = {"username": "bob", "password": "1234abcd!"}
+
+        for _ in range(3):
+            assert api_client.post(AUTH_LOGIN_URL, data=body).status_code == 401
+
+    @pytest.mark.parametrize("store", ("core.throttling.LocalBucketStore", "core.throttling.CacheBucketStore"))
+    def test_store(self, store, rates):
+        rates["STORE"] = store
+        assert [bucket_throttling.consume("login", "ip:127.0.0.1") for _ in range(3)][:2] == [0, 0]
+        assert bucket_throttling.consume("login", "ip:127.0.0.1") > 0
+        assert bucket_throttling.consume("login", "ip:127.0.0.2") == 0
+
+    def test_take_token(self):
+        bucket, wait = take_token(None, capacity=2, refill_rate=0.5, now=10)
+        assert (bucket, wait) == ((1, 10), 0)
+
+        bucket, wait = take_token((0, 10), capacity=2, refill_rate=0.5, now=11)
+        assert (bucket, wait) == ((0.5, 11), 1)
+
+        # Bucket doesn't grow over capacity
+        bucket, wait = take_token((0, 10), capacity=2, refill_rate=0.5, now=100)
+        assert (bucket, wait) == ((1, 100), 0)
@@ -1,6 +1,6 @@
 from django.urls import path
 from rest_framework.routers import SimpleRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 
 from users import views
 
@@ -12,7 +12,7 @@ urlpatterns = [
     path("users/me/", views.UserMeViewSet.as_view({"get": "retrieve", "patch": "partial_update"}), name="user-me"),
     *router.urls,
     path("auth/register/", views.RegisterView.as_view(), name="auth-register"),
-    path("auth/login/", TokenObtainPairView.as_view(), name="auth-login"),
+    path("auth/login/", views.LoginView.as_view(), name="auth-login"),
     path("auth/refresh/", TokenRefreshView.as_view(), name="auth-refresh"),
     path("auth/reset_password/", views.ResetPasswordView.as_view(), name="auth-reset-password"),
     path("auth/reset_password_confirm/", views.ResetPasswordConfirmView.as_view(), name="auth-reset-password-confirm"),
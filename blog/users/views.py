@@ -2,11 +2,14 @@ from django.conf import settings
 from django_rest_passwordreset.views import ResetPasswordConfirm, ResetPasswordRequestToken
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from rest_framework import decorators, generics, mixins, permissions
+from rest_framework_simplejwt.views import TokenObtainPairView
 
 import users.filters
 import users.models
 import users.serializers
-from core.viewsets import ActionViewSet
+from core.pagination import KeysetPagination
+from core.throttling import TokenBucketThrottle, UsernameBucketThrottle
+from core.viewsets import ActionViewSet, ConditionalListMixin, ConditionalRetrieveMixin
 
 
 @extend_schema_view(
@@ -21,6 +24,8 @@ from core.viewsets import ActionViewSet
     list=extend_schema(description=("List and / or filter users")),
 )
 class UserViewSet(
+    ConditionalListMixin,
+    ConditionalRetrieveMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
     ActionViewSet,
@@ -40,6 +45,9 @@ class UserViewSet(
         "list": queryset.order_by("username"),
     }
     filterset_class = users.filters.UserFilterSet
+    pagination_class = KeysetPagination
+    # Every change of shown fields is saved with updated_at
+    last_modified_aggregate = "updated_at"
     http_method_names = ["get", "patch"]
 
 
@@ -54,6 +62,7 @@ class UserViewSet(
     ),
 )
 class UserMeViewSet(
+    ConditionalRetrieveMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
     ActionViewSet,
@@ -65,9 +74,14 @@ class UserMeViewSet(
         "retrieve": users.serializers.UserDetailSerializer,
     }
     http_method_names = ["patch", "get"]
+    last_modified_aggregate = "updated_at"
 
     def get_object(self):
-        return self.request.user
+        # Authenticated user is built from token claims, so the model is loaded only here
+        return self.request.user.instance
+
+    def get_conditional_queryset(self):
+        return self.get_queryset().filter(id=self.request.user.id)
 
 
 @extend_schema(
@@ -81,6 +95,14 @@ class UserMeViewSet(
 class RegisterView(generics.CreateAPIView):
     authentication_classes = []
     serializer_class = users.serializers.RegisterSerializer
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "register"
+
+
+class LoginView(TokenObtainPairView):
+    throttle_classes = [TokenBucketThrottle, UsernameBucketThrottle]
+    throttle_scope = "login"
+    username_throttle_scope = "login_username"
 
 
 @extend_schema(
@@ -104,6 +126,8 @@ class ChangePasswordView(generics.CreateAPIView):
 )
 class ResetPasswordView(ResetPasswordRequestToken):
     serializer_class = users.serializers.ResetPasswordSerializer
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "reset_password"
 
     def post(self, request, *args, **kwargs):
         response = super().post(request, *args, **kwargs)